@@ -0,0 +1,69 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+
+#
+# Micro-benchmark of the per frame decode cost of the Curtis messages,
+# the old hex string slicing versus the DBC compiled decoders.
+#
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+from components.messages import parse_unsigned_int, parse_signed_int, DECODERS
+
+FRAMES = [
+	(0x1A6, "0300000000007A00"),
+	(0x2A6, "65006A0000000000"),
+	(0x3A6, "000000002B000000"),
+	(0x4A6, "5907590700008405"),
+]
+
+
+# Field extraction as done by StateData.parse_mN before the DBC decoders
+def decode_m1_old(data):
+	return (int(parse_unsigned_int(data, 0, 16) / 10.0), parse_signed_int(data, 16, 16),
+		int(parse_signed_int(data, 32, 16) / 10.0), parse_unsigned_int(data, 48, 16) / 64.0)
+
+
+def decode_m2_old(data):
+	return (parse_signed_int(data, 0, 16) / 10.0, parse_signed_int(data, 16, 16) / 10.0,
+		parse_unsigned_int(data, 32, 8), parse_unsigned_int(data, 40, 8),
+		parse_signed_int(data, 48, 16) * 10.0)
+
+
+def decode_m3_old(data):
+	return (parse_unsigned_int(data, 0, 8), parse_signed_int(data, 16, 16) / 1000.0,
+		parse_unsigned_int(data, 32, 32) / 10.0)
+
+
+def decode_m4_old(data):
+	return (parse_unsigned_int(data, 0, 16), parse_signed_int(data, 16, 16),
+		parse_unsigned_int(data, 48, 16) / 100.0)
+
+
+OLD_DECODERS = {
+	0x1A6: decode_m1_old,
+	0x2A6: decode_m2_old,
+	0x3A6: decode_m3_old,
+	0x4A6: decode_m4_old,
+}
+
+
+def bench(decoder, data, number):
+	t = min(timeit.repeat(lambda: decoder(data), number=number, repeat=5))
+	return t / number * 1e9
+
+
+if __name__ == "__main__":
+	number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+	print("%6s %12s %12s %12s %8s" % ("ID", "old [ns]", "hex [ns]", "bytes [ns]", "speedup"))
+
+	for can_id, data in FRAMES:
+		old = bench(OLD_DECODERS[can_id], data, number)
+		new = bench(DECODERS[can_id], data, number)
+		raw = bench(DECODERS[can_id], bytes.fromhex(data), number)
+		print("%6X %12.0f %12.0f %12.0f %7.1fx" % (can_id, old, new, raw, old / new))
@@ -0,0 +1,117 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+
+#
+# Frame time of the GUI, rendering the states of a capture as they were
+# shown while driving, one snapshot per GUI frame. Runs without a display.
+#
+#   bench_gui.py [capture] [-o] [-n FRAMES]
+#
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+import numpy
+
+from components.settings import DashboardSettings as DS
+from components.capture import open_source
+from components.headless import open_decoder
+
+CANDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test-data', 'candata.txt')
+
+
+class TurnSignal(object):
+	left_state = False
+	right_state = False
+
+
+class Inputs(object):
+	"""Inputs as the event handler reports them, all off."""
+	highbeam_active = False
+	warning_active = False
+	turn_signal = TurnSignal()
+
+
+class Snapshots(object):
+	"""State source handing out one recorded snapshot per frame."""
+
+	def __init__(self, snapshots):
+		self.snapshots = snapshots
+		self.index = 0
+
+	def get_snapshot(self):
+		snapshot = self.snapshots[self.index % len(self.snapshots)]
+		self.index += 1
+		return snapshot
+
+
+def record_snapshots(filename):
+	"""Snapshot of the states every GUI frame of capture time."""
+	source = open_source(filename)
+	states, reader = open_decoder(source)
+
+	snapshots = []
+	next_time = None
+	frames = source.read_frames()
+	while frames is not None:
+		for frame in frames:
+			if next_time is None:
+				next_time = frame[0]
+			while frame[0] >= next_time:
+				snapshots.append(states.get_snapshot())
+				next_time += 1.0 / DS.GUI_FRAME_RATE
+			reader.dispatch_frames((frame,))
+		frames = source.read_frames()
+
+	reader.close()
+	return snapshots
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Measure GUI frame times')
+	parser.add_argument('capture', nargs='?', default=CANDATA_PATH, help='Capture providing the states')
+	parser.add_argument('-o', '--oldgui', dest='use_fluke', action='store_true', help='Measure the old GUI')
+	parser.add_argument('-n', '--frames', dest='frames', type=int, default=2000, help='Frames to render')
+	args = parser.parse_args()
+
+	if args.use_fluke:
+		from components.flukegui import FlukeGUI as GUI
+	else:
+		from components.cleangui import CleanGUI as GUI
+
+	states = Snapshots(record_snapshots(args.capture))
+	gui = GUI(states, Inputs(), threading.Event(), False)
+
+	# Warm up, then time update and render as in BaseGUI.run
+	for i in range(50):
+		gui.update_states()
+		gui.render()
+
+	times = numpy.zeros(args.frames)
+	for i in range(args.frames):
+		start = time.perf_counter()
+		gui.update_states()
+		gui.render()
+		times[i] = time.perf_counter() - start
+
+	times *= 1000.0
+	print("%s, %d frames over %d distinct states" % (GUI.__name__, args.frames, len(states.snapshots)))
+	print("frame time ms: mean %.3f, p50 %.3f, p99 %.3f, max %.3f" % (
+		times.mean(), numpy.percentile(times, 50), numpy.percentile(times, 99), times.max()))
+
+	cache = getattr(gui, "text_cache", None)
+	if cache is not None:
+		print(cache)
+
+	renderer = getattr(gui, "renderer", None)
+	if renderer is not None:
+		print(renderer)
+
+	gui.close()
@@ -0,0 +1,52 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+
+import sys
+import csv
+import argparse
+import multiprocessing
+
+from components.ridesummary import COLUMNS, find_captures, summarize_capture, total_row
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Summarize rides in an archive of CAN captures, one row per capture')
+	parser.add_argument('captures', nargs='+',
+						help='Captures (text, binary or directories of segments), glob patterns or directories of captures')
+	parser.add_argument('-o', '--output', dest='output', default=None,
+						help='CSV file to write the table to, default stdout')
+	parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=None,
+						help='Number of worker processes, default one per core')
+
+	args = parser.parse_args()
+
+	captures = find_captures(args.captures)
+	if not captures:
+		print("No captures found", file=sys.stderr)
+		sys.exit(1)
+
+	out = open(args.output, "w", newline="") if args.output else sys.stdout
+	writer = csv.writer(out)
+	writer.writerow(COLUMNS)
+
+	# Every capture is decoded on its own, the rows are written in input order as they complete
+	rows = []
+	with multiprocessing.Pool(args.jobs) as pool:
+		for filename, row, error in pool.imap(summarize_capture, captures):
+			if row is None:
+				print("Skipping %s: %s" % (filename, error), file=sys.stderr)
+				continue
+
+			writer.writerow(row)
+			out.flush()
+			rows.append(row)
+
+	if rows:
+		writer.writerow(total_row(rows))
+
+	if out is not sys.stdout:
+		out.close()
+		print("Summarized %d of %d captures" % (len(rows), len(captures)))
+
+	sys.exit(0)
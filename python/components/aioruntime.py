@@ -0,0 +1,229 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import asyncio
+import signal
+
+from components.settings import DashboardSettings as DS
+
+
+async def drive(steps):
+	"""Run a generator that yields the time to sleep between its steps."""
+	for delay in steps:
+		await asyncio.sleep(delay)
+
+
+#
+# Runs the CAN reader, inputs, blinkers, GUI and persistence as tasks on
+# one event loop instead of one thread each. Nothing polls for shutdown,
+# the loop sleeps until a source is readable or a timer is due.
+#
+class AsyncRuntime(object):
+
+	def __init__(self, states, reader, event_handler, gui, shutdown):
+		self.states = states
+		self.reader = reader
+		self.event_handler = event_handler
+		self.gui = gui
+		self.shutdown = shutdown
+
+		self.loop = None
+		self.stopped = None
+		self.can_done = None
+
+	def stop(self):
+		self.shutdown.set()
+		if self.stopped is not None:
+			self.stopped.set()
+
+	def handle_signal(self):
+		print("Caught Ctrl-C, will exit")
+		self.stop()
+
+	def get_fileno(self):
+		"""File descriptor of the frame source if it can be waited on, else None."""
+		try:
+			fd = self.reader.source.fileno()
+			self.loop.add_reader(fd, lambda: None)
+		except (PermissionError, ValueError, OSError):
+			# Regular files and decompressors are always readable
+			return None
+
+		self.loop.remove_reader(fd)
+		return fd
+
+	def end_of_input(self):
+		if not self.can_done.done():
+			self.can_done.set_result(None)
+
+	def on_readable(self):
+		"""Reader callback for live sources, decodes what is available."""
+		frames = self.reader.source.read_frames()
+		if frames is None:
+			self.end_of_input()
+			return
+
+		self.reader.handle_frames(frames)
+		if self.reader.coalescer is not None:
+			self.reader.coalescer.poll()
+
+	async def readable(self, fd):
+		future = self.loop.create_future()
+		self.loop.add_reader(fd, future.set_result, None)
+		try:
+			await future
+		finally:
+			self.loop.remove_reader(fd)
+
+	async def feed(self, fd):
+		"""Feed frames that have to be paced, or come from a source that can not be polled."""
+		reader = self.reader
+		replay = reader.replay
+
+		while True:
+			if fd is not None:
+				await self.readable(fd)
+
+			frames = reader.source.read_frames()
+			if frames is None:
+				break
+
+			if replay is None:
+				reader.dispatch_frames(frames)
+			else:
+				for frame in frames:
+					if not await replay.wait_async(frame[0]):
+						return
+					reader.dispatch_frames((frame,))
+
+			if reader.coalescer is not None:
+				reader.coalescer.poll()
+
+			# Let the other tasks run between batches
+			if fd is None:
+				await asyncio.sleep(0)
+
+	async def can_task(self):
+		fd = self.get_fileno()
+		self.can_done = self.loop.create_future()
+
+		try:
+			if fd is not None and self.reader.replay is None:
+				self.loop.add_reader(fd, self.on_readable)
+				try:
+					await self.can_done
+				finally:
+					self.loop.remove_reader(fd)
+			else:
+				await self.feed(fd)
+		finally:
+			self.reader.close()
+
+	async def coalesce_task(self):
+		coalescer = self.reader.coalescer
+		while True:
+			timeout = coalescer.timeout()
+			await asyncio.sleep(coalescer.interval if timeout is None else timeout)
+			coalescer.poll()
+
+	async def input_task(self):
+		"""Act on the inputs when one changes, sleeps while none does."""
+		event_handler = self.event_handler
+		changed = asyncio.Event()
+
+		try:
+			event_handler.detect_edges(lambda: self.loop.call_soon_threadsafe(changed.set))
+		except RuntimeError as error:
+			# Some kernels refuse edge detection, fall back to polling
+			print("Polling the inputs: %s" % error)
+			await drive(event_handler.poll_inputs())
+			return
+
+		while True:
+			changed.clear()
+			await drive(event_handler.check_inputs())
+			await changed.wait()
+
+	async def blink_task(self):
+		"""Blink while a turn signal is active, sleeps while none is."""
+		turn_signal = self.event_handler.turn_signal
+		activated = asyncio.Event()
+		turn_signal.on_activate = activated.set
+
+		try:
+			while True:
+				activated.clear()
+				await drive(turn_signal.blink_active())
+				await activated.wait()
+		finally:
+			turn_signal.on_activate = None
+
+	async def render_task(self):
+		while True:
+			delay = self.gui.frame()
+
+			# The GUI sets shutdown on quit
+			if self.shutdown.is_set():
+				self.stop()
+				return
+
+			await asyncio.sleep(delay)
+
+	async def persist_task(self):
+		# Decoding runs on this loop, so packing never waits for it. Only
+		# the writing and syncing is handed to a thread.
+		while True:
+			await asyncio.sleep(DS.STORE_STATE_INTERVAL * 0.1)
+			self.states.write_lock.acquire()
+			payload = self.states.pack_state()
+			self.states.write_lock.release()
+			await self.loop.run_in_executor(None, self.states.journal.append, payload)
+
+	async def stats_task(self):
+		while True:
+			await asyncio.sleep(DS.BUS_STATS_REPORT_INTERVAL)
+			print(self.reader.stats)
+			print(self.states.format_change_rates())
+			print(self.gui.pacer)
+
+	async def main(self):
+		self.loop = asyncio.get_running_loop()
+		self.stopped = asyncio.Event()
+
+		self.loop.add_signal_handler(signal.SIGINT, self.handle_signal)
+		self.loop.add_signal_handler(signal.SIGTERM, self.handle_signal)
+
+		tasks = [
+			asyncio.ensure_future(self.can_task()),
+			asyncio.ensure_future(self.input_task()),
+			asyncio.ensure_future(self.blink_task()),
+			asyncio.ensure_future(self.render_task()),
+		]
+
+		if self.states.journal is not None:
+			tasks.append(asyncio.ensure_future(self.persist_task()))
+
+		if self.reader.coalescer is not None:
+			tasks.append(asyncio.ensure_future(self.coalesce_task()))
+
+		if DS.DEBUG and self.reader.stats is not None:
+			tasks.append(asyncio.ensure_future(self.stats_task()))
+
+		await self.stopped.wait()
+
+		for task in tasks:
+			task.cancel()
+		await asyncio.gather(*tasks, return_exceptions=True)
+
+		self.loop.remove_signal_handler(signal.SIGINT)
+		self.loop.remove_signal_handler(signal.SIGTERM)
+
+		if self.states.journal is not None:
+			self.states.dump_states()
+			if DS.DEBUG:
+				print(self.states.journal)
+
+		self.gui.close()
+		self.event_handler.cleanup()
+
+	def run(self):
+		asyncio.run(self.main())
@@ -0,0 +1,41 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import pygame
+
+
+#
+# Images prepared once at load time in the pixel format of the display,
+# so drawing them blends as few pixels as possible. Needs the display
+# mode to be set.
+#
+
+def flatten(filenames, size):
+	"""Layers drawn bottom first into one opaque surface of 'size'. Opaque
+	layers are converted without alpha, only transparent ones are blended."""
+	surface = pygame.Surface(size).convert()
+	for filename in filenames:
+		image = pygame.image.load(filename)
+		if image.get_flags() & pygame.SRCALPHA and image.get_bounding_rect(255) != image.get_rect():
+			image = image.convert_alpha()
+		else:
+			image = image.convert()
+
+		if image.get_size() != size:
+			image = pygame.transform.scale(image, size)
+
+		surface.blit(image, (0, 0))
+
+	return surface
+
+
+def load_sprite(filename, pos=(0, 0)):
+	"""Image at 'pos' trimmed to what it covers, as a widget blit
+	(surface, position, bounds). Drawing it blends only those pixels."""
+	image = pygame.image.load(filename).convert_alpha()
+	bounds = image.get_bounding_rect().move(pos)
+	sprite = image.subsurface(image.get_bounding_rect()).copy()
+
+	# Transparent runs are skipped when blitting. Blends may be one level off an unencoded blit
+	sprite.set_alpha(255, pygame.RLEACCEL)
+
+	return sprite, bounds.topleft, bounds
@@ -2,22 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import threading
+import time
 import pygame
-import scipy as sc
 import numpy
 
+from components.settings import DashboardSettings as DS
+from components.textcache import FontRegistry, TextCache
+from components.dirtyrects import Widget
+from components.framepacer import FramePacer
+
 
 class BaseGUI(threading.Thread):
 	#DEFAULT_FONT = "Noto Mono"
 
-	def __init__(self, states, shutdown, fullscreen):
+	# Shared by all text drawing, see draw_text
+	fonts = FontRegistry()
+	text_cache = TextCache(fonts)
+
+	def __init__(self, states, shutdown, fullscreen, replay=None):
 		super().__init__()
 		size = (800, 480)
 
-		self.states = states
+		# Drawing uses one snapshot of the states per frame
+		self.state_source = states
+		self.states = states.get_snapshot()
 		self.shutdown = shutdown
 		self.fullscreen = fullscreen
 
+		# Replay scheduler, if replaying a log
+		self.replay = replay
+
+		# Redraws changed widgets only, set up by GUIs built from widgets
+		self.renderer = None
+
+		# Frame rate and degradation under load
+		self.pacer = FramePacer()
+
 		if fullscreen:
 			self.screen = pygame.display.set_mode(size, pygame.FULLSCREEN)
 			self.set_mouse_visible(False)
@@ -34,6 +54,37 @@ class BaseGUI(threading.Thread):
 		pygame.init()
 		pygame.mixer.quit()
 
+	def update_states(self):
+		self.states = self.state_source.get_snapshot()
+
+	def close(self):
+		if DS.DEBUG:
+			print(self.text_cache)
+			if self.renderer is not None:
+				print(self.renderer)
+			print(self.pacer)
+
+		self.text_cache.clear()
+		self.fonts.clear()
+
+		pygame.mouse.set_visible(True)
+		pygame.quit()
+
+	def frame(self):
+		"""Draw one frame with render() and handle_events() of the GUI.
+		Returns the seconds until the next one is due."""
+		self.pacer.begin()
+		self.update_states()
+		self.render()
+		self.handle_events()
+		return self.pacer.end()
+
+	def run(self):
+		while not self.shutdown.is_set():
+			time.sleep(self.frame())
+
+		self.close()
+
 	def toggle_mouse_visible(self):
 		self.mouse_visible = not self.mouse_visible
 		pygame.mouse.set_visible(self.mouse_visible)
@@ -42,6 +93,17 @@ class BaseGUI(threading.Thread):
 		self.mouse_visible = visible
 		pygame.mouse.set_visible(self.mouse_visible)
 
+	def handle_replay_key(self, key):
+		if self.replay is None:
+			return
+
+		# Space pauses and resumes, right arrow steps while paused
+		if key == pygame.K_SPACE:
+			self.replay.toggle_pause()
+
+		if key == pygame.K_RIGHT:
+			self.replay.step()
+
 	@staticmethod
 	def fill_gradient(surface, color, gradient, rect=None, vertical=True, forward=True):
 		"""fill a surface with a gradient pattern
@@ -94,39 +156,40 @@ class BaseGUI(threading.Thread):
 				)
 				fn_line(surface, color, (col, y1), (col, y2))
 
-	@staticmethod
-	def draw_text(scr, text, size, pos, font, color=(255, 255, 255), topright=False):
-
-		tfont = pygame.font.SysFont(font, size)
-		#tfont = pygame.freetype.Font(font, size)
-		#tfont.kerning = True
-		text_bitmap = tfont.render(text, 1, color)
+	@classmethod
+	def text_blit(cls, text, size, pos, font, color=(255, 255, 255), topright=False, shadow=False):
+		"""Surface, position and bounds of a text, as a widget blit."""
+		text_bitmap, width = cls.text_cache.get(text, size, font, color, shadow)
 		if topright:
-			rect = text_bitmap.get_rect()
-			rect.topright = pos
-			pos = rect
-
-		scr.blit(text_bitmap, pos)
+			pos = (pos[0] - width, pos[1])
 
-	@staticmethod
-	def draw_shadow_text(scr, text, size, pos, font, color=(255, 255, 255), topright=False):
-		tfont = pygame.font.SysFont(font, size)
+		return text_bitmap, pos, pygame.Rect(pos, text_bitmap.get_size())
 
-		drop_color = (70, 70, 70)
-		dropshadow_offset = size // 20
+	@classmethod
+	def draw_text(cls, scr, text, size, pos, font, color=(255, 255, 255), topright=False):
+		text_bitmap, pos, _ = cls.text_blit(text, size, pos, font, color, topright)
+		scr.blit(text_bitmap, pos)
 
-		text_bitmap = tfont.render(text, True, drop_color)
-		if topright:
-			rect = text_bitmap.get_rect()
-			rect.topright = pos
-			pos = rect
+	@classmethod
+	def draw_shadow_text(cls, scr, text, size, pos, font, color=(255, 255, 255), topright=False):
+		# Shadow and text in one surface, the shadow offset to the bottom right
+		text_bitmap, pos, _ = cls.text_blit(text, size, pos, font, color, topright, shadow=True)
+		scr.blit(text_bitmap, pos)
 
-		scr.blit(text_bitmap, (pos[0] + dropshadow_offset, pos[1] + dropshadow_offset))
+	@staticmethod
+	def overlay(sprite, active):
+		"""Widget for a sprite, see load_sprite, shown while 'active' returns True."""
+		return Widget(active, lambda on: sprite if on else None)
 
-		text_bitmap = tfont.render(text, 1, color)
-		scr.blit(text_bitmap, pos)
+	def present(self):
+		"""Draw the changed widgets and update those parts of the display."""
+		rects = self.renderer.render(self.pacer.low_priority)
+		if rects:
+			pygame.display.update(rects)
 
 	@staticmethod
 	def rotate(points: numpy.core.multiarray, center: numpy.core.multiarray, radians: float) -> numpy.core.multiarray:
+		# Loaded when used, the GUIs and headless tools do not need scipy
+		import scipy as sc
 		return sc.dot(points - center, sc.array([[sc.cos(radians), sc.sin(radians)], [-sc.sin(radians), sc.cos(radians)]])) + center
 
@@ -0,0 +1,204 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import bisect
+import time
+
+from components.settings import DashboardSettings as DS
+
+# Histogram bucket upper bounds in seconds, the last bucket is open ended
+INTERVAL_BOUNDS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0]
+DECODE_BOUNDS = [0.000005, 0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01]
+LAG_BOUNDS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+# Frames of ids beyond the first BUS_STATS_MAX_IDS are counted here
+OTHER_ID = -1
+
+
+class Histogram(object):
+	__slots__ = ["bounds", "counts", "total"]
+
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)
+		self.total = 0
+
+	def add(self, value):
+		self.counts[bisect.bisect_left(self.bounds, value)] += 1
+		self.total += 1
+
+	def percentile(self, p):
+		"""Upper bound of the bucket holding the p'th percentile, inf if open ended."""
+		counts = list(self.counts)
+		limit = sum(counts) * p / 100.0
+		acc = 0
+		for index, count in enumerate(counts):
+			acc += count
+			if count and acc >= limit:
+				return self.bounds[index] if index < len(self.bounds) else float("inf")
+
+		return 0.0
+
+	def snapshot(self):
+		return list(self.counts)
+
+
+class IdStatistics(object):
+	__slots__ = ["count", "last_timestamp", "last_seen", "interval", "intervals"]
+
+	def __init__(self):
+		self.count = 0
+		self.last_timestamp = None
+		self.last_seen = None
+
+		# Moving average of the inter-arrival time
+		self.interval = 0.0
+		self.intervals = Histogram(INTERVAL_BOUNDS)
+
+
+#
+# Bus and decode statistics with fixed memory. All updates happen on the
+# reader thread, other threads only copy counters and never block it.
+#
+class BusStatistics(object):
+
+	def __init__(self, max_ids=DS.BUS_STATS_MAX_IDS):
+		self.max_ids = max_ids
+
+		self.ids = {}
+		self.other = IdStatistics()
+		self.decode_times = {}
+
+		# Ids reported when they go silent, e.g. the controller PDOs
+		self.watched = ()
+
+		# Monotonic time the frame was received until its value is set in
+		# StateData. Capture timestamps are no use here, replayed frames
+		# carry those of the log.
+		self.received = None
+		self.lag = Histogram(LAG_BOUNDS)
+
+	def observe(self, timestamp, can_id, now):
+		s = self.ids.get(can_id)
+		if s is None:
+			if len(self.ids) >= self.max_ids:
+				s = self.other
+			else:
+				s = self.ids[can_id] = IdStatistics()
+
+		s.count += 1
+		s.last_seen = now
+		self.received = now
+
+		if timestamp is not None:
+			if s.last_timestamp is not None:
+				interval = timestamp - s.last_timestamp
+				s.intervals.add(interval)
+				s.interval += (interval - s.interval) * DS.BUS_STATS_SMOOTHING
+			s.last_timestamp = timestamp
+
+	def timed(self, handler, name=None):
+		"""Wrap a frame handler to measure its decode time and lag."""
+		if name is None:
+			name = handler.__name__
+
+		histogram = self.decode_times.setdefault(name, Histogram(DECODE_BOUNDS))
+		perf_counter = time.perf_counter
+		monotonic = time.monotonic
+		lag = self.lag
+
+		def timed_handler(data):
+			start = perf_counter()
+			handler(data)
+			histogram.add(perf_counter() - start)
+
+			if self.received is not None:
+				lag.add(monotonic() - self.received)
+
+		timed_handler.__name__ = name
+		return timed_handler
+
+	def get_id(self, can_id):
+		if can_id == OTHER_ID:
+			return self.other
+		return self.ids.get(can_id)
+
+	def get_rate(self, can_id):
+		s = self.get_id(can_id)
+		if s is None or s.interval <= 0.0:
+			return 0.0
+
+		return 1.0 / s.interval
+
+	def get_gap(self, can_id, now=None):
+		"""Seconds since the last frame with this id, None if never seen."""
+		s = self.get_id(can_id)
+		if s is None or s.last_seen is None:
+			return None
+
+		if now is None:
+			now = time.monotonic()
+
+		return now - s.last_seen
+
+	def watch(self, can_ids):
+		"""Report 'can_ids' in the statistics when they go silent."""
+		self.watched = tuple(can_ids)
+
+	def get_items(self):
+		"""The tracked ids and the lumped together others."""
+		items = list(self.ids.items())
+		items.append((OTHER_ID, self.other))
+		return items
+
+	def get_silent_ids(self, can_ids, timeout=DS.BUS_SILENT_TIMEOUT):
+		"""Ids among 'can_ids' without frames for 'timeout' seconds."""
+		now = time.monotonic()
+		silent = []
+		for can_id in can_ids:
+			gap = self.get_gap(can_id, now)
+			if gap is None or gap > timeout:
+				silent.append(can_id)
+
+		return silent
+
+	def snapshot(self):
+		"""Copy of the counters, safe to call from any thread."""
+		now = time.monotonic()
+		ids = {}
+		for can_id, s in self.get_items():
+			ids[can_id] = {
+				"count": s.count,
+				"rate": self.get_rate(can_id),
+				"gap": self.get_gap(can_id, now),
+				"intervals": s.intervals.snapshot(),
+			}
+
+		return {
+			"ids": ids,
+			"decode_times": dict([(name, h.snapshot()) for name, h in list(self.decode_times.items())]),
+			"lag": self.lag.snapshot(),
+		}
+
+	def __str__(self):
+		now = time.monotonic()
+		lines = []
+		for can_id, s in sorted(self.get_items()):
+			if s.count == 0:
+				continue
+
+			name = "other" if can_id == OTHER_ID else "%03X" % can_id
+			gap = self.get_gap(can_id, now)
+			lines.append("%6s: %8d frames, %6.1f frames/s, p99 interval %.4f s, last %.2f s ago" % (
+				name, s.count, self.get_rate(can_id), s.intervals.percentile(99), gap if gap is not None else -1))
+
+		for name, h in sorted(list(self.decode_times.items())):
+			lines.append("%12s: p50 %.6f s, p99 %.6f s decode" % (name, h.percentile(50), h.percentile(99)))
+
+		lines.append("%12s: p50 %.4f s, p99 %.4f s receive to state" % ("lag", self.lag.percentile(50), self.lag.percentile(99)))
+
+		silent = self.get_silent_ids(self.watched)
+		if silent:
+			lines.append("%12s: %s, no frames for over %.1f s" % ("silent", ", ".join(["%03X" % can_id for can_id in silent]),
+				DS.BUS_SILENT_TIMEOUT))
+
+		return "\n".join(lines)
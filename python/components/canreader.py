@@ -1,89 +1,174 @@
 #!/usr/bin/python -B
 # -*- coding: utf-8 -*-
 
-import re
+import selectors
 import threading
 import time
 
-
-tsparser = re.compile(r"\(([0-9]*.[0-9]*)\)")
+from components.settings import DashboardSettings as DS
+from components.busstats import BusStatistics
+from components.coalescer import FrameCoalescer
+from components.dispatch import FrameDispatcher
+from components.ingest import LineSource
+from components.replay import ReplayScheduler
 
 
 class CanReader(threading.Thread):
 
-	def __init__(self, object, infile, shutdown, replay_mode):
+	# Max time blocked waiting for data before checking for shutdown
+	SHUTDOWN_POLL_INTERVAL = 0.5
+
+	def __init__(self, object, infile, shutdown, replay_mode, source=None, coalesce_rate=None, replay=None, recorder=None):
 		super().__init__()
 		self.object = object
 		self.infile = infile
 		self.shutdown = shutdown
 		self.replaymode = replay_mode
 
-	@staticmethod
-	def get_timestamp(s):
-		m = tsparser.match(s)
-		return float(m.group(1))
+		# Paces the frames in replay mode, real time unless given
+		if replay is None and replay_mode:
+			replay = ReplayScheduler(shutdown)
+		self.replay = replay
+
+		# Gets a copy of every frame, e.g. the on-device capture
+		self.recorder = recorder
+
+		# Frame source (e.g. SocketCAN), candump text is read from infile if not set
+		if source is None:
+			source = LineSource(infile)
+		self.source = source
+
+		# Integrators run on the capture timestamps of the frames
+		self.clock = object.clock
+
+		# Per id bus statistics and decode timing
+		if DS.BUS_STATISTICS:
+			self.stats = BusStatistics()
+			timed = self.stats.timed
+		else:
+			self.stats = None
+			timed = lambda handler: handler
+
+		# Other components can subscribe to more ids at runtime
+		self.dispatcher = FrameDispatcher()
+
+		if coalesce_rate:
+			# Only the newest frame per id is applied, integrators still see every frame
+			self.coalescer = FrameCoalescer(timed(object.apply_frames), coalesce_rate)
+			self.coalescer.add(self.dispatcher, 0x1A6, timed(object.accumulate_m1))
+			self.coalescer.add(self.dispatcher, 0x2A6, timed(object.accumulate_m2))
+			self.coalescer.add(self.dispatcher, 0x3A6, timed(object.accumulate_m3))
+			self.coalescer.add(self.dispatcher, 0x4A6, timed(object.accumulate_m4))
+		else:
+			self.coalescer = None
+			self.dispatcher.subscribe(0x1A6, timed(object.parse_m1))
+			self.dispatcher.subscribe(0x2A6, timed(object.parse_m2))
+			self.dispatcher.subscribe(0x3A6, timed(object.parse_m3))
+			self.dispatcher.subscribe(0x4A6, timed(object.parse_m4))
+
+		# Heartbeat
+		self.dispatcher.ignore(0x726)
+
+		# Report a silent controller with the statistics
+		if self.stats is not None:
+			self.stats.watch([0x1A6, 0x2A6, 0x3A6, 0x4A6])
 
 	def parse_can_data(self, data):
 		sbytes = data.split("#")
 
-		if data.startswith("1A6"):
-			self.object.parse_m1(sbytes[1])
+		self.handle_frame(int(sbytes[0], 16), sbytes[1])
 
-		elif data.startswith("2A6"):
-			self.object.parse_m2(sbytes[1])
+	def handle_frame(self, can_id, data):
+		self.dispatcher.dispatch(can_id, data)
 
-		elif data.startswith("3A6"):
-			self.object.parse_m3(sbytes[1])
+	def handle_frames(self, frames):
+		"""Decode a batch of frames. Returns False when the replay window has ended."""
+		replay = self.replay
+		if replay is None:
+			self.dispatch_frames(frames)
+			return True
 
-		elif data.startswith("4A6"):
-			self.object.parse_m4(sbytes[1])
+		# Slow down iteration if in replay mode. A batch spans seconds of
+		# the log, coalesced frames are applied as they come due within it.
+		coalescer = self.coalescer
+		for frame in frames:
+			if not replay.wait(frame[0]):
+				return False
 
-		elif data.startswith("726"):
-			pass
-		else:
-			print("UNKNOWN CAN DATA")
+			self.dispatch_frames((frame,))
+
+			if coalescer is not None:
+				coalescer.poll()
+
+		return True
+
+	def dispatch_frames(self, frames):
+		"""Decode frames that are due now."""
+		dispatch = self.dispatcher.dispatch
+		advance = self.clock.advance
+		record = self.recorder.record if self.recorder is not None else None
+		observe = self.stats.observe if self.stats is not None else None
+		now = time.monotonic()
+
+		for timestamp, can_id, data in frames:
 
+			if observe is not None:
+				observe(timestamp, can_id, now)
+
+			if record is not None:
+				record(timestamp, can_id, data)
+
+			advance(timestamp)
+			dispatch(can_id, data)
 
 	def run(self):
+		selector = selectors.DefaultSelector()
+		try:
+			selector.register(self.source, selectors.EVENT_READ)
+		except (PermissionError, ValueError):
+			# Regular files are always readable and can not be polled
+			selector.close()
+			selector = None
 
-		prev_time = -1
 		while not self.shutdown.is_set():
 
-			try:
-				line = self.infile.readline()
-			except:
-				time.sleep(0.1)
+			# Sleep in the kernel until data arrives, wake up now and then for shutdown
+			if selector is not None and not selector.select(self.get_timeout()):
+				if self.coalescer is not None:
+					self.coalescer.poll()
 				continue
 
+			frames = self.source.read_frames()
 
-			# Remove endings and ignore empty lines
-			l = line.strip()
-			if len(l) == 0:
-				time.sleep(0.1)
-				continue
+			# End of input
+			if frames is None:
+				break
 
-			# Ignore comments
-			if l.startswith("#"):
-				continue
+			if not self.handle_frames(frames):
+				break
 
-			# Expect timestamp with '('
-			if not l.startswith("("):
-				print("Unparsable line:", l)
-				continue
+			if self.coalescer is not None:
+				self.coalescer.poll()
 
-			# Split out <TIMESTAMP> <BUS-ID> <DATA>
-			row = l.split(" ")
+		if selector is not None:
+			selector.close()
+		self.close()
 
-			if self.replaymode and prev_time == -1:
-				prev_time = self.get_timestamp(row[0])
+	def close(self):
+		if self.coalescer is not None:
+			self.coalescer.flush()
+			if DS.DEBUG:
+				print(self.coalescer)
 
-			self.parse_can_data(row[2])
+		self.source.close()
 
-			timestamp = self.get_timestamp(row[0])
+	def get_timeout(self):
+		timeout = self.SHUTDOWN_POLL_INTERVAL
 
-			# Slow down iteration if in replay mode
-			if self.replaymode:
-				sleeptime = timestamp - prev_time
-				time.sleep(sleeptime)
+		# Wake up in time to apply coalesced frames
+		if self.coalescer is not None:
+			pending = self.coalescer.timeout()
+			if pending is not None:
+				timeout = min(timeout, pending)
 
-			prev_time = timestamp
+		return timeout
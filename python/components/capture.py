@@ -0,0 +1,262 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import mmap
+import os
+import struct
+
+from components.settings import DashboardSettings as DS
+from components.ingest import LineSource
+
+#
+# Binary capture format
+#
+#   Header   magic, version, record size
+#   Records  fixed size: timestamp, id, dlc, 8 data bytes
+#   Index    (timestamp, record number) of every INDEX_STRIDE'th record
+#   Footer   record count, index count, index stride, magic
+#
+# The index and footer are written on close. A file without them (e.g.
+# after a power cut) is still readable, the records are then searched
+# directly, which is also O(log n) since they are fixed size.
+#
+CAPTURE_MAGIC = b"CURTCAP\0"
+CAPTURE_VERSION = 1
+FOOTER_MAGIC = b"CIDX"
+
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<dIB3x8s")
+INDEX_ENTRY = struct.Struct("<dQ")
+FOOTER = struct.Struct("<QQI4s")
+
+INDEX_STRIDE = 1024
+
+
+def is_binary_capture(filename):
+	with open(filename, "rb") as f:
+		return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+def format_candump_line(timestamp, can_id, data, bus="can0"):
+	if can_id > 0x7FF:
+		return "(%.6f) %s %08X#%s" % (timestamp, bus, can_id, data.hex().upper())
+
+	return "(%.6f) %s %03X#%s" % (timestamp, bus, can_id, data.hex().upper())
+
+
+class CaptureFileWriter(object):
+
+	def __init__(self, filename):
+		self.f = open(filename, "wb")
+		self.f.write(HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, RECORD.size, 0))
+
+		self.count = 0
+		self.index = []
+
+	def write(self, timestamp, can_id, data):
+		if self.count % INDEX_STRIDE == 0:
+			self.index.append((timestamp, self.count))
+
+		self.f.write(RECORD.pack(timestamp, can_id, len(data), data))
+		self.count += 1
+
+	def close(self):
+		for timestamp, number in self.index:
+			self.f.write(INDEX_ENTRY.pack(timestamp, number))
+
+		self.f.write(FOOTER.pack(self.count, len(self.index), INDEX_STRIDE, FOOTER_MAGIC))
+		self.f.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+class CaptureFile(object):
+	"""Memory mapped reader of a binary capture."""
+
+	def __init__(self, filename):
+		self.f = open(filename, "rb")
+		size = os.fstat(self.f.fileno()).st_size
+		if size < HEADER.size:
+			raise ValueError("Not a capture: %s" % filename)
+
+		self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		magic, version, record_size, _ = HEADER.unpack_from(self.mm, 0)
+		if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION or record_size != RECORD.size:
+			raise ValueError("Not a version %d capture: %s" % (CAPTURE_VERSION, filename))
+
+		self.index = []
+		self.count = (size - HEADER.size) // RECORD.size
+
+		# Read the index if the file was closed properly
+		if size >= HEADER.size + FOOTER.size:
+			count, index_count, stride, magic = FOOTER.unpack_from(self.mm, size - FOOTER.size)
+			index_start = size - FOOTER.size - index_count * INDEX_ENTRY.size
+			if magic == FOOTER_MAGIC and index_start == HEADER.size + count * RECORD.size:
+				self.count = count
+				self.index = [INDEX_ENTRY.unpack_from(self.mm, index_start + i * INDEX_ENTRY.size)
+					for i in range(index_count)]
+
+	def close(self):
+		self.mm.close()
+		self.f.close()
+
+	def fileno(self):
+		return self.f.fileno()
+
+	def __len__(self):
+		return self.count
+
+	def timestamp(self, number):
+		return struct.unpack_from("<d", self.mm, HEADER.size + number * RECORD.size)[0]
+
+	def record(self, number):
+		timestamp, can_id, dlc, data = RECORD.unpack_from(self.mm, HEADER.size + number * RECORD.size)
+		return timestamp, can_id, data[:dlc]
+
+	def seek(self, timestamp):
+		"""Number of the first record at or after 'timestamp'."""
+		lo = 0
+		hi = self.count
+
+		# Narrow down to one index block
+		if self.index:
+			ilo = 0
+			ihi = len(self.index)
+			while ilo < ihi:
+				mid = (ilo + ihi) // 2
+				if self.index[mid][0] < timestamp:
+					ilo = mid + 1
+				else:
+					ihi = mid
+
+			if ilo > 0:
+				lo = self.index[ilo - 1][1]
+			if ilo < len(self.index):
+				hi = self.index[ilo][1]
+
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.timestamp(mid) < timestamp:
+				lo = mid + 1
+			else:
+				hi = mid
+
+		return lo
+
+	def read(self, start, stop):
+		"""Frames from record 'start' up to, not including, 'stop'."""
+		stop = min(stop, self.count)
+		if start >= stop:
+			return []
+
+		begin = HEADER.size + start * RECORD.size
+		end = HEADER.size + stop * RECORD.size
+
+		return [(timestamp, can_id, data[:dlc])
+			for timestamp, can_id, dlc, data in RECORD.iter_unpack(self.mm[begin:end])]
+
+	def frames(self, start=0, stop=None):
+		if stop is None:
+			stop = self.count
+
+		while start < stop:
+			batch = self.read(start, min(start + DS.CAPTURE_READ_BATCH, stop))
+			start += len(batch)
+			for frame in batch:
+				yield frame
+
+
+class CaptureSource(object):
+	"""Frame source for CanReader reading a binary capture."""
+
+	def __init__(self, filename, batch=DS.CAPTURE_READ_BATCH):
+		self.capture = CaptureFile(filename)
+		self.batch = batch
+		self.position = 0
+
+	def fileno(self):
+		return self.capture.fileno()
+
+	def close(self):
+		self.capture.close()
+
+	def seek(self, offset):
+		"""Skip to 'offset' seconds after the first frame.
+		Returns the timestamp of the first frame, None if empty.
+		"""
+		if len(self.capture) == 0:
+			return None
+
+		log_start = self.capture.timestamp(0)
+		self.position = self.capture.seek(log_start + offset)
+		return log_start
+
+	def read_frames(self):
+		if self.position >= len(self.capture):
+			return None
+
+		frames = self.capture.read(self.position, self.position + self.batch)
+		self.position += len(frames)
+		return frames
+
+
+def open_source(filename):
+	"""Frame source for a capture file in any supported format, or a
+	directory of compressed segments."""
+	from components.recorder import SegmentSource, is_segment, list_segments
+
+	if os.path.isdir(filename):
+		return SegmentSource(list_segments(filename))
+
+	if is_binary_capture(filename):
+		return CaptureSource(filename)
+
+	if is_segment(filename):
+		return SegmentSource(filename)
+
+	return LineSource(open(filename, "r"))
+
+
+def text_to_binary(infile, outfile):
+	"""Convert a text capture, or compressed segments, to binary."""
+	source = open_source(infile)
+
+	with CaptureFileWriter(outfile) as writer:
+		frames = source.read_frames()
+		while frames is not None:
+			for timestamp, can_id, data in frames:
+				if data.__class__ is str:
+					data = bytes.fromhex(data)
+				writer.write(timestamp, can_id, data)
+
+			frames = source.read_frames()
+
+	source.close()
+	return writer.count
+
+
+def binary_to_text(infile, outfile, bus="can0", start=None, end=None):
+	capture = CaptureFile(infile)
+
+	first = 0
+	last = len(capture)
+	if len(capture) > 0:
+		t0 = capture.timestamp(0)
+		if start is not None:
+			first = capture.seek(t0 + start)
+		if end is not None:
+			last = capture.seek(t0 + end)
+
+	count = 0
+	with open(outfile, "w") as f:
+		for timestamp, can_id, data in capture.frames(first, last):
+			f.write(format_candump_line(timestamp, can_id, data, bus))
+			f.write("\n")
+			count += 1
+
+	capture.close()
+	return count
@@ -1,7 +1,6 @@
 #!/usr/bin/python -B
 # -*- coding: utf-8 -*-
 
-import time
 import os
 
 import pygame
@@ -10,6 +9,9 @@ import pygame.gfxdraw
 from components.settings import DashboardSettings as DS
 
 from .basegui import BaseGUI
+from components.dirtyrects import Widget, DirtyRenderer
+from components.needles import NeedleAtlas
+from components.assets import flatten, load_sprite
 
 if DS.DEBUG:
 	from components.dummy_pi import GPIO
@@ -31,8 +33,8 @@ RIGHT_BORDER = 608
 
 class CleanGUI(BaseGUI):
 
-	def __init__(self, states, event_handler, shutdown, fullscreen):
-		super(CleanGUI, self).__init__(states, shutdown, fullscreen)
+	def __init__(self, states, event_handler, shutdown, fullscreen, replay=None):
+		super(CleanGUI, self).__init__(states, shutdown, fullscreen, replay)
 
 		self.event_handler = event_handler
 
@@ -41,26 +43,27 @@ class CleanGUI(BaseGUI):
 		self.warning_signal = False
 		self.highbeam = False
 
-		self.highbeam_img = self.load_image('high_beam.png')
-		self.left_turn_img = self.load_image('left_turn.png')
-		self.right_turn_img = self.load_image('right_turn.png')
-		self.warning_signal_img = self.load_image('warn_signal.png')
+		# Overlays trimmed to what they cover
+		self.highbeam_img = load_sprite(self.image_path('high_beam.png'))
+		self.left_turn_img = load_sprite(self.image_path('left_turn.png'))
+		self.right_turn_img = load_sprite(self.image_path('right_turn.png'))
+		self.warning_signal_img = load_sprite(self.image_path('warn_signal.png'))
 
 		self.bsegments = []
 		for index in range(1,9):
 			imagefile = "battery_%d.png" % index
-			segment = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, imagefile))
-			self.bsegments.append(segment.convert_alpha())
+			self.bsegments.append(load_sprite(self.image_path(imagefile)))
 
-		self.powerneedle = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'kw_needle.png'))
-		self.powerneedle = self.powerneedle.convert_alpha()
+		# The needles over the sweep of the gauges, rotated once
+		angles = [self.power_angle(power) for power in DS.POWER_NEEDLE_RANGE]
+		self.power_atlas = NeedleAtlas(self.image_path('kw_needle.png'), min(angles), max(angles))
 
-		self.speedneedle = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'speed_needle.png'))
-		self.speedneedle = self.speedneedle.convert_alpha()
+		angles = [self.speed_angle(speed) for speed in DS.SPEED_NEEDLE_RANGE]
+		self.speed_atlas = NeedleAtlas(self.image_path('speed_needle.png'), min(angles), max(angles))
 
-		self.bg = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'background.png'))
-		self.bg = self.bg.convert_alpha()
-		self.bg = pygame.transform.scale(self.bg, (800, 480))
+		# The screen is restored from here where widgets changed
+		background = flatten([self.image_path('background.png')], self.screen.get_size())
+		self.renderer = DirtyRenderer(self.screen, background, self.make_widgets())
 
 	@staticmethod
 	def check_mouse_inside(pos, rect):
@@ -74,34 +77,32 @@ class CleanGUI(BaseGUI):
 		else:
 			return False
 
-	def draw_battery(self):
-
+	def battery_index(self):
 		soc = self.states.get_soc_percent()
 		image_index = int(soc*8)
 
 		if image_index > 7:
 			image_index = 7
 
-		if image_index < 0:
-			return
+		return image_index
 
-		self.screen.blit(self.bsegments[image_index], (0,0))
+	def battery_segment(self, image_index):
+		if image_index < 0:
+			return None
 
+		return self.bsegments[image_index]
 
-	def draw_power(self):
+	@staticmethod
+	def power_angle(power):
 
 		one_rot = 42.5
 		offset = 31.0
 
-		power = self.states.get_motor_power() - offset
-
-		needle = pygame.transform.rotozoom(self.powerneedle, -power*(180.0/one_rot), 1.0)
-		pos = needle.get_rect()
-		pos.centerx = 512
-		pos.centery = 271
-		self.screen.blit(needle, pos)
+		power = power - offset
+		return -power*(180.0/one_rot)
 
-	def draw_speed(self):
+	@staticmethod
+	def speed_angle(speed):
 
 		# Speed in km/h for 180 degrees needle movement
 		one_rotation = 169.0
@@ -109,192 +110,113 @@ class CleanGUI(BaseGUI):
 		# Speed zero offset in km/h
 		offset = 135.0
 
-		speed = self.states.get_speed_kmh() - offset
-		needle = pygame.transform.rotozoom(self.speedneedle, -speed*(180.0/(one_rotation)), 1.0)
-		pos = needle.get_rect()
-		pos.centerx = 399
-		pos.centery = 187
-		self.screen.blit(needle, pos)
+		speed = speed - offset
+		return -speed*(180.0/(one_rotation))
 
-	def draw_background(self):
-		self.screen.blit(self.bg, (0,0))
+	def power_needle(self, angle):
+		return self.power_atlas.blit(angle, (512, 271))
+
+	def speed_needle(self, angle):
+		return self.speed_atlas.blit(angle, (399, 187))
 
 	@staticmethod
-	def load_image(filename):
-		img = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, filename))
-		img = img.convert_alpha()
-		return img
+	def image_path(filename):
+		return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, filename)
 
 	def draw_text(self, scr, text, size, pos, font=FONT_NAME, color=TEXT_COLOR, topright=False):
 		super(CleanGUI, self).draw_shadow_text(scr, text, size, pos, font, color, topright)
 
-	def show_full_image(self, img):
-		self.screen.blit(img, (0, 0))
-
-	def draw_highbeam(self):
-		if self.event_handler.highbeam_active:
-			self.show_full_image(self.highbeam_img)
-
-	def draw_turn_left(self):
-		if self.event_handler.turn_signal.left_state:
-			self.show_full_image(self.left_turn_img)
-
-	def draw_turn_right(self):
-		if self.event_handler.turn_signal.right_state:
-			self.show_full_image(self.right_turn_img)
-
-	def draw_warning_signal(self):
-		if self.event_handler.warning_active:
-			self.show_full_image(self.warning_signal_img)
-
-	#
-	# Leftmost values
-	#
-
-	def print_current(self):
-		current = self.states.get_motor_rms_current()
-		self.draw_text(self.screen, str(current), G1_SIZE, (LEFT_BORDER, 155))
-
-	def print_rpm(self):
-		rpm = self.states.get_actual_speed()
-		self.draw_text(self.screen, str(rpm), G1_SIZE, (LEFT_BORDER, 235))
-
-	def print_consumption(self):
-		cons = self.states.get_consumption_kwh()
-		self.draw_text(self.screen, "%.01f" % cons, G1_SIZE, (LEFT_BORDER, 315))
-
-
-	#
-	# Rightmost values
-	#
-
-	def print_battery_voltage(self):
-		voltage = self.states.get_dc_capacitor_voltage()
-		self.draw_text(self.screen, "%.0f" % voltage, G2_SIZE, (RIGHT_BORDER, 184))
-
-	def print_range(self):
-		range = self.states.get_range()/1000.0
-		self.draw_text(self.screen, "%.0f" % range, G2_SIZE, (RIGHT_BORDER, 270))
-
-	def print_battery_percent(self):
-		soc = self.states.get_soc_percent()*100.0
-		self.draw_text(self.screen, "%.0f %%" % soc, G3_SIZE, (730, 290), topright=True)
-
-	#
-	# Center values
-	#
-	def print_speed(self):
-		speed = self.states.get_speed_kmh()
-		self.draw_text(self.screen, "%.0f" % speed, G1_SIZE, (426, 187), topright=True)
-
-	def print_power(self):
-		power = self.states.get_motor_power()
-		self.draw_text(self.screen, "%.01f" % power, 20, (530, 260), topright=True)
-
-	#
-	# Bottom values
-	#
-
-	def print_dcdc(self):
-		dcdc = self.states.get_dcdc()
-		self.draw_text(self.screen, "%.01f" % dcdc, G2_SIZE, (148, BOTTOM_BORDER), topright=True)
-
-	def print_motor_temp(self):
-		temp = self.states.get_motor_temp()
-		self.draw_text(self.screen, "%.0f" % temp, G2_SIZE, (340, BOTTOM_BORDER), topright=True)
-
-	def print_ctrl_temp(self):
-		temp = self.states.get_controller_temp()
-		self.draw_text(self.screen, "%.0f" % temp, G2_SIZE, (528, BOTTOM_BORDER), topright=True)
-
-	def print_odometer(self):
-		odometer = self.states.get_odometer()
-		self.draw_text(self.screen, "%.0f" % odometer, G2_SIZE, (714, BOTTOM_BORDER), topright=True)
-
-
-	def run(self):
-		while not self.shutdown.is_set():
-
-			#
-			#
-			# Draw everything on the screen
-			#
-			#
-			self.draw_background()
-			self.draw_speed()
-			self.draw_battery()
-			self.draw_power()
-			self.draw_turn_left()
-			self.draw_turn_right()
-			self.draw_warning_signal()
-			self.draw_highbeam()
-
-			self.print_rpm()
-			self.print_power()
-			self.print_current()
-			self.print_battery_voltage()
-			self.print_range()
-			self.print_odometer()
-			self.print_ctrl_temp()
-			self.print_motor_temp()
-			self.print_dcdc()
-
-			self.print_battery_percent()
-			self.print_speed()
-			self.print_consumption()
-
-			pygame.display.flip()
-
-			#
-			#
-			# Handle screen events
-			#
-			#
-
-			ev = pygame.event.get()
-			for event in ev:
-
-				# Handle quit message received
-				if event.type == pygame.QUIT:
+	def readout(self, value, size, pos, topright=False, low_priority=False):
+		"""Widget for a text drawn like draw_text."""
+		return Widget(value, lambda text: self.text_blit(text, size, pos, FONT_NAME, TEXT_COLOR, topright, shadow=True), low_priority)
+
+	def make_widgets(self):
+		"""Everything drawn on the background, bottom first. Slowly changing
+		values are low priority."""
+		states = lambda: self.states
+		event_handler = self.event_handler
+
+		return [
+			Widget(lambda: self.speed_atlas.quantize(self.speed_angle(states().get_speed_kmh())), self.speed_needle),
+			Widget(self.battery_index, self.battery_segment, low_priority=True),
+			Widget(lambda: self.power_atlas.quantize(self.power_angle(states().get_motor_power())), self.power_needle),
+
+			self.overlay(self.left_turn_img, lambda: event_handler.turn_signal.left_state),
+			self.overlay(self.right_turn_img, lambda: event_handler.turn_signal.right_state),
+			self.overlay(self.warning_signal_img, lambda: event_handler.warning_active),
+			self.overlay(self.highbeam_img, lambda: event_handler.highbeam_active),
+
+			# Leftmost values
+			self.readout(lambda: str(states().get_actual_speed()), G1_SIZE, (LEFT_BORDER, 235)),
+			self.readout(lambda: str(states().get_motor_rms_current()), G1_SIZE, (LEFT_BORDER, 155)),
+			self.readout(lambda: "%.01f" % states().get_consumption_kwh(), G1_SIZE, (LEFT_BORDER, 315), low_priority=True),
+
+			# Rightmost values
+			self.readout(lambda: "%.0f" % states().get_dc_capacitor_voltage(), G2_SIZE, (RIGHT_BORDER, 184), low_priority=True),
+			self.readout(lambda: "%.0f" % (states().get_range()/1000.0), G2_SIZE, (RIGHT_BORDER, 270), low_priority=True),
+			self.readout(lambda: "%.0f %%" % (states().get_soc_percent()*100.0), G3_SIZE, (730, 290), topright=True, low_priority=True),
+
+			# Center values
+			self.readout(lambda: "%.0f" % states().get_speed_kmh(), G1_SIZE, (426, 187), topright=True),
+			self.readout(lambda: "%.01f" % states().get_motor_power(), 20, (530, 260), topright=True),
+
+			# Bottom values
+			self.readout(lambda: "%.01f" % states().get_dcdc(), G2_SIZE, (148, BOTTOM_BORDER), topright=True, low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_motor_temp(), G2_SIZE, (340, BOTTOM_BORDER), topright=True, low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_controller_temp(), G2_SIZE, (528, BOTTOM_BORDER), topright=True, low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_odometer(), G2_SIZE, (714, BOTTOM_BORDER), topright=True, low_priority=True),
+		]
+
+	def render(self):
+		"""Draw everything on the screen."""
+		self.present()
+
+	def handle_events(self):
+		"""Handle screen events."""
+		ev = pygame.event.get()
+		for event in ev:
+
+			# Handle quit message received
+			if event.type == pygame.QUIT:
+				self.shutdown.set()
+
+			# Only changes are drawn, redraw what another window covered
+			if event.type == pygame.VIDEOEXPOSE:
+				self.renderer.invalidate()
+
+			if event.type == pygame.KEYDOWN:
+				if event.key == pygame.K_l and DS.DEBUG:
+					GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.HIGH)
+
+			if event.type == pygame.KEYUP:
+				if event.key == pygame.K_q:
 					self.shutdown.set()
 
-				if event.type == pygame.KEYDOWN:
-					if event.key == pygame.K_l and DS.DEBUG:
-						GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.HIGH)
-
-				if event.type == pygame.KEYUP:
-					if event.key == pygame.K_q:
-						self.shutdown.set()
-
-					if event.key == pygame.K_m:
-						self.toggle_mouse_visible()
-
-					if event.key == pygame.K_l and DS.DEBUG:
-						GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.LOW)
-
+				if event.key == pygame.K_m:
+					self.toggle_mouse_visible()
 
-				# Handle on-screen controls
-				if event.type == pygame.MOUSEBUTTONUP:
-					pos = pygame.mouse.get_pos()
-					if self.check_mouse_inside(pos, DS.LEFT_TURN_BBOX):
-						self.event_handler.toggle_left_turn()
+				self.handle_replay_key(event.key)
 
-					if self.check_mouse_inside(pos, DS.RIGHT_TURN_BBOX):
-						self.event_handler.toggle_right_turn()
+				if event.key == pygame.K_l and DS.DEBUG:
+					GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.LOW)
 
-					if self.check_mouse_inside(pos, DS.WARN_LIGHT_BBOX):
-						self.event_handler.toggle_warning()
 
-					if self.check_mouse_inside(pos, DS.HIGHBEAM_BBOX):
-						self.event_handler.toggle_highbeam()
+			# Handle on-screen controls
+			if event.type == pygame.MOUSEBUTTONUP:
+				pos = pygame.mouse.get_pos()
+				if self.check_mouse_inside(pos, DS.LEFT_TURN_BBOX):
+					self.event_handler.toggle_left_turn()
 
-					if self.check_mouse_inside(pos, DS.RANGE_BBOX):
-						print("Reset SoC")
+				if self.check_mouse_inside(pos, DS.RIGHT_TURN_BBOX):
+					self.event_handler.toggle_right_turn()
 
+				if self.check_mouse_inside(pos, DS.WARN_LIGHT_BBOX):
+					self.event_handler.toggle_warning()
 
-			time.sleep(0.1)
+				if self.check_mouse_inside(pos, DS.HIGHBEAM_BBOX):
+					self.event_handler.toggle_highbeam()
 
-		pygame.mouse.set_visible(True)
-		pygame.quit()
+				if self.check_mouse_inside(pos, DS.RANGE_BBOX):
+					print("Reset SoC")
 
 
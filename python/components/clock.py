@@ -0,0 +1,41 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import time
+
+
+#
+# Clocks used by the integrators in StateData and ConsumptionData
+#
+
+class WallClock(object):
+	"""Time at which a frame is decoded."""
+
+	def __init__(self):
+		self.timestamp = None
+
+	def advance(self, timestamp):
+		self.timestamp = timestamp
+
+	def time(self):
+		return time.time()
+
+
+class CaptureClock(object):
+	"""Capture timestamp of the frame being decoded.
+
+	Integrating over capture time makes the results independent of
+	replay speed and of reader stalls. Falls back to wall time for
+	frames without a timestamp.
+	"""
+
+	def __init__(self):
+		self.timestamp = None
+
+	def advance(self, timestamp):
+		self.timestamp = timestamp
+
+	def time(self):
+		if self.timestamp is None:
+			return time.time()
+
+		return self.timestamp
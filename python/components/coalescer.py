@@ -0,0 +1,78 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import time
+
+from components.settings import DashboardSettings as DS
+
+
+#
+# Keeps only the newest payload per arbitration id and applies them at a
+# fixed rate, all ids of a batch in one call of 'apply'. Integrators and
+# the history, which must see every sample, are called for each frame
+# through their accumulate handler.
+#
+class FrameCoalescer(object):
+
+	def __init__(self, apply, rate=DS.COALESCE_RATE):
+		self.apply = apply
+		self.interval = 1.0 / rate
+		self.next_apply = 0.0
+
+		self.latest = {}
+
+		# Counters for sizing under real bus load
+		self.received = 0
+		self.coalesced = 0
+		self.applied = 0
+
+	def add(self, dispatcher, can_id, accumulate=None):
+		dispatcher.subscribe(can_id, self.make_handler(can_id, accumulate))
+
+	def make_handler(self, can_id, accumulate):
+		latest = self.latest
+
+		def handler(data):
+			self.received += 1
+
+			if accumulate is not None:
+				accumulate(data)
+
+			# An unapplied payload is overwritten
+			if can_id in latest:
+				self.coalesced += 1
+			latest[can_id] = data
+
+		return handler
+
+	def timeout(self):
+		"""Seconds until pending payloads are due, None if nothing is pending."""
+		if not self.latest:
+			return None
+
+		return max(self.next_apply - time.monotonic(), 0.0)
+
+	def poll(self):
+		now = time.monotonic()
+		if now >= self.next_apply and self.latest:
+			self.flush()
+			self.next_apply = now + self.interval
+
+	def flush(self):
+		# Nothing changed, nothing to publish
+		if not self.latest:
+			return
+
+		self.apply(self.latest)
+
+		self.applied += len(self.latest)
+		self.latest.clear()
+
+	def get_counters(self):
+		return {
+			"received": self.received,
+			"coalesced": self.coalesced,
+			"applied": self.applied,
+		}
+
+	def __str__(self):
+		return "Frames received: %d, coalesced: %d, applied: %d" % (self.received, self.coalesced, self.applied)
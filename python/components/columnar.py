@@ -0,0 +1,288 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import numpy
+
+from components.settings import DashboardSettings as DS
+from components.dbc import load_dbc
+from components.capture import CaptureFile, HEADER, RECORD, is_binary_capture, open_source
+from components.messages import StateGetters
+
+#
+# Whole captures as NumPy columns, for offline analysis
+#
+#   timestamps  capture time of every frame
+#   ids         arbitration id of every frame
+#   payload     8 data bytes of every frame, zero padded like the decoders
+#
+# Signals are decoded for all frames of an id at once, and the energy and
+# consumption integrals of StateData.parse_m1/parse_m2 are computed from
+# the decoded columns. Values match the frame by frame path, except for
+# the rounding of long sums.
+#
+RECORD_DTYPE = numpy.dtype([
+	("timestamp", "<f8"),
+	("can_id", "<u4"),
+	("dlc", "u1"),
+	("pad", "V3"),
+	("data", "u1", (8,)),
+])
+
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+class ColumnarCapture(object):
+
+	def __init__(self, timestamps, ids, payload):
+		self.timestamps = timestamps
+		self.ids = ids
+		self.payload = payload
+
+		self.messages = load_dbc()
+
+	def __len__(self):
+		return len(self.timestamps)
+
+	def positions(self, can_id):
+		"""Frame numbers of all frames of 'can_id'."""
+		return numpy.flatnonzero(self.ids == can_id)
+
+	def decode(self, can_id, positions=None):
+		"""Signals of all frames of 'can_id', as a dict of arrays in DBC order.
+		Unscaled signals are integers, like the compiled decoders return."""
+		if positions is None:
+			positions = self.positions(can_id)
+
+		payload = self.payload[positions]
+		raw = payload.view("<u8").ravel()
+		raw_be = None
+
+		signals = {}
+		for s in self.messages[can_id].signals:
+			if s.little_endian:
+				value = raw >> numpy.uint64(s.bit_offset())
+			else:
+				if raw_be is None:
+					raw_be = payload.view(">u8").ravel().astype(numpy.uint64)
+				value = raw_be >> numpy.uint64(s.bit_offset())
+			if s.length < 64:
+				value &= numpy.uint64((1 << s.length) - 1)
+
+			value = value.astype(numpy.int64) if s.length < 64 or s.signed else value
+			if s.signed:
+				value = numpy.where(value >= 1 << (s.length - 1), value - (1 << s.length), value)
+
+			# Same operation as the generated decoders, see Signal.scale_expression
+			if s.scale != 1.0:
+				divisor = 1.0 / s.scale
+				if divisor == round(divisor) and 1.0 / divisor == s.scale:
+					value = value / divisor
+				else:
+					value = value * float(s.scale)
+
+			if s.offset != 0.0:
+				value = value + float(s.offset)
+
+			signals[s.name] = value
+
+		return signals
+
+
+def load_capture(filename):
+	"""Read a capture in any supported format into columns."""
+	if is_binary_capture(filename):
+		capture = CaptureFile(filename)
+		records = numpy.frombuffer(capture.mm, dtype=RECORD_DTYPE, count=len(capture), offset=HEADER.size)
+
+		# Copied, so the capture can be closed
+		columns = ColumnarCapture(records["timestamp"].copy(), records["can_id"].copy(), records["data"].copy())
+
+		del records
+		capture.close()
+		return columns
+
+	# Text and segments, frame by frame, but only once
+	source = open_source(filename)
+
+	timestamps = []
+	ids = []
+	payload = bytearray()
+
+	try:
+		frames = source.read_frames()
+		while frames is not None:
+			for timestamp, can_id, data in frames:
+				if data.__class__ is str:
+					data = bytes.fromhex(data)
+
+				timestamps.append(timestamp)
+				ids.append(can_id)
+				payload += data[:8].ljust(8, b"\0")
+
+			frames = source.read_frames()
+	finally:
+		source.close()
+
+	return ColumnarCapture(numpy.array(timestamps, dtype=numpy.float64), numpy.array(ids, dtype=numpy.uint32),
+		numpy.frombuffer(bytes(payload), dtype=numpy.uint8).reshape(-1, 8))
+
+
+def get_speed_ms(rpm):
+	"""StateGetters.get_speed_ms for an array of rpm."""
+	return numpy.where(rpm > 1.0, (StateGetters.GEARBOX_AND_WHEEL_RATIO * rpm * 1.01) / 60.0, 0.0)
+
+
+class EnergyIntegral(object):
+	"""The energy state after every M2 frame, as in StateData.integrate_m2.
+
+	The energy state is a running sum clamped at zero, and set to full by
+	M1 frames with a high voltage. Between two resets the clamped sum is
+	y = S + max(y0, -min(S)), S the cumulative sum of the changes, so
+	only the (few) resets need a loop.
+	"""
+
+	def __init__(self, capture, initial=DS.BATTERY_TOTAL_ENERGY):
+		m1 = capture.positions(0x1A6)
+		m2 = capture.positions(0x2A6)
+
+		self.m2_positions = m2
+		self.times = capture.timestamps[m2]
+
+		# Trapezoidal energy of every M2 frame, none for the first
+		power = capture.decode(0x2A6, m2)["motor_power"]
+		rate = numpy.zeros(len(m2))
+		rate[1:] = ((power[1:] + power[:-1]) / 2.0) * numpy.diff(self.times)
+		self.energy_rate = rate
+
+		# Frame numbers of the resets, and the number of resets before each M2 frame
+		voltage = capture.decode(0x1A6, m1)["dc_capacitor_voltage"]
+		resets = m1[voltage >= 168.0]
+		segment = numpy.searchsorted(resets, m2)
+
+		state = numpy.empty(len(m2))
+		bounds = numpy.flatnonzero(numpy.diff(segment)) + 1
+		for start, stop in zip(numpy.concatenate(([0], bounds)), numpy.concatenate((bounds, [len(m2)]))):
+			if start == stop:
+				continue
+
+			y0 = initial if segment[start] == 0 else DS.BATTERY_TOTAL_ENERGY
+			s = numpy.cumsum(-rate[start:stop])
+			state[start:stop] = s + numpy.maximum(y0, -numpy.minimum.accumulate(s))
+
+		self.energy_state = state
+
+		# A reset after the last M2 frame
+		if len(resets) and (len(m2) == 0 or resets[-1] > m2[-1]):
+			self.final = DS.BATTERY_TOTAL_ENERGY
+		elif len(m2):
+			self.final = state[-1]
+		else:
+			self.final = initial
+
+	def rate_at(self, positions):
+		"""StateData.energy_rate when decoding the frames at 'positions'."""
+		latest = numpy.searchsorted(self.m2_positions, positions) - 1
+		return numpy.where(latest >= 0, self.energy_rate[numpy.maximum(latest, 0)], 0.0)
+
+
+class ConsumptionIntegral(object):
+	"""The seconds and minutes of ConsumptionData, as fed by StateData.integrate_m1
+	from a fresh start.
+
+	A second closes at the first driving sample more than one second after
+	the sample that closed the previous one, so the boundaries are found by
+	searchsorted from one to the next, and the sums by reduceat.
+	"""
+
+	def __init__(self, capture, energy):
+		m1 = capture.positions(0x1A6)
+		t = capture.timestamps[m1]
+		rpm = capture.decode(0x1A6, m1)["actual_speed"]
+
+		# Samples as appended, from the second M1 frame on
+		speed_ms = get_speed_ms(rpm)
+		speed = (speed_ms[1:] + speed_ms[:-1]) / 2.0
+		dt = numpy.diff(t)
+		rate = energy.rate_at(m1[1:])
+
+		driving = speed >= 1.0
+		times = t[1:][driving]
+		sample_energy = rate[driving]
+		sample_distance = (speed * dt)[driving]
+
+		# Sample numbers closing a second
+		closes = []
+		if len(times):
+			reset = times[0]
+			i = numpy.searchsorted(times, reset + 1.0, side="right")
+			while i < len(times):
+				closes.append(i)
+				reset = times[i]
+				i = numpy.searchsorted(times, reset + 1.0, side="right")
+
+		closes = numpy.array(closes, dtype=numpy.intp)
+		starts = numpy.concatenate(([0], closes[:-1] + 1)).astype(numpy.intp)
+
+		# Still in the high frequency sums after the last second
+		rest = closes[-1] + 1 if len(closes) else 0
+
+		if len(closes):
+			self.second_energy = numpy.add.reduceat(sample_energy[:rest], starts)
+			self.second_distance = numpy.add.reduceat(sample_distance[:rest], starts)
+			self.second_times = times[closes]
+		else:
+			self.second_energy = numpy.zeros(0)
+			self.second_distance = numpy.zeros(0)
+			self.second_times = numpy.zeros(0)
+
+		self.hf_energy = sample_energy[rest:].sum()
+		self.hf_distance = sample_distance[rest:].sum()
+
+		# A minute is closed by its 61st second, see ConsumptionData.add_second
+		count = len(self.second_energy) // 61 * 61
+		self.minute_energy = self.second_energy[:count].reshape(-1, 61).sum(axis=1)
+		self.minute_distance = self.second_distance[:count].reshape(-1, 61).sum(axis=1)
+
+	def get_minutes(self):
+		"""The DS.CONSUMPTION_MINUTES latest minutes, oldest first, defaults before any."""
+		default_energy, default_distance = DS.DEFAULT_ENERGY_CONSUMPTION * 1000.0, 1000.0
+
+		energy = numpy.full(DS.CONSUMPTION_MINUTES, default_energy)
+		distance = numpy.full(DS.CONSUMPTION_MINUTES, default_distance)
+
+		count = min(len(self.minute_energy), DS.CONSUMPTION_MINUTES)
+		if count:
+			energy[-count:] = self.minute_energy[-count:]
+			distance[-count:] = self.minute_distance[-count:]
+
+		return energy, distance
+
+	def get_avg_consumption(self):
+		energy, distance = self.get_minutes()
+		return energy.sum() / distance.sum()
+
+	def get_latest_consumption(self):
+		energy, distance = self.get_minutes()
+		return energy[-1] / distance[-1]
+
+	def get_window_consumption(self, seconds=None, distance=None):
+		"""Consumption over the newest seconds, as ConsumptionWindow with these limits."""
+		energy = self.second_energy
+		meters = self.second_distance
+
+		if seconds is not None or distance is not None:
+			keep = seconds if seconds else DS.CONSUMPTION_MAX_BUCKETS
+			energy = energy[-keep:]
+			meters = meters[-keep:]
+
+		# Shortest span of the newest seconds that covers the distance
+		if distance is not None and len(meters):
+			covered = numpy.cumsum(meters[::-1])
+			first = numpy.searchsorted(covered, distance)
+			if first < len(meters):
+				energy = energy[len(meters) - first - 1:]
+				meters = meters[len(meters) - first - 1:]
+
+		if meters.sum() <= 0.0:
+			return None
+
+		return energy.sum() / meters.sum()
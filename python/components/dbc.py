@@ -0,0 +1,212 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+import re
+import struct
+
+path = os.path.dirname(os.path.realpath(__file__))
+
+CURTIS_DBC_PATH = "%s/../../dbc/curtis1239.dbc" % (path)
+
+message_parser = re.compile(r"^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)")
+signal_parser = re.compile(
+	r"^SG_\s+(\w+)\s*(?:[Mm]\d*\s*)?:\s*(\d+)\|(\d+)@([01])([+-])\s*"
+	r"\(([^,]+),([^)]+)\)\s*\[([^|]*)\|([^\]]*)\]\s*\"([^\"]*)\"")
+
+# Struct codes for byte aligned little endian fields
+STRUCT_CODES = {
+	(8, False): "B", (8, True): "b",
+	(16, False): "H", (16, True): "h",
+	(32, False): "I", (32, True): "i",
+	(64, False): "Q", (64, True): "q",
+}
+
+
+class Signal(object):
+	def __init__(self, name, start, length, signed=False, scale=1.0, offset=0.0, little_endian=True, unit=""):
+		self.name = name
+		self.start = start
+		self.length = length
+		self.signed = signed
+		self.scale = scale
+		self.offset = offset
+		self.little_endian = little_endian
+		self.unit = unit
+
+	def is_byte_aligned(self):
+		return self.little_endian and self.start % 8 == 0 and (self.length, self.signed) in STRUCT_CODES
+
+	def bit_offset(self):
+		"""Position of the least significant bit in the 8 byte payload read
+		as one integer, little endian for Intel signals and big endian for
+		Motorola ones. The start bit of a Motorola signal is its most
+		significant bit, numbered from the low bit of each byte."""
+		if self.little_endian:
+			offset = self.start
+		else:
+			msb = (self.start // 8) * 8 + 7 - self.start % 8
+			offset = 63 - (msb + self.length - 1)
+
+		if offset < 0 or offset + self.length > 64:
+			raise ValueError("Signal %s does not fit in 8 bytes" % self.name)
+
+		return offset
+
+	def scale_expression(self, var):
+		"""Python expression converting the raw value in 'var' to physical units.
+		Scales like 0.1 are applied as a division by 10.0, giving the exact same
+		result as dividing the raw value by hand.
+		"""
+		expr = var
+		if self.scale != 1.0:
+			divisor = 1.0 / self.scale
+			if divisor == round(divisor) and 1.0 / divisor == self.scale:
+				expr = "%s / %r" % (expr, divisor)
+			else:
+				expr = "%s * %r" % (expr, float(self.scale))
+
+		if self.offset != 0.0:
+			expr = "%s + %r" % (expr, float(self.offset))
+
+		return expr
+
+
+class Message(object):
+	def __init__(self, can_id, name, dlc, signals=None):
+		self.can_id = can_id
+		self.name = name
+		self.dlc = dlc
+		self.signals = signals if signals is not None else []
+
+	@property
+	def signal_names(self):
+		return [s.name for s in self.signals]
+
+	def get_signal(self, name):
+		for s in self.signals:
+			if s.name == name:
+				return s
+
+		raise KeyError(name)
+
+
+def parse_dbc(text):
+	"""Parse message (BO_) and signal (SG_) definitions from DBC text.
+	Returns a dict of arbitration id -> Message, signals in file order.
+	"""
+	messages = {}
+	message = None
+
+	for line in text.splitlines():
+		line = line.strip()
+
+		m = message_parser.match(line)
+		if m:
+			can_id = int(m.group(1)) & 0x1FFFFFFF
+			message = Message(can_id, m.group(2), int(m.group(3)))
+			messages[can_id] = message
+			continue
+
+		m = signal_parser.match(line)
+		if m and message is not None:
+			message.signals.append(Signal(
+				name=m.group(1),
+				start=int(m.group(2)),
+				length=int(m.group(3)),
+				little_endian=(m.group(4) == "1"),
+				signed=(m.group(5) == "-"),
+				scale=float(m.group(6)),
+				offset=float(m.group(7)),
+				unit=m.group(10)))
+			continue
+
+		# Any other statement ends the signal list of a message
+		if line:
+			message = None
+
+	return messages
+
+
+def load_dbc(filename=CURTIS_DBC_PATH):
+	with open(filename, "r") as f:
+		return parse_dbc(f.read())
+
+
+def compile_decoder(message):
+	"""Generate a decoder function for one message.
+
+	The decoder takes the payload as bytes or a hex string and returns a
+	tuple of the physical values, in the order the signals are declared.
+	Byte aligned layouts decode with a single precompiled struct.unpack_from.
+	Raises ValueError for signals that do not fit in 8 bytes.
+	"""
+	signals = message.signals
+	names = ["v%d" % i for i in range(len(signals))]
+
+	# Before any layout is built from them
+	for s in signals:
+		s.bit_offset()
+
+	aligned = all([s.is_byte_aligned() for s in signals])
+	if aligned:
+		# Build struct format in byte order, padding the gaps
+		fmt = "<"
+		byte_pos = 0
+		order = []
+		for index, s in sorted(enumerate(signals), key=lambda x: x[1].start):
+			sbyte = s.start // 8
+			if sbyte < byte_pos:
+				aligned = False
+				break
+
+			fmt += "x" * (sbyte - byte_pos)
+			fmt += STRUCT_CODES[(s.length, s.signed)]
+			byte_pos = sbyte + s.length // 8
+			order.append(names[index])
+
+	lines = [
+		"def decode(data):",
+		"	if data.__class__ is str:",
+		"		data = fromhex(data)",
+	]
+
+	if aligned:
+		layout = struct.Struct(fmt)
+		size = layout.size
+		lines += [
+			"	if len(data) < %d:" % size,
+			"		data = data.ljust(%d, b'\\0')" % size,
+			"	%s, = unpack_from(data)" % ", ".join(order),
+		]
+		namespace = {"fromhex": bytes.fromhex, "unpack_from": layout.unpack_from}
+	else:
+		# Generic bit extraction for fields not on byte boundaries or big endian
+		lines.append("	data = data.ljust(8, b'\\0')")
+		if any([s.little_endian for s in signals]):
+			lines.append("	raw = from_bytes(data, 'little')")
+		if any([not s.little_endian for s in signals]):
+			lines.append("	raw_be = from_bytes(data, 'big')")
+		for name, s in zip(names, signals):
+			mask = (1 << s.length) - 1
+			raw = "raw" if s.little_endian else "raw_be"
+			lines.append("	%s = (%s >> %d) & %d" % (name, raw, s.bit_offset(), mask))
+			if s.signed:
+				lines.append("	if %s & %d:" % (name, 1 << (s.length - 1)))
+				lines.append("		%s -= %d" % (name, 1 << s.length))
+		namespace = {"fromhex": bytes.fromhex, "from_bytes": int.from_bytes}
+
+	values = [s.scale_expression(name) for name, s in zip(names, signals)]
+	lines.append("	return (%s,)" % ", ".join(values))
+
+	source = "\n".join(lines)
+	exec(compile(source, "<decoder %s>" % message.name, "exec"), namespace)
+
+	decode = namespace["decode"]
+	decode.__name__ = "decode_%s" % message.name
+	decode.source = source
+	return decode
+
+
+def load_decoders(filename=CURTIS_DBC_PATH):
+	"""Compile one decoder per arbitration id from a DBC file."""
+	return dict([(can_id, compile_decoder(m)) for can_id, m in load_dbc(filename).items()])
@@ -0,0 +1,82 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import signal
+
+from components.settings import DashboardSettings as DS
+from components.messages import StateData
+from components.canreader import CanReader
+from components.journal import JournalWriter
+
+# Sources and the shared memory block are handed over by forking
+FORK = multiprocessing.get_context("fork")
+
+
+def set_cpus(cpus):
+	"""Pin the calling process to 'cpus', if the platform allows it."""
+	if not cpus or not hasattr(os, "sched_setaffinity"):
+		return
+
+	try:
+		os.sched_setaffinity(0, cpus)
+	except (OSError, ValueError):
+		# E.g. fewer cores than configured
+		pass
+
+
+#
+# Reads, decodes and integrates the CAN frames in a process of its own,
+# so rendering in the GUI process never delays the frames. The state is
+# published to shared memory after every message that changes it and
+# journaled to disk from here, as this process owns it.
+#
+class DecodeProcess(FORK.Process):
+
+	def __init__(self, writer, shutdown, replay_mode, source, coalesce_rate=None, replay=None, record_dir=None):
+		super().__init__()
+		self.writer = writer
+		self.shutdown = shutdown
+		self.replay_mode = replay_mode
+		self.source = source
+		self.coalesce_rate = coalesce_rate
+		self.replay = replay
+		self.record_dir = record_dir
+
+	def run(self):
+		# Ctrl-C reaches the whole process group, the GUI process handles it
+		signal.signal(signal.SIGINT, signal.SIG_IGN)
+		set_cpus(DS.DECODE_CPUS)
+
+		# Every message that changes a value is published right away
+		states = StateData(persist=not self.replay_mode)
+		self.writer.publish(states)
+		states.subscribe(self.writer.write_snapshot)
+
+		if self.record_dir:
+			from components.recorder import CaptureRecorder
+			recorder = CaptureRecorder(self.record_dir, self.shutdown)
+			recorder.start()
+		else:
+			recorder = None
+
+		c = CanReader(states, None, self.shutdown, self.replay_mode, self.source, self.coalesce_rate, self.replay, recorder)
+		c.start()
+
+		if states.journal is not None:
+			journal = JournalWriter(states, self.shutdown)
+			journal.start()
+		else:
+			journal = None
+
+		while not self.shutdown.wait(DS.BUS_STATS_REPORT_INTERVAL):
+			if DS.DEBUG and c.stats is not None:
+				print(c.stats)
+				print(states.format_change_rates())
+
+		c.join()
+		if journal is not None:
+			journal.join()
+
+		if recorder is not None:
+			recorder.join()
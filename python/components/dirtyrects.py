@@ -0,0 +1,116 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+
+# Value of a widget that has not been drawn yet
+UNSET = object()
+
+
+class Widget(object):
+	"""Part of the screen drawn from one value, e.g. a needle or a readout.
+
+	'value' returns what the widget shows. 'draw' turns it into a blit,
+	(surface, position, bounds), or None if nothing is shown. The bounds
+	are the screen area the surface actually covers. Low priority widgets
+	may be left as they are for some frames when the GUI is overloaded.
+	"""
+
+	def __init__(self, value, draw, low_priority=False):
+		self.value = value
+		self.draw = draw
+		self.low_priority = low_priority
+
+		self.key = UNSET
+		self.blit = None
+
+
+#
+# Redraws only the parts of the screen whose widgets changed. The old
+# and new bounds of a changed widget are restored from the background,
+# all widgets overlapping them are drawn again in order, clipped, and
+# only those areas are passed on to the display.
+#
+class DirtyRenderer(object):
+
+	def __init__(self, screen, background, widgets):
+		self.screen = screen
+		self.background = background
+		self.widgets = widgets
+		self.full = True
+
+		# Statistics
+		self.frames = 0
+		self.pixels = 0
+
+	def invalidate(self):
+		"""Redraw the whole screen next frame, e.g. after it was exposed."""
+		self.full = True
+
+	def render(self, low_priority=True):
+		"""Draw the changed parts of the screen, low priority widgets only if
+		'low_priority'. Returns the rects to update."""
+		dirty = []
+		for widget in self.widgets:
+			if widget.low_priority and not low_priority:
+				continue
+
+			key = widget.value()
+			if key == widget.key:
+				continue
+
+			widget.key = key
+			if widget.blit is not None:
+				dirty.append(widget.blit[2])
+
+			widget.blit = widget.draw(key)
+			if widget.blit is not None:
+				dirty.append(widget.blit[2])
+
+		screen = self.screen
+		if self.full:
+			self.full = False
+			dirty = [screen.get_rect()]
+		else:
+			dirty = self.merge(dirty, screen.get_rect())
+
+		for rect in dirty:
+			screen.set_clip(rect)
+			screen.blit(self.background, rect, rect)
+
+			for widget in self.widgets:
+				blit = widget.blit
+				if blit is not None and rect.colliderect(blit[2]):
+					screen.blit(blit[0], blit[1])
+
+		screen.set_clip(None)
+
+		self.frames += 1
+		self.pixels += sum([rect.width * rect.height for rect in dirty])
+
+		return dirty
+
+	@staticmethod
+	def merge(rects, bounds):
+		"""Overlapping rects joined, so no area is drawn twice."""
+		merged = []
+		for rect in rects:
+			rect = rect.clip(bounds)
+			if rect.width == 0 or rect.height == 0:
+				continue
+
+			# Joining may make the rect overlap earlier ones
+			i = 0
+			while i < len(merged):
+				if rect.colliderect(merged[i]):
+					rect = rect.union(merged.pop(i))
+					i = 0
+				else:
+					i += 1
+
+			merged.append(rect)
+
+		return merged
+
+	def __str__(self):
+		area = self.screen.get_width() * self.screen.get_height()
+		return "Dirty rects: %.1f %% of the screen per frame over %d frames" % (
+			100.0 * self.pixels / (area * self.frames) if self.frames else 0.0, self.frames)
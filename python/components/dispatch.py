@@ -0,0 +1,61 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from components.settings import DashboardSettings as DS
+
+
+#
+# Maps integer arbitration ids to the handlers interested in them.
+# Handlers are called with the frame payload. The handler tuples are
+# replaced, never modified, so subscribing from another thread is safe
+# while frames are being dispatched.
+#
+class FrameDispatcher(object):
+
+	def __init__(self, report_interval=DS.UNKNOWN_ID_REPORT_INTERVAL):
+		self.handlers = {}
+		self.lock = threading.Lock()
+
+		# Frame count per unknown id, reported at most once per interval
+		self.unknown = {}
+		self.report_interval = report_interval
+		self.next_report = 0.0
+
+	def subscribe(self, can_id, handler):
+		with self.lock:
+			self.handlers[can_id] = self.handlers.get(can_id, ()) + (handler,)
+
+	def unsubscribe(self, can_id, handler):
+		with self.lock:
+			handlers = list(self.handlers.get(can_id, ()))
+			if handler in handlers:
+				handlers.remove(handler)
+				self.handlers[can_id] = tuple(handlers)
+
+	def ignore(self, can_id):
+		"""Mark an id as known without handling it (e.g. heartbeats)."""
+		with self.lock:
+			self.handlers.setdefault(can_id, ())
+
+	def dispatch(self, can_id, data):
+		handlers = self.handlers.get(can_id)
+		if handlers is None:
+			self.unknown_frame(can_id)
+			return
+
+		for handler in handlers:
+			handler(data)
+
+	def unknown_frame(self, can_id):
+		self.unknown[can_id] = self.unknown.get(can_id, 0) + 1
+
+		now = time.monotonic()
+		if now >= self.next_report:
+			self.next_report = now + self.report_interval
+			self.report_unknown()
+
+	def report_unknown(self):
+		counts = ", ".join(["%03X: %d" % (can_id, count) for can_id, count in sorted(self.unknown.items())])
+		print("UNKNOWN CAN DATA (frames per id):", counts)
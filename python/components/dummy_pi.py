@@ -10,8 +10,12 @@ class GPIO(object):
 	LOW = "low"
 	PUD_DOWN = "PULL DOWN"
 	PUD_UP = "PULL UP"
+	RISING = "rising"
+	FALLING = "falling"
+	BOTH = "both"
 	__mode = "not set"
 	__pins = [(None, None)]*50
+	__callbacks = {}
 
 	@classmethod
 	def setmode(cls, mode):
@@ -39,6 +43,21 @@ class GPIO(object):
 		print("Changed pin %d from '%s' to '%s'" % (pin, current_state[1], state))
 		cls.__pins[pin] = (cls.__pins[pin][0], state)
 
+		# Edge detection, RPi.GPIO calls back from its own thread
+		callback = cls.__callbacks.get(pin)
+		if callback is not None and state != current_state[1]:
+			callback(pin)
+
+	@classmethod
+	def add_event_detect(cls, pin, edge, callback=None, bouncetime=None):
+		if cls.__pins[pin][0] != GPIO.IN:
+			raise RuntimeError("Pin %d is not an input pin." % (pin))
+		cls.__callbacks[pin] = callback
+
+	@classmethod
+	def remove_event_detect(cls, pin):
+		cls.__callbacks.pop(pin, None)
+
 	@classmethod
 	def input(cls, pin):
 		if cls.__pins[pin][0] != GPIO.IN:
@@ -50,3 +69,4 @@ class GPIO(object):
 	@classmethod
 	def cleanup(cls):
 		print("Cleaning up")
+		cls.__callbacks.clear()
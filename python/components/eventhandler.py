@@ -39,6 +39,9 @@ class TurnHandler(threading.Thread):
 
 		self.cycle_count = 0
 
+		# Called when blinking starts, an event loop parks the blinker meanwhile
+		self.on_activate = None
+
 		GPIO.output(DS.TURN_LEFT_OUT_PCB_PIN, RELAY_OFF)
 		GPIO.output(DS.TURN_RIGHT_OUT_PCB_PIN, RELAY_OFF)
 
@@ -47,11 +50,17 @@ class TurnHandler(threading.Thread):
 		# Start off with false because it is swapped directly in the run loop
 		self.left_state = False
 		self.cycle_count = 0
+		self.activated()
 
 	def activate_right(self):
 		self.right_active = True
 		self.right_state = False
 		self.cycle_count = 0
+		self.activated()
+
+	def activated(self):
+		if self.on_activate is not None:
+			self.on_activate()
 
 	def deactivate_left(self):
 		self.left_active = False
@@ -63,38 +72,44 @@ class TurnHandler(threading.Thread):
 		self.right_state = False
 		GPIO.output(DS.TURN_RIGHT_OUT_PCB_PIN, RELAY_OFF)
 
-	def run(self):
+	def blink_active(self):
+		"""Blinks while a signal is active, yields the time to sleep before the next step."""
+		while (self.left_active or self.right_active) and not self.shutdown.is_set():
+			if self.left_active:
+				self.left_state = not self.left_state
+				gpiostate = RELAY_ON if self.left_state else RELAY_OFF
+				GPIO.output(DS.TURN_LEFT_OUT_PCB_PIN, gpiostate)
+
+			if self.right_active:
+				self.right_state = not self.right_state
+				gpiostate = RELAY_ON if self.right_state else RELAY_OFF
+				GPIO.output(DS.TURN_RIGHT_OUT_PCB_PIN, gpiostate)
+
+			# Auto shut off if we reach soft limit
+			if self.hard_turn_signal is False:
+				if self.cycle_count > DS.SOFT_TURN_SIGNAL_MAX:
+					self.deactivate_right()
+					self.deactivate_left()
+					return
+
+			self.cycle_count += 1
+			yield self.interval
+
+	def blink(self):
+		"""Drives the blinking, yields the time to sleep before the next step."""
 		while not self.shutdown.is_set():
+			yield from self.blink_active()
+			yield 0.1
 
-			while (self.left_active or self.right_active) and not self.shutdown.is_set():
-				if self.left_active:
-					self.left_state = not self.left_state
-					gpiostate = RELAY_ON if self.left_state else RELAY_OFF
-					GPIO.output(DS.TURN_LEFT_OUT_PCB_PIN, gpiostate)
-
-				if self.right_active:
-					self.right_state = not self.right_state
-					gpiostate = RELAY_ON if self.right_state else RELAY_OFF
-					GPIO.output(DS.TURN_RIGHT_OUT_PCB_PIN, gpiostate)
-
-				# Auto shut off if we reach soft limit
-				if self.hard_turn_signal is False:
-					if self.cycle_count > DS.SOFT_TURN_SIGNAL_MAX:
-						self.deactivate_right()
-						self.deactivate_left()
-						break
-
-				self.cycle_count += 1
-				time.sleep(self.interval)
-
-			# Note the indent
-			time.sleep(0.1)
+	def run(self):
+		for delay in self.blink():
+			time.sleep(delay)
 
 
 
 class EventHandler(threading.Thread):
 
-	def __init__(self, objects, shutdown, replay_mode=True):
+	def __init__(self, objects, shutdown, replay_mode=True, threaded=True):
 		super().__init__()
 		#self.objects = objects
 		self.shutdown = shutdown
@@ -108,8 +123,10 @@ class EventHandler(threading.Thread):
 			GPIO.output(pin, RELAY_OFF)
 
 
+		# Without threads the blinking is driven by the caller
 		self.turn_signal = TurnHandler(shutdown)
-		self.turn_signal.start()
+		if threaded:
+			self.turn_signal.start()
 
 		self.warning_active = False
 		self.highbeam_active = False
@@ -178,13 +195,19 @@ class EventHandler(threading.Thread):
 		gpiostate = RELAY_ON if state else RELAY_OFF
 		GPIO.output(DS.HORN_OUT_PCB_PIN, gpiostate)
 
+	#
+	# The input polling is written as generators that yield the time to
+	# sleep, so it can be driven by this thread or by an event loop. The
+	# event loop only runs check_inputs() when an edge is detected.
+	#
+
 	def wait_for_release(self, pin1_number, pin2_number=None):
 		wait_count = 0
 		if not pin2_number:
 			# Single button pushed
 			while GPIO.input(pin1_number) == INPUT_ON and not self.shutdown.is_set():
 				wait_count += 1
-				time.sleep(0.1)
+				yield 0.1
 		else:
 			# Two button push
 			while GPIO.input(pin1_number) == INPUT_ON and \
@@ -192,82 +215,96 @@ class EventHandler(threading.Thread):
 				not self.shutdown.is_set():
 
 				wait_count += 1
-				time.sleep(0.1)
+				yield 0.1
 
 		return wait_count
 
 	def make_sure_pushed(self, pin_number):
 		count = 0
-		time.sleep(0.05)
+		yield 0.05
 		count += (GPIO.input(pin_number) == INPUT_ON)
-		time.sleep(0.05)
+		yield 0.05
 		count += (GPIO.input(pin_number) == INPUT_ON)
 
 		return count == 2
 
-	def run(self):
+	def detect_edges(self, callback):
+		"""Call 'callback()' from the GPIO thread when any input changes."""
+		for pin in DS.IN_PINS:
+			GPIO.add_event_detect(pin, GPIO.BOTH, callback=lambda channel: callback())
 
+	def poll_inputs(self):
 		while not self.shutdown.is_set():
+			yield from self.check_inputs()
+			yield 0.1
+
+	def check_inputs(self):
+		"""Act on the inputs once. Sleeps only to debounce, or while a
+		button is held."""
+		# BRAKE LIGHT
+		pinstate = GPIO.input(DS.BRAKE_LIGHT_IN_PCB_PIN)
+		if pinstate == INPUT_ON:
+			if (yield from self.make_sure_pushed(DS.BRAKE_LIGHT_IN_PCB_PIN)):
+				self.set_brake(True)
+		else:
+			self.set_brake(False)
 
-			# BRAKE LIGHT
-			pinstate = GPIO.input(DS.BRAKE_LIGHT_IN_PCB_PIN)
-			if pinstate == INPUT_ON:
-				if self.make_sure_pushed(DS.BRAKE_LIGHT_IN_PCB_PIN):
-					self.set_brake(True)
-			else:
-				self.set_brake(False)
+		# HIGH BEAM
+		pinstate = GPIO.input(DS.HIGHBEAM_IN_PCB_PIN)
+		if pinstate == INPUT_ON:
+			print("Highbeam GPIO is on")
+			self.set_highbeam(True)
+		else:
+			self.set_highbeam(False)
 
-			# HIGH BEAM
-			pinstate = GPIO.input(DS.HIGHBEAM_IN_PCB_PIN)
-			if pinstate == INPUT_ON:
-				print("Highbeam GPIO is on")
-				self.set_highbeam(True)
-			else:
-				self.set_highbeam(False)
+		# HORN
+		pinstate = GPIO.input(DS.HORN_IN_PCB_PIN)
+		if pinstate == INPUT_ON:
+			if (yield from self.make_sure_pushed(DS.HORN_IN_PCB_PIN)):
+				self.set_horn(True)
+		else:
+			self.set_horn(False)
 
-			# HORN
-			pinstate = GPIO.input(DS.HORN_IN_PCB_PIN)
-			if pinstate == INPUT_ON:
-				if self.make_sure_pushed(DS.HORN_IN_PCB_PIN):
-					self.set_horn(True)
-			else:
-				self.set_horn(False)
 
+		#
+		# TURN SIGNALS AND WARNING
+		#
 
-			#
-			# TURN SIGNALS AND WARNING
-			#
+		pinleft = GPIO.input(DS.TURN_LEFT_IN_PCB_PIN)
+		pinright = GPIO.input(DS.TURN_RIGHT_IN_PCB_PIN)
 
-			pinleft = GPIO.input(DS.TURN_LEFT_IN_PCB_PIN)
-			pinright = GPIO.input(DS.TURN_RIGHT_IN_PCB_PIN)
+		# This means warning turn signals
+		if pinleft == INPUT_ON and pinright == INPUT_ON:
+			wait_count = yield from self.wait_for_release(DS.TURN_LEFT_IN_PCB_PIN, DS.TURN_RIGHT_IN_PCB_PIN)
+			if wait_count > 2:
+				self.toggle_warning()
 
-			# This means warning turn signals
-			if pinleft == INPUT_ON and pinright == INPUT_ON:
-				wait_count = self.wait_for_release(DS.TURN_LEFT_IN_PCB_PIN, DS.TURN_RIGHT_IN_PCB_PIN)
-				if wait_count > 2:
-					self.toggle_warning()
+		# Left only
+		elif pinleft == INPUT_ON:
+			self.toggle_left_turn()
 
-			# Left only
-			elif pinleft == INPUT_ON:
-				self.toggle_left_turn()
+			# Wait until the button is released
+			wait_count = yield from self.wait_for_release(DS.TURN_LEFT_IN_PCB_PIN)
 
-				# Wait until the button is released
-				wait_count = self.wait_for_release(DS.TURN_LEFT_IN_PCB_PIN)
+			# If we hold it long enough we should blink until button pushed next time
+			self.set_turn_duration(wait_count > DS.HARD_TURN_SIGNAL_LIMIT)
 
-				# If we hold it long enough we should blink until button pushed next time
-				self.set_turn_duration(wait_count > DS.HARD_TURN_SIGNAL_LIMIT)
+		# Turn signal Right
+		elif pinright == INPUT_ON:
+			self.toggle_right_turn()
 
-			# Turn signal Right
-			elif pinright == INPUT_ON:
-				self.toggle_right_turn()
+			# Wait until the button is released
+			wait_count = yield from self.wait_for_release(DS.TURN_RIGHT_IN_PCB_PIN)
 
-				# Wait until the button is released
-				wait_count = self.wait_for_release(DS.TURN_RIGHT_IN_PCB_PIN)
+			# If we hold it long enough we should blink until button pushed next time
+			self.set_turn_duration(wait_count > DS.HARD_TURN_SIGNAL_LIMIT)
 
-				# If we hold it long enough we should blink until button pushed next time
-				self.set_turn_duration(wait_count > DS.HARD_TURN_SIGNAL_LIMIT)
+	def cleanup(self):
+		GPIO.cleanup()
 
-			time.sleep(0.1)
+	def run(self):
+		for delay in self.poll_inputs():
+			time.sleep(delay)
 
 		time.sleep(1.0)
-		GPIO.cleanup()
+		self.cleanup()
@@ -1,7 +1,6 @@
 #!/usr/bin/python -B
 # -*- coding: utf-8 -*-
 
-import time
 import os
 
 import pygame
@@ -10,6 +9,9 @@ import pygame.gfxdraw
 from components.settings import DashboardSettings as DS
 
 from .basegui import BaseGUI
+from components.dirtyrects import Widget, DirtyRenderer
+from components.needles import NeedleAtlas
+from components.assets import flatten, load_sprite
 
 if DS.DEBUG:
 	from components.dummy_pi import GPIO
@@ -20,8 +22,8 @@ IMAGE_DIR = "images-fluke"
 
 class FlukeGUI(BaseGUI):
 
-	def __init__(self, states, event_handler, shutdown, fullscreen):
-		super(FlukeGUI, self).__init__(states, shutdown, fullscreen)
+	def __init__(self, states, event_handler, shutdown, fullscreen, replay=None):
+		super(FlukeGUI, self).__init__(states, shutdown, fullscreen, replay)
 
 		self.event_handler = event_handler
 
@@ -30,26 +32,27 @@ class FlukeGUI(BaseGUI):
 		self.warning_signal = False
 		self.highbeam = False
 
-		self.highbeam_img = self.load_image('high_beam.png')
-		self.left_turn_img = self.load_image('left_turn.png')
-		self.right_turn_img = self.load_image('right_turn.png')
-		self.warning_signal_img = self.load_image('warn_signal.png')
+		# Overlays trimmed to what they cover
+		self.highbeam_img = load_sprite(self.image_path('high_beam.png'))
+		self.left_turn_img = load_sprite(self.image_path('left_turn.png'))
+		self.right_turn_img = load_sprite(self.image_path('right_turn.png'))
+		self.warning_signal_img = load_sprite(self.image_path('warn_signal.png'))
 
 		self.bsegments = []
 		for index in range(1,7):
 			imagefile = "battery_%d.png" % index
-			segment = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, imagefile))
-			self.bsegments.append(segment.convert_alpha())
+			self.bsegments.append(load_sprite(self.image_path(imagefile)))
 
-		self.powerneedle = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'kw_needle.png'))
-		self.powerneedle = self.powerneedle.convert_alpha()
+		# The needles over the sweep of the gauges, rotated once
+		angles = [self.power_angle(power) for power in DS.POWER_NEEDLE_RANGE]
+		self.power_atlas = NeedleAtlas(self.image_path('kw_needle.png'), min(angles), max(angles))
 
-		self.speedneedle = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'speed_needle.png'))
-		self.speedneedle = self.speedneedle.convert_alpha()
+		angles = [self.speed_angle(speed) for speed in DS.SPEED_NEEDLE_RANGE]
+		self.speed_atlas = NeedleAtlas(self.image_path('speed_needle.png'), min(angles), max(angles))
 
-		self.bg = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, 'background.png'))
-		self.bg = self.bg.convert_alpha()
-		self.bg = pygame.transform.scale(self.bg, (800, 480))
+		# The screen is restored from here where widgets changed
+		background = flatten([self.image_path('background.png')], self.screen.get_size())
+		self.renderer = DirtyRenderer(self.screen, background, self.make_widgets())
 
 	@staticmethod
 	def check_mouse_inside(pos, rect):
@@ -72,183 +75,119 @@ class FlukeGUI(BaseGUI):
 		self.draw_text(self.screen, "%.01f" % value, 15, (x, y), topright=True)
 		self.draw_text(self.screen, unit, 15, (x+10, y))
 
-	def draw_battery(self):
-
+	def battery_index(self):
 		soc = self.states.get_soc_percent()
 		image_index = int(soc * 6)
 
 		if image_index > 5:
 			image_index = 5
 
-		if image_index < 0:
-			return
-
-		self.screen.blit(self.bsegments[image_index], (0,0))
+		return image_index
 
+	def battery_segment(self, image_index):
+		if image_index < 0:
+			return None
 
-	def draw_power(self):
+		return self.bsegments[image_index]
 
-		power = self.states.get_motor_power()
-		needle = pygame.transform.rotozoom(self.powerneedle, -power*(160.0/70.0), 1.0)
-		pos = needle.get_rect()
-		pos.centerx = 503
-		pos.centery = 189
-		self.screen.blit(needle, pos)
+	@staticmethod
+	def power_angle(power):
+		return -power*(160.0/70.0)
 
-	def draw_speed(self):
+	@staticmethod
+	def speed_angle(speed):
+		return -speed*(180.0/160.0)
 
-		speed = self.states.get_speed_kmh()
-		needle = pygame.transform.rotozoom(self.speedneedle, -speed*(180.0/160.0), 1.0)
-		pos = needle.get_rect()
-		pos.centerx = 399
-		pos.centery = 187
-		self.screen.blit(needle, pos)
+	def power_needle(self, angle):
+		return self.power_atlas.blit(angle, (503, 189))
 
-	def draw_background(self):
-		self.screen.blit(self.bg, (0,0))
+	def speed_needle(self, angle):
+		return self.speed_atlas.blit(angle, (399, 187))
 
 	@staticmethod
-	def load_image(filename):
-		img = pygame.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, filename))
-		img = img.convert_alpha()
-		return img
+	def image_path(filename):
+		return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', IMAGE_DIR, filename)
 
 	def draw_text(self, scr, text, size, pos, font=FONT_NAME, color=(255, 255, 255), topright=False):
 		super(FlukeGUI, self).draw_text(scr, text, size, pos, font, color, topright)
 
-
-	def show_full_image(self, img):
-		self.screen.blit(img, (0, 0))
-
-	def draw_highbeam(self):
-		if self.event_handler.highbeam_active:
-			self.show_full_image(self.highbeam_img)
-
-	def draw_turn_left(self):
-		if self.event_handler.turn_signal.left_state:
-			self.show_full_image(self.left_turn_img)
-
-	def draw_turn_right(self):
-		if self.event_handler.turn_signal.right_state:
-			self.show_full_image(self.right_turn_img)
-
-	def draw_warning_signal(self):
-		if self.event_handler.warning_active:
-			self.show_full_image(self.warning_signal_img)
-
-	def print_rpm(self):
-		rpm = self.states.get_actual_speed()
-		self.draw_text(self.screen, str(rpm), 60, (20, 217))
-
-	def print_power(self):
-		power = self.states.get_motor_power()
-		self.draw_text(self.screen, "%.01f" % power, 60, (20, 325))
-
-	def print_current(self):
-		current = self.states.get_motor_rms_current()
-		self.draw_text(self.screen, str(current), 60, (20, 107))
-
-	def print_battery_voltage(self):
-		voltage = self.states.get_dc_capacitor_voltage()
-		self.draw_text(self.screen, "%.0f" % voltage, 30, (590, 109))
-
-	def print_range(self):
-		range = self.states.get_odometer()
-		self.draw_text(self.screen, "%.0f" % range, 60, (635, 322), topright=True)
-
-	def print_odometer(self):
-		odometer = self.states.get_odometer()
-		self.draw_text(self.screen, "%.0f" % odometer, 45, (754, 430), topright=True)
-
-	def print_ctrl_temp(self):
-		temp = self.states.get_controller_temp()
-		self.draw_text(self.screen, "%.0f" % temp, 45, (527, 430), topright=True)
-
-	def print_motor_temp(self):
-		temp = self.states.get_motor_temp()
-		self.draw_text(self.screen, "%.0f" % temp, 45, (304, 430), topright=True)
-
-	def print_dcdc(self):
-		dcdc = self.states.get_dcdc()
-		self.draw_text(self.screen, "%.01f" % dcdc, 45, (120, 430), topright=True)
-
-
-	def run(self):
-		while not self.shutdown.is_set():
-
-			#
-			#
-			# Draw everything on the screen
-			#
-			#
-			self.draw_background()
-			self.draw_speed()
-			self.draw_battery()
-			self.draw_power()
-			self.draw_turn_left()
-			self.draw_turn_right()
-			self.draw_warning_signal()
-			self.draw_highbeam()
-
-			self.print_rpm()
-			self.print_power()
-			self.print_current()
-			self.print_battery_voltage()
-			#self.print_range()
-			self.print_odometer()
-			self.print_ctrl_temp()
-			self.print_motor_temp()
-			self.print_dcdc()
-
-			pygame.display.flip()
-
-			#
-			#
-			# Handle screen events
-			#
-			#
-
-			ev = pygame.event.get()
-			for event in ev:
-
-				# Handle quit message received
-				if event.type == pygame.QUIT:
+	def readout(self, value, size, pos, topright=False, low_priority=False):
+		"""Widget for a text drawn like draw_text."""
+		return Widget(value, lambda text: self.text_blit(text, size, pos, FONT_NAME, (255, 255, 255), topright), low_priority)
+
+	def make_widgets(self):
+		"""Everything drawn on the background, bottom first. Slowly changing
+		values are low priority."""
+		states = lambda: self.states
+		event_handler = self.event_handler
+
+		return [
+			Widget(lambda: self.speed_atlas.quantize(self.speed_angle(states().get_speed_kmh())), self.speed_needle),
+			Widget(self.battery_index, self.battery_segment, low_priority=True),
+			Widget(lambda: self.power_atlas.quantize(self.power_angle(states().get_motor_power())), self.power_needle),
+
+			self.overlay(self.left_turn_img, lambda: event_handler.turn_signal.left_state),
+			self.overlay(self.right_turn_img, lambda: event_handler.turn_signal.right_state),
+			self.overlay(self.warning_signal_img, lambda: event_handler.warning_active),
+			self.overlay(self.highbeam_img, lambda: event_handler.highbeam_active),
+
+			self.readout(lambda: str(states().get_actual_speed()), 60, (20, 217)),
+			self.readout(lambda: "%.01f" % states().get_motor_power(), 60, (20, 325)),
+			self.readout(lambda: str(states().get_motor_rms_current()), 60, (20, 107)),
+			self.readout(lambda: "%.0f" % states().get_dc_capacitor_voltage(), 30, (590, 109), low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_odometer(), 45, (754, 430), topright=True, low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_controller_temp(), 45, (527, 430), topright=True, low_priority=True),
+			self.readout(lambda: "%.0f" % states().get_motor_temp(), 45, (304, 430), topright=True, low_priority=True),
+			self.readout(lambda: "%.01f" % states().get_dcdc(), 45, (120, 430), topright=True, low_priority=True),
+		]
+
+	def render(self):
+		"""Draw everything on the screen."""
+		self.present()
+
+	def handle_events(self):
+		"""Handle screen events."""
+		ev = pygame.event.get()
+		for event in ev:
+
+			# Handle quit message received
+			if event.type == pygame.QUIT:
+				self.shutdown.set()
+
+			# Only changes are drawn, redraw what another window covered
+			if event.type == pygame.VIDEOEXPOSE:
+				self.renderer.invalidate()
+
+			if event.type == pygame.KEYDOWN:
+				if event.key == pygame.K_l and DS.DEBUG:
+					GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.HIGH)
+
+			if event.type == pygame.KEYUP:
+				if event.key == pygame.K_q:
 					self.shutdown.set()
 
-				if event.type == pygame.KEYDOWN:
-					if event.key == pygame.K_l and DS.DEBUG:
-						GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.HIGH)
-
-				if event.type == pygame.KEYUP:
-					if event.key == pygame.K_q:
-						self.shutdown.set()
-
-					if event.key == pygame.K_m:
-						self.toggle_mouse_visible()
-
-					if event.key == pygame.K_l and DS.DEBUG:
-						GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.LOW)
-
+				if event.key == pygame.K_m:
+					self.toggle_mouse_visible()
 
-				# Handle on-screen controls
-				if event.type == pygame.MOUSEBUTTONUP:
-					pos = pygame.mouse.get_pos()
-					if self.check_mouse_inside(pos, DS.LEFT_TURN_BBOX):
-						self.event_handler.toggle_left_turn()
+				self.handle_replay_key(event.key)
 
-					if self.check_mouse_inside(pos, DS.RIGHT_TURN_BBOX):
-						self.event_handler.toggle_right_turn()
+				if event.key == pygame.K_l and DS.DEBUG:
+					GPIO.output(DS.TURN_LEFT_IN_PCB_PIN, GPIO.LOW)
 
-					if self.check_mouse_inside(pos, DS.WARN_LIGHT_BBOX):
-						self.event_handler.toggle_warning()
 
-					if self.check_mouse_inside(pos, DS.HIGHBEAM_BBOX):
-						self.event_handler.toggle_highbeam()
+			# Handle on-screen controls
+			if event.type == pygame.MOUSEBUTTONUP:
+				pos = pygame.mouse.get_pos()
+				if self.check_mouse_inside(pos, DS.LEFT_TURN_BBOX):
+					self.event_handler.toggle_left_turn()
 
+				if self.check_mouse_inside(pos, DS.RIGHT_TURN_BBOX):
+					self.event_handler.toggle_right_turn()
 
-			time.sleep(0.1)
+				if self.check_mouse_inside(pos, DS.WARN_LIGHT_BBOX):
+					self.event_handler.toggle_warning()
 
-		pygame.mouse.set_visible(True)
-		pygame.quit()
+				if self.check_mouse_inside(pos, DS.HIGHBEAM_BBOX):
+					self.event_handler.toggle_highbeam()
 
 
@@ -0,0 +1,104 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import collections
+import time
+
+from components.settings import DashboardSettings as DS
+
+
+#
+# Frames at a fixed rate on monotonic deadlines, so the time spent drawing
+# does not stretch the interval. Late frames are not made up for, the
+# cadence restarts from the late frame.
+#
+# The load is judged every GUI_PACE_WINDOW frames. Under overload the GUI
+# degrades a stage at a time: first low priority widgets are updated only
+# every GUI_LOW_PRIORITY_FRAMES frames, then the rate is halved down to
+# GUI_MIN_FRAME_RATE. It recovers the same way when the load drops, judged
+# by the frames that drew everything.
+#
+class FramePacer(object):
+
+	def __init__(self, rate=DS.GUI_FRAME_RATE, min_rate=DS.GUI_MIN_FRAME_RATE):
+		# Stages of degradation, (frame interval, low priority widgets skipped)
+		interval = 1.0 / rate
+		self.stages = [(interval, False), (interval, True)]
+		while interval * 2.0 <= 1.0 / min_rate:
+			interval *= 2.0
+			self.stages.append((interval, True))
+
+		self.stage = 0
+		self.interval, self.degraded = self.stages[0]
+
+		self.deadline = None
+		self.started = None
+		self.window = []
+		self.full_window = []
+
+		# Low priority widgets are updated this frame
+		self.low_priority = True
+
+		# Statistics
+		self.times = collections.deque(maxlen=DS.GUI_FRAME_STATS)
+		self.frames = 0
+		self.missed = 0
+
+	def begin(self):
+		"""Mark the start of a frame."""
+		self.started = time.monotonic()
+		if self.deadline is None:
+			self.deadline = self.started
+
+		self.low_priority = not self.degraded or self.frames % DS.GUI_LOW_PRIORITY_FRAMES == 0
+
+	def end(self):
+		"""Mark the end of a frame. Returns the seconds until the next one is due."""
+		now = time.monotonic()
+		elapsed = now - self.started
+
+		self.frames += 1
+		self.times.append(elapsed)
+		self.window.append(elapsed)
+		if self.low_priority:
+			self.full_window.append(elapsed)
+
+		self.deadline += self.interval
+		if now > self.deadline:
+			self.missed += 1
+			self.deadline = now
+
+		if len(self.window) >= DS.GUI_PACE_WINDOW:
+			self.adapt(self.window, self.full_window or self.window)
+			self.window = []
+			self.full_window = []
+
+		return self.deadline - now
+
+	def adapt(self, times, full_times):
+		"""Degrade or recover a stage by the mean frame times of the last window."""
+		load = sum(times) / len(times)
+		full_load = sum(full_times) / len(full_times)
+
+		# Skipped widgets make degraded frames look light, recovering draws them again
+		if load > DS.GUI_OVERLOAD * self.interval and self.stage + 1 < len(self.stages):
+			self.stage += 1
+		elif self.stage > 0 and full_load < DS.GUI_UNDERLOAD * self.stages[self.stage - 1][0]:
+			self.stage -= 1
+		else:
+			return
+
+		self.interval, self.degraded = self.stages[self.stage]
+		if DS.DEBUG:
+			print("Frame pacer: stage %d, %.1f Hz, mean frame time %.1f ms" % (self.stage, 1.0 / self.interval, load * 1000.0))
+
+	def percentile(self, p):
+		"""Frame time in seconds at the p'th percentile of the recent frames."""
+		if not self.times:
+			return 0.0
+
+		times = sorted(self.times)
+		return times[min(int(len(times) * p / 100.0), len(times) - 1)]
+
+	def __str__(self):
+		return "Frame pacer: stage %d at %.1f Hz, %d frames, %d missed deadlines, frame time p50 %.2f ms, p99 %.2f ms" % (
+			self.stage, 1.0 / self.interval, self.frames, self.missed, self.percentile(50) * 1000.0, self.percentile(99) * 1000.0)
@@ -0,0 +1,223 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import csv
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy
+
+from components.settings import DashboardSettings as DS
+from components.messages import StateData
+from components.canreader import CanReader
+
+#
+# Decodes a capture without GPIO or a display, as fast as it can be read,
+# and writes the state at fixed steps of capture time
+#
+#   time             grid time, the state just before it
+#   SIGNALS          decoded signals, as in StateData
+#   DERIVED          speed, motor and battery power, energy and distance
+#                    integrated frame by frame since the start of the log
+#
+SIGNALS = [
+	"motor_rms_current", "actual_speed", "battery_current", "dc_capacitor_voltage",
+	"motor_temp", "controller_temp", "contactor_state", "status", "motor_power",
+	"error_code", "vehicle_acc", "odometer",
+	"tts_1", "tts_2", "dcdc",
+	"energy_state", "latest_consumption", "avg_consumption",
+]
+
+DERIVED = ["speed_kmh", "power_w", "battery_power_w", "energy_wh", "distance_m"]
+
+COLUMNS = ["time"] + SIGNALS + DERIVED
+
+
+class CsvSignalWriter(object):
+
+	def __init__(self, filename, columns):
+		self.f = open(filename, "w", newline="")
+		self.writer = csv.writer(self.f)
+		self.writer.writerow(columns)
+
+	def write(self, rows):
+		self.writer.writerows(rows)
+
+	def close(self):
+		self.f.close()
+
+
+class NpzSignalWriter(object):
+	"""One array per column in a NumPy .npz archive.
+
+	The rows are spooled to a temporary file next to the output, and
+	each column is copied from it to the archive in chunks, so memory
+	does not grow with the length of the log.
+	"""
+
+	def __init__(self, filename, columns):
+		self.filename = filename
+		self.columns = columns
+		self.rows = 0
+
+		directory = os.path.dirname(os.path.abspath(filename))
+		self.spool = tempfile.TemporaryFile(dir=directory)
+
+	def write(self, rows):
+		numpy.asarray(rows, dtype=numpy.float64).tofile(self.spool)
+		self.rows += len(rows)
+
+	def close(self):
+		self.spool.flush()
+		width = len(self.columns)
+
+		with zipfile.ZipFile(self.filename, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+			for column, name in enumerate(self.columns):
+				with archive.open(name + ".npy", "w", force_zip64=True) as f:
+					numpy.lib.format.write_array_header_1_0(f, {
+						"descr": numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.float64)),
+						"fortran_order": False,
+						"shape": (self.rows,),
+					})
+
+					self.spool.seek(0)
+					for start in range(0, self.rows, DS.HEADLESS_CHUNK_ROWS):
+						count = min(DS.HEADLESS_CHUNK_ROWS, self.rows - start)
+						rows = numpy.fromfile(self.spool, dtype=numpy.float64, count=count * width)
+						f.write(rows[column::width].tobytes())
+
+		self.spool.close()
+
+
+def open_writer(filename, columns=COLUMNS):
+	"""Signal writer for the format given by the file extension."""
+	if filename.endswith(".npz"):
+		return NpzSignalWriter(filename, columns)
+
+	return CsvSignalWriter(filename, columns)
+
+
+#
+# Samples the state on a grid of capture time. Rows are emitted when a
+# frame past the next grid point arrives, before that frame is decoded.
+#
+class SignalSampler(object):
+
+	def __init__(self, states, writer, interval=DS.HEADLESS_INTERVAL, max_gap=DS.HEADLESS_MAX_GAP):
+		self.states = states
+		self.writer = writer
+		self.interval = interval
+		self.max_gap = max_gap
+
+		# Grid points are multiples of the interval, no drift over long logs
+		self.index = None
+		self.next_time = None
+		self.rows = []
+		self.count = 0
+
+		# Integrated frame by frame, like the energy state
+		self.energy = 0.0
+		self.distance = 0.0
+		self.prev_time = None
+		self.prev_speed = 0
+
+	def subscribe(self, dispatcher):
+		"""Integrate after StateData has handled the frames."""
+		dispatcher.subscribe(0x1A6, self.integrate_m1)
+		dispatcher.subscribe(0x2A6, self.integrate_m2)
+
+	def integrate_m1(self, data):
+		states = self.states
+		t = states.clock.time()
+		if self.prev_time is not None:
+			speed = (states.get_speed_ms(states.actual_speed) + states.get_speed_ms(self.prev_speed))/2.0
+			self.distance += speed * (t - self.prev_time)
+
+		self.prev_time = t
+		self.prev_speed = states.actual_speed
+
+	def integrate_m2(self, data):
+		# Energy of this frame, as subtracted from the energy state
+		self.energy += self.states.energy_rate
+
+	def split(self, frames):
+		"""Frames to decode, between the points where rows are due."""
+		start = 0
+		for i, frame in enumerate(frames):
+			if self.next_time is None:
+				self.index = int(frame[0] // self.interval) + 1
+				self.next_time = self.index * self.interval
+
+			if frame[0] >= self.next_time:
+				yield frames[start:i]
+				start = i
+				self.advance(frame[0])
+
+		yield frames[start:]
+
+	def advance(self, t):
+		"""Emit the rows due before a frame at 't'."""
+		if t - self.next_time > self.max_gap:
+			# Bus silent, e.g. parked with the logger running
+			self.emit()
+			self.index = int(t // self.interval)
+			self.next_time = self.index * self.interval
+
+		while self.next_time <= t:
+			self.emit()
+			self.index += 1
+			self.next_time = self.index * self.interval
+
+	def emit(self):
+		states = self.states
+		row = [self.next_time]
+		row += [getattr(states, name) for name in SIGNALS]
+		row += [states.get_speed_kmh(), states.motor_power,
+			states.dc_capacitor_voltage * states.battery_current,
+			self.energy / 3600.0, self.distance]
+
+		self.rows.append(row)
+		if len(self.rows) >= DS.HEADLESS_CHUNK_ROWS:
+			self.flush()
+
+	def flush(self):
+		if self.rows:
+			self.writer.write(self.rows)
+			self.count += len(self.rows)
+			self.rows = []
+
+
+def open_decoder(source):
+	"""StateData and an unpaced CanReader for decoding 'source' offline."""
+
+	# Nothing stored on, or loaded from, the device state
+	states = StateData(persist=False, history=False)
+	reader = CanReader(states, None, threading.Event(), False, source)
+
+	return states, reader
+
+
+def decode_capture(source, outfile, interval=DS.HEADLESS_INTERVAL):
+	"""Decode all frames of 'source' to 'outfile' (.csv or .npz).
+	Returns the number of frames and rows."""
+	states, reader = open_decoder(source)
+
+	writer = open_writer(outfile)
+	sampler = SignalSampler(states, writer, interval)
+	sampler.subscribe(reader.dispatcher)
+
+	frame_count = 0
+	frames = source.read_frames()
+	while frames is not None:
+		for batch in sampler.split(frames):
+			reader.dispatch_frames(batch)
+
+		frame_count += len(frames)
+		frames = source.read_frames()
+
+	reader.close()
+	sampler.flush()
+	writer.close()
+
+	return frame_count, sampler.count
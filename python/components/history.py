@@ -0,0 +1,195 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import numpy
+
+from components.settings import DashboardSettings as DS
+from components.dbc import load_dbc
+
+#
+# History of every decoded signal at three resolutions
+#
+#   raw     every sample
+#   second  min/max/mean per second
+#   minute  min/max/mean per minute
+#
+# All memory is allocated up front. Each level is a ring buffer, the
+# coarser levels are filled bucket by bucket as the samples arrive.
+#
+LEVELS = ["raw", "second", "minute"]
+
+MIN = 0
+MAX = 1
+MEAN = 2
+
+
+class Ring(object):
+	"""Fixed size ring of timestamped rows of shape 'shape'."""
+
+	def __init__(self, capacity, shape):
+		self.capacity = capacity
+		self.times = numpy.zeros(capacity)
+		self.rows = numpy.zeros((capacity,) + tuple(shape))
+		self.head = 0
+		self.count = 0
+
+	def append(self, t, row):
+		self.times[self.head] = t
+		self.rows[self.head] = row
+
+		self.head += 1
+		if self.head == self.capacity:
+			self.head = 0
+		if self.count < self.capacity:
+			self.count += 1
+
+	def since(self, t):
+		"""Copies of the times and rows at or after 't', oldest first."""
+		if self.count < self.capacity:
+			parts = [(0, self.count)]
+		else:
+			parts = [(self.head, self.capacity), (0, self.head)]
+
+		times = []
+		rows = []
+		for start, stop in parts:
+			first = start + numpy.searchsorted(self.times[start:stop], t)
+			times.append(self.times[first:stop])
+			rows.append(self.rows[first:stop])
+
+		return numpy.concatenate(times), numpy.concatenate(rows)
+
+
+class Downsampler(object):
+	"""Folds samples into buckets of 'resolution' seconds and appends
+	(min, max, mean) of each completed bucket to a ring."""
+
+	def __init__(self, resolution, width, ring, parent=None):
+		self.resolution = resolution
+		self.ring = ring
+		self.parent = parent
+
+		self.start = None
+		self.count = 0
+		self.low = numpy.zeros(width)
+		self.high = numpy.zeros(width)
+		self.total = numpy.zeros(width)
+		self.row = numpy.zeros((3, width))
+
+	def add(self, t, low, high, total, count):
+		if self.start is not None and not self.start <= t < self.start + self.resolution:
+			self.emit()
+
+		if self.start is None:
+			self.start = t - t % self.resolution
+			self.count = count
+			self.low[:] = low
+			self.high[:] = high
+			self.total[:] = total
+			return
+
+		self.count += count
+		numpy.minimum(self.low, low, out=self.low)
+		numpy.maximum(self.high, high, out=self.high)
+		self.total += total
+
+	def emit(self):
+		row = self.row
+		row[MIN] = self.low
+		row[MAX] = self.high
+		numpy.divide(self.total, self.count, out=row[MEAN])
+		self.ring.append(self.start, row)
+
+		if self.parent is not None:
+			self.parent.add(self.start, self.low, self.high, self.total, self.count)
+
+		self.start = None
+
+
+class MessageHistory(object):
+	"""History of the signals of one message."""
+
+	def __init__(self, fields, sizes):
+		width = len(fields)
+		self.fields = fields
+
+		self.rings = {
+			"raw": Ring(sizes["raw"], (width,)),
+			"second": Ring(sizes["second"], (3, width)),
+			"minute": Ring(sizes["minute"], (3, width)),
+		}
+
+		minutes = Downsampler(60.0, width, self.rings["minute"])
+		self.seconds = Downsampler(1.0, width, self.rings["second"], minutes)
+
+		self.sample = numpy.zeros(width)
+
+	def append(self, t, values):
+		sample = self.sample
+		sample[:] = values
+
+		self.rings["raw"].append(t, sample)
+		self.seconds.add(t, sample, sample, sample, 1)
+
+
+class StateHistory(object):
+
+	def __init__(self, sizes=None):
+		if sizes is None:
+			sizes = {
+				"raw": DS.HISTORY_RAW_SIZE,
+				"second": DS.HISTORY_SECOND_SIZE,
+				"minute": DS.HISTORY_MINUTE_SIZE,
+			}
+
+		self.messages = {}
+		self.columns = {}
+		for can_id, message in load_dbc().items():
+			history = MessageHistory(message.signal_names, sizes)
+			self.messages[can_id] = history
+			for column, name in enumerate(history.fields):
+				self.columns[name] = (history, column)
+
+	def append(self, can_id, t, values):
+		self.messages[can_id].append(t, values)
+
+	def get_fields(self):
+		return list(self.columns.keys())
+
+	def get_level(self, history, t):
+		"""Finest level that reaches back to 't', or that has not dropped anything yet."""
+		for level in LEVELS:
+			ring = history.rings[level]
+			if ring.count < ring.capacity or ring.times[ring.head] <= t:
+				return level
+
+		return LEVELS[-1]
+
+	def query(self, field, seconds, now=None, level=None):
+		"""Values of 'field' over the last 'seconds', as arrays of
+		(times, min, max, mean). Raw samples have min = max = mean.
+		The finest level covering the window is used unless given.
+		"""
+		history, column = self.columns[field]
+
+		if now is None:
+			ring = history.rings["raw"]
+			now = ring.times[ring.head - 1] if ring.count else 0.0
+
+		t = now - seconds
+		if level is None:
+			level = self.get_level(history, t)
+
+		times, rows = history.rings[level].since(t)
+		if level == "raw":
+			values = rows[:, column]
+			return times, values, values, values
+
+		return times, rows[:, MIN, column], rows[:, MAX, column], rows[:, MEAN, column]
+
+	def nbytes(self):
+		total = 0
+		for history in self.messages.values():
+			for ring in history.rings.values():
+				total += ring.times.nbytes + ring.rows.nbytes
+
+		return total
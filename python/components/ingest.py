@@ -0,0 +1,119 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+
+from components.settings import DashboardSettings as DS
+
+
+def parse_candump_line(line):
+	"""Parse one 'candump -L' line, '(<TIMESTAMP>) <BUS-ID> <ID>#<DATA>'.
+	Returns (timestamp, can_id, data) or None if the line should be ignored.
+	"""
+	l = line.strip()
+
+	# Ignore empty lines and comments
+	if len(l) == 0 or l.startswith("#"):
+		return None
+
+	# Expect timestamp with '('
+	if not l.startswith("("):
+		print("Unparsable line:", l)
+		return None
+
+	try:
+		# Split out <TIMESTAMP> <BUS-ID> <DATA>
+		row = l.split(" ")
+		timestamp = float(row[0][1:-1])
+		can_id, _, data = row[2].partition("#")
+		return timestamp, int(can_id, 16), data
+	except (IndexError, ValueError):
+		print("Unparsable line:", l)
+		return None
+
+
+#
+# Reads candump text from a file descriptor in large chunks and splits
+# it into frames. Partial lines are kept in the buffer until the rest
+# of the line has been read, lines longer than 'max_length' are dropped.
+#
+class LineSource(object):
+
+	def __init__(self, infile, chunk_size=DS.LINE_READ_SIZE, max_length=DS.LINE_MAX_LENGTH):
+		self.infile = infile
+		self.fd = infile.fileno()
+
+		# Reusable read buffer, grows at most by the longest line kept
+		self.chunk_size = chunk_size
+		self.buffer = bytearray(2 * chunk_size)
+		self.fill = 0
+
+		# Set while the rest of an oversized line is skipped
+		self.max_length = max_length
+		self.skipping = False
+		self.dropped_lines = 0
+
+	def fileno(self):
+		return self.fd
+
+	def close(self):
+		self.infile.close()
+
+	def read_frames(self):
+		"""Read what is available and return the complete frames in it.
+		Returns None when the input is exhausted.
+		"""
+		if len(self.buffer) - self.fill < self.chunk_size:
+			self.buffer.extend(bytes(self.chunk_size))
+
+		with memoryview(self.buffer) as view:
+			nbytes = os.readv(self.fd, [view[self.fill:]])
+
+		if nbytes == 0:
+			# End of input, flush a trailing line without newline
+			rest = self.buffer[:self.fill]
+			self.fill = 0
+			if rest and not self.skipping:
+				return self.parse_lines(rest)
+			return None
+
+		self.fill += nbytes
+
+		end = self.buffer.rfind(b"\n", 0, self.fill) + 1
+		if end == 0:
+			if self.fill > self.max_length:
+				self.drop_line()
+			return []
+
+		# The end of an oversized line
+		start = 0
+		if self.skipping:
+			start = self.buffer.find(b"\n", 0, end) + 1
+			self.skipping = False
+
+		frames = self.parse_lines(self.buffer[start:end])
+
+		# Carry the partial line over to the next read
+		remaining = self.fill - end
+		self.buffer[:remaining] = self.buffer[end:self.fill]
+		self.fill = remaining
+
+		return frames
+
+	def drop_line(self):
+		"""Forget the line read so far and skip the rest of it."""
+		if not self.skipping:
+			print("Dropped line longer than %d bytes" % self.max_length)
+			self.dropped_lines += 1
+
+		self.skipping = True
+		self.fill = 0
+
+	@staticmethod
+	def parse_lines(chunk):
+		frames = []
+		for line in chunk.decode("ascii", "replace").split("\n"):
+			frame = parse_candump_line(line)
+			if frame is not None:
+				frames.append(frame)
+
+		return frames
@@ -0,0 +1,151 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+import struct
+import threading
+import zlib
+
+from components.settings import DashboardSettings as DS
+
+#
+# Append-only journal of state records
+#
+#   Header   magic, version, payload length, crc32 of the payload
+#   Payload  packed by StateData.pack_state
+#
+# Records are only ever appended and synced, so a power cut can at most
+# leave a torn record at the end, which recovery cuts off. When the file
+# grows past JOURNAL_MAX_SIZE it is rewritten with the last record only,
+# to a temporary file that is synced and renamed over the journal.
+#
+JOURNAL_MAGIC = b"CJNL"
+JOURNAL_VERSION = 1
+
+RECORD_HEADER = struct.Struct("<4sHHI")
+
+
+class Journal(object):
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.lock = threading.Lock()
+
+		self.size = 0
+		self.last_payload = None
+
+		# Counters
+		self.appended = 0
+		self.skipped = 0
+		self.compactions = 0
+
+	@staticmethod
+	def pack_record(payload):
+		return RECORD_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, len(payload), zlib.crc32(payload)) + payload
+
+	def recover(self):
+		"""Payload of the last intact record, None if there is none.
+		A torn or corrupt tail is cut off so new records follow the good ones.
+		"""
+		if not os.path.isfile(self.filename):
+			return None
+
+		with open(self.filename, "rb") as f:
+			data = f.read()
+
+		pos = 0
+		good = 0
+		payload = None
+		while pos + RECORD_HEADER.size <= len(data):
+			magic, version, length, crc = RECORD_HEADER.unpack_from(data, pos)
+			start = pos + RECORD_HEADER.size
+			if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION or start + length > len(data):
+				break
+
+			candidate = data[start:start + length]
+			if zlib.crc32(candidate) != crc:
+				break
+
+			payload = candidate
+			pos = good = start + length
+
+		if good < len(data):
+			print("Journal: dropping %d bytes after the last good record" % (len(data) - good))
+			with open(self.filename, "r+b") as f:
+				f.truncate(good)
+				os.fsync(f.fileno())
+
+		self.size = good
+		self.last_payload = payload
+		return payload
+
+	def append(self, payload):
+		"""Append a record, unless the state is unchanged. Returns True if written."""
+		with self.lock:
+			if payload == self.last_payload:
+				self.skipped += 1
+				return False
+
+			if self.size >= DS.JOURNAL_MAX_SIZE:
+				self.compact(payload)
+			else:
+				record = self.pack_record(payload)
+				with open(self.filename, "ab") as f:
+					f.write(record)
+					f.flush()
+					os.fsync(f.fileno())
+				self.size += len(record)
+
+			self.last_payload = payload
+			self.appended += 1
+			return True
+
+	def compact(self, payload):
+		"""Replace the journal with a single record, atomically."""
+		record = self.pack_record(payload)
+		tmp = self.filename + ".tmp"
+
+		with open(tmp, "wb") as f:
+			f.write(record)
+			f.flush()
+			os.fsync(f.fileno())
+
+		os.replace(tmp, self.filename)
+
+		# Make the rename itself durable
+		directory = os.open(os.path.dirname(os.path.abspath(self.filename)), os.O_RDONLY)
+		try:
+			os.fsync(directory)
+		finally:
+			os.close(directory)
+
+		self.size = len(record)
+		self.compactions += 1
+
+	def __str__(self):
+		return "Journal records written: %d, unchanged: %d, compactions: %d, size: %d bytes" % (
+			self.appended, self.skipped, self.compactions, self.size)
+
+
+#
+# Stores the state periodically and at shutdown, off the decode thread.
+# The state is packed by the decode thread between two messages, so
+# this thread never holds the decode lock while doing I/O.
+#
+class JournalWriter(threading.Thread):
+
+	def __init__(self, states, shutdown, interval=DS.STORE_STATE_INTERVAL * 0.1):
+		super().__init__()
+		self.states = states
+		self.shutdown = shutdown
+		self.interval = interval
+
+	def run(self):
+		while not self.shutdown.wait(self.interval):
+			# Unchanged state is skipped by the journal
+			self.states.journal.append(self.states.export_state(DS.JOURNAL_EXPORT_TIMEOUT))
+
+		# The decode thread may have stopped already
+		self.states.dump_states()
+
+		if DS.DEBUG:
+			print(self.states.journal)
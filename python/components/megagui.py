@@ -36,7 +36,7 @@ class MegaGUI(BaseGUI):
 		pygame.gfxdraw.filled_circle(self.screen, x, y, r - line_width, bg_color)
 
 		# Draw label in the gauge
-		tfont = pygame.font.SysFont(FONT_NAME, int(r / 4))
+		tfont = self.fonts.get(FONT_NAME, int(r / 4))
 		bitmap = tfont.render(label, 1, (255, 255, 255))
 		textpos = bitmap.get_rect()
 		textpos.centerx = x
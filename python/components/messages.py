@@ -1,5 +1,7 @@
 #!/usr/bin/python -B
 # -*- coding: utf-8 -*-
+import collections
+import operator
 import struct
 import time
 import threading
@@ -7,10 +9,39 @@ import pickle
 import os
 
 from components.settings import DashboardSettings as DS
+from components.dbc import load_decoders
+from components.clock import CaptureClock
+from components.history import StateHistory
+from components.journal import Journal
 
 path = os.path.dirname(os.path.realpath(__file__))
 
 STATE_PICKLE_PATH = "%s/../../state.pickle" % (path)
+STATE_JOURNAL_PATH = "%s/../../state.journal" % (path)
+
+#
+# Persisted state, stored as journal records
+#
+#   State        energy state
+#   Consumption  running sums, minute list index and length, trip sums.
+#                The start of the open second is in capture time, whose
+#                epoch differs between live and replayed frames, so its
+#                slot is always NaN and the second restarts after loading.
+#   Minutes      energy, distance of each minute in the list
+#
+STATE_RECORD = struct.Struct("<d")
+CONSUMPTION_RECORD = struct.Struct("<dddddIHHdd")
+MINUTE_RECORD = struct.Struct("<dd")
+
+#
+# Compiled decoders for the Curtis 1239 messages, signals in DBC order
+#
+DECODERS = load_decoders()
+
+decode_m1 = DECODERS[0x1A6]
+decode_m2 = DECODERS[0x2A6]
+decode_m3 = DECODERS[0x3A6]
+decode_m4 = DECODERS[0x4A6]
 
 def parse_unsigned_int(data, start, length):
 	sbyte = int(start / 4)
@@ -45,7 +76,10 @@ class DumpStates(object):
 
 	def put_states(self, o):
 		o.energy_state = self.energy_state
-		o.consumption = self.consumption
+
+		# Not stored by early versions
+		if hasattr(self, "consumption"):
+			o.consumption = self.consumption
 
 	def get_states(self, o):
 		self.energy_state = o.energy_state
@@ -73,84 +107,156 @@ class RotatingList(object):
 
 		return self.data[index]
 
+#
+# Consumption over a sliding window of one second buckets, limited by
+# the number of buckets (seconds of driving), by distance, or neither
+# (the whole trip). Running sums make each bucket O(1).
+#
+class ConsumptionWindow(object):
+
+	def __init__(self, seconds=None, distance=None):
+		self.seconds = seconds
+		self.distance = distance
+
+		# Memory is bounded by the bucket limit, or by the last hour of driving
+		self.buckets = collections.deque(maxlen=seconds if seconds else DS.CONSUMPTION_MAX_BUCKETS)
+		self.energy = 0.0
+		self.distance_sum = 0.0
+
+	def add(self, energy, distance):
+		if self.seconds is None and self.distance is None:
+			self.energy += energy
+			self.distance_sum += distance
+			return
+
+		buckets = self.buckets
+		if len(buckets) == buckets.maxlen:
+			e, d = buckets[0]
+			self.energy -= e
+			self.distance_sum -= d
+
+		buckets.append((energy, distance))
+		self.energy += energy
+		self.distance_sum += distance
+
+		# Keep just enough buckets to cover the distance
+		if self.distance is not None:
+			while len(buckets) > 1 and self.distance_sum - buckets[0][1] >= self.distance:
+				e, d = buckets.popleft()
+				self.energy -= e
+				self.distance_sum -= d
+
+	def reset(self):
+		self.buckets.clear()
+		self.energy = 0.0
+		self.distance_sum = 0.0
+
+	def get_consumption(self):
+		"""Energy per distance, None before any distance is covered."""
+		if self.distance_sum <= 0.0:
+			return None
+
+		return self.energy/self.distance_sum
+
+
 class ConsumptionData(object):
 	def __init__(self):
 		#
-		# Three layers of data storage.
-		# - High frequency
-		# - Seconds
-		# - Minutes
+		# Three layers of data storage, as running sums.
+		# - High frequency samples, summed into seconds
+		# - Seconds, summed into minutes
+		# - Minutes, a fixed set
 		#
-		self.hfdata = []
+		self.hf_energy = 0.0
+		self.hf_distance = 0.0
 		self.hfreset = None
-		self.sdata = []
-		self.mdata = RotatingList(10)
+		self.s_energy = 0.0
+		self.s_distance = 0.0
+		self.s_count = 0
+		self.mdata = RotatingList(DS.CONSUMPTION_MINUTES)
+
+		# Average over the minutes, recomputed when a minute is added
+		self.calculated = self.calculate_avg_consumption()
+
+		self.windows = self.make_windows()
+
+	@staticmethod
+	def make_windows():
+		return dict([(name, ConsumptionWindow(**limits)) for name, limits in DS.CONSUMPTION_WINDOWS.items()])
+
+	def __setstate__(self, state):
+		# Stored by the list based implementation
+		if "hfdata" in state:
+			hfdata = state.pop("hfdata")
+			sdata = state.pop("sdata")
+			state.pop("added", None)
 
-		# Simple calculation caching
-		self.added = True
-		self.calculated = 0.0
+			state["hf_energy"] = float(sum([e for e, d in hfdata]))
+			state["hf_distance"] = float(sum([d for e, d in hfdata]))
+			state["s_energy"] = float(sum([e for e, d in sdata]))
+			state["s_distance"] = float(sum([d for e, d in sdata]))
+			state["s_count"] = len(sdata)
 
-	def append(self, energy_rate, speed, dt):
+		self.__dict__.update(state)
+
+		if "windows" not in state:
+			self.windows = self.make_windows()
+		self.calculated = self.calculate_avg_consumption()
+
+	def append(self, energy_rate, speed, dt, t):
 
 		#
-		# Add all data to the High Frequency list if speed is big enough
+		# Add all data to the High Frequency sums if speed is big enough
 		#
 		if speed < 1.0:
 			return
 
-		self.hfdata.append((energy_rate, speed * dt))
-
-		t = time.time()
+		self.hf_energy += energy_rate
+		self.hf_distance += speed * dt
 
-		# If this is the first element, then only set timestamp
+		# If this is the first sample, then only set timestamp
 		if self.hfreset is None:
 			self.hfreset = t
 			return
 
 		#
-		# Calculate average of HF-list each second and put in second list
+		# Move the HF sums to the second sums each second
 		#
-		if (self.hfreset + 1.0) < t and len(self.hfdata) > 0:
-			# Sum column wise
-			te, td = map(sum, zip(*self.hfdata))
+		if (self.hfreset + 1.0) < t:
+			self.add_second(self.hf_energy, self.hf_distance)
 
-			# Add data and clear previous
-			self.sdata.append((te, td))
-			self.hfdata = []
+			self.hf_energy = 0.0
+			self.hf_distance = 0.0
 			self.hfreset = t
 
+	def add_second(self, energy, distance):
+		for window in self.windows.values():
+			window.add(energy, distance)
+
+		self.s_energy += energy
+		self.s_distance += distance
+		self.s_count += 1
+
 		#
-		# When we have a full minute, copy over average to minute list
+		# When we have a full minute, copy over sums to minute list
 		# Minute list contains a fixed set of minutes.
 		#
-		if len(self.sdata) > 60:
+		if self.s_count > 60:
+			self.mdata.append((self.s_energy, self.s_distance))
+			self.calculated = self.calculate_avg_consumption()
 
-			te, td = map(sum, zip(*self.sdata))
+			self.s_energy = 0.0
+			self.s_distance = 0.0
+			self.s_count = 0
 
-			self.mdata.append((te, td))
-			self.added = True
-			self.sdata = []
-
-			# DEBUG
-			ss = ", ".join([ "%.0f:%.0f" % (e,d) for e,d in self.mdata.data])
-			cons = self.get_avg_consumption()
-
-			print("Consuption list:", ss)
-			print("Avg consumption:", "%.01f" % cons)
-
-
-	def get_avg_consumption(self):
-
-		if not self.added:
-			return self.calculated
-
-		self.added = False
+	def calculate_avg_consumption(self):
 
 		# Sum tuples, column by column
 		te, td = map(sum, zip(*self.mdata.data))
 
-		self.calculated = te/td
+		return te/td
 
+	def get_avg_consumption(self):
 		return self.calculated
 
 	def get_latest_consumption(self):
@@ -158,7 +264,57 @@ class ConsumptionData(object):
 
 		return e/d
 
-class StateData(object):
+	def get_consumption(self, window):
+		"""Consumption over one of DS.CONSUMPTION_WINDOWS, None without distance."""
+		return self.windows[window].get_consumption()
+
+	def reset_trip(self):
+		for window in self.windows.values():
+			window.reset()
+
+	def pack(self):
+		trip = self.windows.get("trip")
+		trip_energy, trip_distance = (trip.energy, trip.distance_sum) if trip is not None else (0.0, 0.0)
+
+		minutes = self.mdata.data
+		return CONSUMPTION_RECORD.pack(self.hf_energy, self.hf_distance, float("nan"),
+			self.s_energy, self.s_distance, self.s_count,
+			self.mdata.index, len(minutes), trip_energy, trip_distance) + \
+			b"".join([MINUTE_RECORD.pack(e, d) for e, d in minutes])
+
+	def unpack_from(self, data, offset=0):
+		(self.hf_energy, self.hf_distance, _, self.s_energy, self.s_distance, self.s_count,
+			index, count, trip_energy, trip_distance) = CONSUMPTION_RECORD.unpack_from(data, offset)
+		offset += CONSUMPTION_RECORD.size
+
+		# The first sample after loading starts the second, in the current epoch
+		self.hfreset = None
+
+		minutes = [MINUTE_RECORD.unpack_from(data, offset + i * MINUTE_RECORD.size) for i in range(count)]
+		if count == len(self.mdata.data):
+			self.mdata.data = minutes
+			self.mdata.index = index
+		else:
+			# DS.CONSUMPTION_MINUTES changed, keep the newest minutes
+			chronological = minutes[index:] + minutes[:index]
+			for minute in chronological[-len(self.mdata.data):]:
+				self.mdata.append(minute)
+
+		self.calculated = self.calculate_avg_consumption()
+
+		trip = self.windows.get("trip")
+		if trip is not None:
+			trip.energy = trip_energy
+			trip.distance_sum = trip_distance
+
+#
+# Getters shared by StateData and views of its values held elsewhere,
+# e.g. in shared memory. They only read plain attributes, plus
+# latest_consumption and avg_consumption.
+#
+class StateGetters(object):
+	__slots__ = ()
+
 	# ("Motor Cogwheel Diameter" / "Rear Cogwheel Diameter") *
 	#   "Rear Wheel Circumfence"
 	GEARBOX_AND_WHEEL_RATIO = (22.0 / 144.0) * 2.040
@@ -167,7 +323,135 @@ class StateData(object):
 	"Closed (When Main Enable = On)", "Delay", "Arc Check", "Open Delay", "Fault",
 	"Closed (When Main Enable = Off)"]
 
-	def __init__(self):
+	@classmethod
+	def get_state_name(cls, state):
+		if state >= len(cls.STATES):
+			return "Unknown State! " + str(state)
+
+		return cls.STATES[state]
+
+	def get_speed_ms(self, rpm=None):
+		if rpm is None:
+			rpm = self.actual_speed
+
+		if rpm > 1.0:
+			speed = (self.GEARBOX_AND_WHEEL_RATIO * rpm * 1.01) / 60.0
+		else:
+			speed = 0.0
+
+		return speed
+
+	def get_speed_kmh(self):
+		return self.get_speed_ms(self.actual_speed) * (3600.0 / 1000.0)
+
+	def get_dc_capacitor_voltage(self):
+		return self.dc_capacitor_voltage
+
+	def get_motor_power(self):
+		return max(self.motor_power, 0.0)/1000.0
+
+	def get_actual_speed(self):
+		return max(self.actual_speed, 0)
+
+	def get_motor_rms_current(self):
+		return int(max(self.motor_rms_current, 0))
+
+	def get_odometer(self):
+		return max(self.odometer, 0)
+
+	def get_controller_temp(self):
+		return max(self.controller_temp, 0)
+
+	def get_motor_temp(self):
+		return max(self.motor_temp, 0)
+
+	def get_dcdc(self):
+		return max(self.dcdc, 0)
+
+	def get_soc_percent(self):
+		return self.energy_state/DS.BATTERY_TOTAL_ENERGY
+
+	def get_consumption_kwh(self):
+		return self.latest_consumption/360.0
+
+	def get_range(self):
+
+		cc = self.avg_consumption
+		range = self.energy_state/cc
+
+		return range
+
+	def __str__(self):
+
+		ret = []
+		ret.append(self.__str_m1__())
+		ret.append(self.__str_m2__())
+		ret.append(self.__str_m3__())
+		ret.append(self.__str_m4__())
+		return "\n".join(ret)
+
+	def __str_m1__(self):
+		s1 = "%25s: % .01f" % ("RMS Current", self.motor_rms_current)
+		s2 = "%25s: % 3d" % ("Actual Speed", self.actual_speed)
+		s3 = "%25s: % .01f" % ("Battery Current", self.battery_current)
+		s4 = "%25s: % .01f" % ("DC Capacitor Voltage", self.dc_capacitor_voltage)
+
+		return "\n".join([s1, s2, s3, s4])
+
+	def __str_m2__(self):
+		s1 = "%25s: % .01f" % ("Motor Temperature", self.motor_temp)
+		s2 = "%25s: % .01f" % ("Controller Temperature", self.controller_temp)
+		s3 = "%25s:  %s" % ("State", self.sstate)
+		s4 = "%25s: % d" % ("Status", self.status)
+		s5 = "%25s: % d" % ("Motor Power", self.motor_power)
+
+		return "\n".join([s1, s2, s3, s4, s5])
+
+	def __str_m3__(self):
+		s1 = "%25s: % d" % ("Error Code", self.error_code)
+		s2 = "%25s: % .03f" % ("Vehicle Acceleration", self.vehicle_acc)
+		s3 = "%25s: % .01f" % ("Odometer", self.odometer)
+
+		return "\n".join([s1, s2, s3])
+
+	def __str_m4__(self):
+		s1 = "%25s: % d" % ("Time to Speed 1", self.tts_1)
+		s2 = "%25s: % d" % ("Time to Speed 2", self.tts_2)
+		s3 = "%25s: % .01f" % ("DC-DC", self.dcdc)
+
+		return "\n".join([s1, s2, s3])
+
+
+#
+# Immutable copy of the values in StateData, a tuple of STATE_FIELDS with
+# the fields as attributes. Readers that take one per tick never see a
+# message half applied.
+#
+STATE_FIELDS = [
+	"motor_rms_current", "actual_speed", "battery_current", "dc_capacitor_voltage",
+	"motor_temp", "controller_temp", "contactor_state", "sstate", "status", "motor_power",
+	"error_code", "vehicle_acc", "odometer",
+	"tts_1", "tts_2", "dcdc",
+	"energy_state", "energy_rate", "latest_consumption", "avg_consumption",
+]
+
+class StateSnapshot(StateGetters, tuple):
+	__slots__ = ()
+
+	FIELDS = STATE_FIELDS
+
+	def get_snapshot(self):
+		return self
+
+for index, name in enumerate(STATE_FIELDS):
+	setattr(StateSnapshot, name, property(operator.itemgetter(index)))
+
+get_state_values = operator.attrgetter(*STATE_FIELDS)
+
+
+class StateData(StateGetters):
+
+	def __init__(self, clock=None, persist=True, history=None):
 		#
 		# CAN data variables
 		#
@@ -179,6 +463,7 @@ class StateData(object):
 		self.motor_temp = 0
 		self.controller_temp = 0
 		self.sstate = "N/A"
+		self.contactor_state = 0
 		self.status = 0
 		self.motor_power = 0.0
 
@@ -191,10 +476,18 @@ class StateData(object):
 		self.dcdc = 0
 
 		#
-		# Update timestamps
+		# Update timestamps and previous samples of the integrators
 		#
 		self.mp_update_time = None
+		self.mp_prev_power = 0.0
 		self.as_update_time = None
+		self.as_prev_speed = 0
+
+		# Newest values of each message while frames are coalesced
+		self.pending_m1 = None
+		self.pending_m2 = None
+		self.pending_m3 = None
+		self.pending_m4 = None
 
 		#
 		# Current enery and consumption data
@@ -203,58 +496,121 @@ class StateData(object):
 		self.energy_rate = 0.0
 		self.consumption = ConsumptionData()
 
+		# Time source of the integrators, advanced by the CanReader
+		self.clock = clock if clock is not None else CaptureClock()
+
+		# Every decoded value, at a few resolutions
+		if history is None:
+			history = DS.HISTORY
+		self.history = StateHistory() if history else None
+
 		self.write_lock = threading.Lock()
 
-		# Load data stored on disk
-		self.load_states()
+		#
+		# Change tracking. Snapshots are taken when asked for, after every
+		# message only while someone subscribes to changes. Each snapshot
+		# counts the fields that changed since the previous one.
+		#
+		self.change_counts = dict([(name, 0) for name in STATE_FIELDS])
+		self.change_start = time.monotonic()
+		self.subscribers = ()
+		self.values = None
+		self.dirty = True
+
+		# State handed from the decode thread to the journal writer
+		self.export_requested = False
+		self.export_ready = threading.Event()
+		self.exported = None
+
+		# Load data stored on disk, not when decoding logs offline
+		if persist:
+			self.journal = Journal(STATE_JOURNAL_PATH)
+			self.load_states()
+		else:
+			self.journal = None
 
+		self.write_lock.acquire()
+		self.refresh()
+		self.write_lock.release()
+
+	#
+	# Each of M1 and M2 feeds an integrator that must see every sample,
+	# while the displayed values only need the latest one. parse_mN does
+	# both. For frame coalescing accumulate_mN decodes, records and
+	# integrates every frame and keeps the values, apply_frames shows the
+	# newest values of a batch and publishes once.
+	#
 	def parse_m1(self, data):
+		values = decode_m1(data)
 
 		self.write_lock.acquire()
+		self.record(0x1A6, values)
+		self.integrate_m1(values)
+		self.set_m1(values)
+		self.publish()
+		self.write_lock.release()
 
-		self.motor_rms_current = int(parse_unsigned_int(data, 0, 16) / 10.0)
-		self.battery_current = int(parse_signed_int(data, 32, 16) / 10.0)
-		self.dc_capacitor_voltage = (parse_unsigned_int(data, 48, 16) / 64.0)
+	def accumulate_m1(self, data):
+		values = decode_m1(data)
+
+		self.write_lock.acquire()
+		self.record(0x1A6, values)
+		self.integrate_m1(values)
+		self.pending_m1 = values
+		self.write_lock.release()
+
+	def integrate_m1(self, values):
+		motor_rms_current, actual_speed, battery_current, dc_capacitor_voltage = values
 
 		# Reset available energy in battery if voltage is high
-		if self.dc_capacitor_voltage >= 168.0:
+		if dc_capacitor_voltage >= 168.0:
 			self.energy_state = DS.BATTERY_TOTAL_ENERGY
 
-		actual_speed = parse_signed_int(data, 16, 16)
-
 		# Store consumption data
-		t = time.time()
+		t = self.clock.time()
 		if self.as_update_time is not None:
 			dt = t - self.as_update_time
-			speed = (self.get_speed_ms(actual_speed) + self.get_speed_ms())/2.0
-			self.consumption.append(self.energy_rate, speed, dt)
+			speed = (self.get_speed_ms(actual_speed) + self.get_speed_ms(self.as_prev_speed))/2.0
+			self.consumption.append(self.energy_rate, speed, dt, t)
 
 		self.as_update_time = t
-		self.actual_speed = actual_speed
+		self.as_prev_speed = actual_speed
 
-		self.write_lock.release()
+	def set_m1(self, values):
+		motor_rms_current, actual_speed, battery_current, dc_capacitor_voltage = values
+
+		self.motor_rms_current = int(motor_rms_current)
+		self.actual_speed = actual_speed
+		self.battery_current = int(battery_current)
+		self.dc_capacitor_voltage = dc_capacitor_voltage
 
 	def parse_m2(self, data):
+		values = decode_m2(data)
 
 		self.write_lock.acquire()
-		self.motor_temp = parse_signed_int(data, 0, 16) / 10.0
-		self.controller_temp = parse_signed_int(data, 16, 16) / 10.0
+		self.record(0x2A6, values)
+		self.integrate_m2(values)
+		self.set_m2(values)
+		self.publish()
+		self.write_lock.release()
 
-		state = parse_unsigned_int(data, 32, 8)
-		if state >= len(self.STATES):
-			self.sstate = "Unknown State! " + str(state)
-		else:
-			self.sstate = self.STATES[state]
+	def accumulate_m2(self, data):
+		values = decode_m2(data)
 
-		self.status = parse_unsigned_int(data, 40, 8)
+		self.write_lock.acquire()
+		self.record(0x2A6, values)
+		self.integrate_m2(values)
+		self.pending_m2 = values
+		self.write_lock.release()
 
-		motor_power = parse_signed_int(data, 48, 16) * 10.0
+	def integrate_m2(self, values):
+		motor_temp, controller_temp, state, status, motor_power = values
 
 		# Subtract used energy
-		t = time.time()
+		t = self.clock.time()
 		if self.mp_update_time is not None:
 			dt = t - self.mp_update_time
-			power = (motor_power + self.motor_power)/2.0
+			power = (motor_power + self.mp_prev_power)/2.0
 			energy_rate = power*dt
 
 			self.energy_state -= energy_rate
@@ -264,130 +620,206 @@ class StateData(object):
 			self.energy_rate = energy_rate
 
 		self.mp_update_time = t
+		self.mp_prev_power = motor_power
+
+	def set_m2(self, values):
+		motor_temp, controller_temp, state, status, motor_power = values
+
+		self.motor_temp = motor_temp
+		self.controller_temp = controller_temp
+
+		self.contactor_state = state
+		self.sstate = self.get_state_name(state)
+
+		self.status = status
 		self.motor_power = motor_power
-		self.write_lock.release()
 
 	def parse_m3(self, data):
+		values = decode_m3(data)
+
 		self.write_lock.acquire()
-		self.error_code = parse_unsigned_int(data, 0, 8)
-		self.vehicle_acc = parse_signed_int(data, 16, 16) / 1000.0
-		self.odometer = parse_unsigned_int(data, 32, 32) / 10.0
+		self.record(0x3A6, values)
+		self.set_m3(values)
+		self.publish()
 		self.write_lock.release()
 
-	def parse_m4(self, data):
+	def accumulate_m3(self, data):
+		values = decode_m3(data)
+
 		self.write_lock.acquire()
-		self.tts_1 = parse_unsigned_int(data, 0, 16)
-		self.tts_2 = parse_signed_int(data, 16, 16)
-		self.dcdc = parse_unsigned_int(data, 48, 16)/100.0
+		self.record(0x3A6, values)
+		self.pending_m3 = values
 		self.write_lock.release()
 
-	def dump_states(self):
-		self.write_lock.acquire()
-		f = open(STATE_PICKLE_PATH, 'wb')
-		o = DumpStates()
-		o.get_states(self)
+	def set_m3(self, values):
+		self.error_code, self.vehicle_acc, self.odometer = values
 
-		pickle.dump(o, f, pickle.HIGHEST_PROTOCOL)
+	def parse_m4(self, data):
+		values = decode_m4(data)
 
-		f.flush()
-		f.close()
+		self.write_lock.acquire()
+		self.record(0x4A6, values)
+		self.set_m4(values)
+		self.publish()
 		self.write_lock.release()
 
-	def load_states(self):
-		if os.path.isfile(STATE_PICKLE_PATH):
-			f = open(STATE_PICKLE_PATH, 'rb')
-			o = pickle.load(f)
-			o.put_states(self)
-			f.close()
+	def accumulate_m4(self, data):
+		values = decode_m4(data)
 
-	def get_speed_ms(self, rpm=None):
-		if rpm is None:
-			rpm = self.actual_speed
+		self.write_lock.acquire()
+		self.record(0x4A6, values)
+		self.pending_m4 = values
+		self.write_lock.release()
 
-		if rpm > 1.0:
-			speed = (self.GEARBOX_AND_WHEEL_RATIO * rpm * 1.01) / 60.0
-		else:
-			speed = 0.0
+	def set_m4(self, values):
+		self.tts_1, self.tts_2, self.dcdc = values
 
-		return speed
+	def apply_frames(self, latest):
+		"""Show the newest frame of each id in 'latest', a dict of payloads by
+		id, and publish once. The frames were decoded by accumulate_mN."""
+		self.write_lock.acquire()
+		if 0x1A6 in latest:
+			self.set_m1(self.pending_m1)
+		if 0x2A6 in latest:
+			self.set_m2(self.pending_m2)
+		if 0x3A6 in latest:
+			self.set_m3(self.pending_m3)
+		if 0x4A6 in latest:
+			self.set_m4(self.pending_m4)
+		self.publish()
+		self.write_lock.release()
 
-	def get_speed_kmh(self):
-		return self.get_speed_ms(self.actual_speed) * (3600.0 / 1000.0)
+	def record(self, can_id, values):
+		if self.history is not None:
+			self.history.append(can_id, self.clock.time(), values)
+
+	def publish(self):
+		"""Mark the values changed by a message, called with write_lock held."""
+		if self.export_requested:
+			self.exported = self.pack_state()
+			self.export_requested = False
+			self.export_ready.set()
+
+		self.dirty = True
+		if self.subscribers:
+			self.refresh()
+
+	def refresh(self):
+		"""Swap in a snapshot of the current values if they may have changed,
+		called with write_lock held."""
+		if not self.dirty:
+			return
+		self.dirty = False
 
-	def get_dc_capacitor_voltage(self):
-		return self.dc_capacitor_voltage
+		values = get_state_values(self)
+		snapshot = tuple.__new__(StateSnapshot, values)
 
-	def get_motor_power(self):
-		return max(self.motor_power, 0.0)/1000.0
+		if self.values is None:
+			# The initial values, not counted as changes
+			changed = list(STATE_FIELDS)
+		else:
+			changed = [name for name, new, old in zip(STATE_FIELDS, values, self.values) if new != old]
+			for name in changed:
+				self.change_counts[name] += 1
 
-	def get_actual_speed(self):
-		return max(self.actual_speed, 0)
+		self.values = values
+		self.snapshot = snapshot
 
-	def get_motor_rms_current(self):
-		return int(max(self.motor_rms_current, 0))
+		if not changed:
+			return
 
-	def get_odometer(self):
-		return max(self.odometer, 0)
+		for fields, callback in self.subscribers:
+			if fields is None or not fields.isdisjoint(changed):
+				callback(snapshot, changed)
 
-	def get_controller_temp(self):
-		return max(self.controller_temp, 0)
+	def subscribe(self, callback, fields=None):
+		"""Call 'callback(snapshot, changed)' when any of 'fields' changes, all if None.
+		It runs on the reader thread with write_lock held, after every message that
+		changes the fields, so it must be quick and must not call back into methods
+		that take the lock.
+		"""
+		if fields is not None:
+			fields = frozenset(fields)
 
-	def get_motor_temp(self):
-		return max(self.motor_temp, 0)
+		# Copy on write, publish iterates without locking
+		self.write_lock.acquire()
+		self.subscribers = self.subscribers + ((fields, callback),)
+		self.write_lock.release()
 
-	def get_dcdc(self):
-		return max(self.dcdc, 0)
+	def get_change_rates(self):
+		"""Changes per second of each field since startup, as seen by the snapshots."""
+		elapsed = max(time.monotonic() - self.change_start, 1e-9)
+		return dict([(name, count / elapsed) for name, count in list(self.change_counts.items())])
 
-	def get_soc_percent(self):
-		return self.energy_state/DS.BATTERY_TOTAL_ENERGY
+	def format_change_rates(self):
+		rates = self.get_change_rates()
+		return "\n".join(["%25s: %6.2f changes/s" % (name, rates[name]) for name in STATE_FIELDS])
 
-	def get_consumption_kwh(self):
-		return self.consumption.get_latest_consumption()/360.0
+	def get_snapshot(self):
+		"""Latest consistent values, safe to use from any thread. Taken here
+		if messages arrived since the last one, so not with write_lock held."""
+		if self.dirty:
+			self.write_lock.acquire()
+			self.refresh()
+			self.write_lock.release()
 
-	def get_range(self):
+		return self.snapshot
 
-		cc = self.consumption.get_avg_consumption()
-		range = self.energy_state/cc
+	def pack_state(self):
+		"""State to persist, called with write_lock held."""
+		return STATE_RECORD.pack(self.energy_state) + self.consumption.pack()
 
-		return range
+	def unpack_state(self, payload):
+		self.energy_state, = STATE_RECORD.unpack_from(payload, 0)
+		self.consumption.unpack_from(payload, STATE_RECORD.size)
 
-	def __str__(self):
+	def export_state(self, timeout):
+		"""State packed by the decode thread after its next message. If no
+		message arrives within 'timeout' the reader is idle, and the state
+		is packed here instead.
+		"""
+		self.export_ready.clear()
+		self.export_requested = True
 
-		ret = []
-		ret.append(self.__str_m1__())
-		ret.append(self.__str_m2__())
-		ret.append(self.__str_m3__())
-		ret.append(self.__str_m4__())
-		return "\n".join(ret)
+		if self.export_ready.wait(timeout):
+			return self.exported
 
-	def __str_m1__(self):
-		s1 = "%25s: % .01f" % ("RMS Current", self.motor_rms_current)
-		s2 = "%25s: % 3d" % ("Actual Speed", self.actual_speed)
-		s3 = "%25s: % .01f" % ("Battery Current", self.battery_current)
-		s4 = "%25s: % .01f" % ("DC Capacitor Voltage", self.dc_capacitor_voltage)
+		self.write_lock.acquire()
+		self.export_requested = False
+		payload = self.pack_state()
+		self.write_lock.release()
 
-		return "\n".join([s1, s2, s3, s4])
+		return payload
 
-	def __str_m2__(self):
-		s1 = "%25s: % .01f" % ("Motor Temperature", self.motor_temp)
-		s2 = "%25s: % .01f" % ("Controller Temperature", self.controller_temp)
-		s3 = "%25s:  %s" % ("State", self.sstate)
-		s4 = "%25s: % d" % ("Status", self.status)
-		s5 = "%25s: % d" % ("Motor Power", self.motor_power)
+	def dump_states(self):
+		self.write_lock.acquire()
+		payload = self.pack_state()
+		self.write_lock.release()
 
-		return "\n".join([s1, s2, s3, s4, s5])
+		self.journal.append(payload)
 
-	def __str_m3__(self):
-		s1 = "%25s: % d" % ("Error Code", self.error_code)
-		s2 = "%25s: % .03f" % ("Vehicle Acceleration", self.vehicle_acc)
-		s3 = "%25s: % .01f" % ("Odometer", self.odometer)
+	def load_states(self):
+		payload = self.journal.recover()
+		if payload is not None:
+			try:
+				self.unpack_state(payload)
+			except struct.error:
+				print("Journal: record does not match this version, starting from defaults")
+			return
 
-		return "\n".join([s1, s2, s3])
+		# Stored by earlier versions
+		if os.path.isfile(STATE_PICKLE_PATH):
+			f = open(STATE_PICKLE_PATH, 'rb')
+			o = pickle.load(f)
+			o.put_states(self)
+			f.close()
 
-	def __str_m4__(self):
-		s1 = "%25s: % d" % ("Time to Speed 1", self.tts_1)
-		s2 = "%25s: % d" % ("Time to Speed 2", self.tts_2)
-		s3 = "%25s: % .01f" % ("DC-DC", self.dcdc)
+			self.consumption.hfreset = None
 
-		return "\n".join([s1, s2, s3])
+	@property
+	def latest_consumption(self):
+		return self.consumption.get_latest_consumption()
 
+	@property
+	def avg_consumption(self):
+		return self.consumption.get_avg_consumption()
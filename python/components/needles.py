@@ -0,0 +1,118 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+
+import numpy
+import pygame
+
+from components.settings import DashboardSettings as DS
+
+path = os.path.dirname(os.path.realpath(__file__))
+
+NEEDLE_CACHE_PATH = "%s/../../needle-cache" % (path)
+
+# Bumped when the cache layout or the way sprites are made changes
+NEEDLE_CACHE_VERSION = 1
+
+
+#
+# A needle image rotated to every step over the sweep of its gauge.
+#
+# Each sprite is cropped to what the needle covers, with its offset from
+# the pivot, so drawing is one blit of a small surface. The sprites are
+# stored in a cache file named after a hash of the image and the sweep,
+# later starts load them instead of rotating again.
+#
+class NeedleAtlas(object):
+
+	def __init__(self, filename, start, stop, step=DS.NEEDLE_STEP, cache_dir=NEEDLE_CACHE_PATH):
+		self.image = pygame.image.load(filename).convert_alpha()
+		self.start = start
+		self.step = step
+		self.count = int(round((stop - start) / step)) + 1
+
+		with open(filename, "rb") as f:
+			asset = f.read()
+		key = repr((NEEDLE_CACHE_VERSION, start, stop, step, pygame.version.ver)).encode("ascii")
+		digest = hashlib.sha1(asset + key).hexdigest()[:16]
+		self.cache_file = os.path.join(cache_dir, "%s-%s.npz" % (os.path.splitext(os.path.basename(filename))[0], digest))
+
+		if not self.load():
+			self.build()
+			self.store()
+
+	def build(self):
+		self.sprites = []
+		self.offsets = []
+		for index in range(self.count):
+			sprite, offset = self.rotate(self.start + index * self.step)
+			self.sprites.append(sprite)
+			self.offsets.append(offset)
+
+	def rotate(self, angle):
+		"""Cropped needle and its offset from the pivot, as placed by centering
+		the whole rotated image on the pivot."""
+		rotated = pygame.transform.rotozoom(self.image, angle, 1.0)
+		bounds = rotated.get_bounding_rect()
+		offset = (bounds.x - rotated.get_width() // 2, bounds.y - rotated.get_height() // 2)
+
+		return rotated.subsurface(bounds).copy(), offset
+
+	def load(self):
+		try:
+			with numpy.load(self.cache_file) as cache:
+				sizes = cache["sizes"]
+				offsets = cache["offsets"]
+				pixels = cache["pixels"].tobytes()
+		except (OSError, KeyError, ValueError):
+			return False
+
+		if len(sizes) != self.count:
+			return False
+
+		self.sprites = []
+		self.offsets = []
+		pos = 0
+		for (width, height), (x, y) in zip(sizes.tolist(), offsets.tolist()):
+			nbytes = width * height * 4
+			self.sprites.append(pygame.image.fromstring(pixels[pos:pos + nbytes], (width, height), "RGBA").convert_alpha())
+			self.offsets.append((x, y))
+			pos += nbytes
+
+		return True
+
+	def store(self):
+		sizes = numpy.array([sprite.get_size() for sprite in self.sprites], dtype=numpy.int32)
+		offsets = numpy.array(self.offsets, dtype=numpy.int32)
+		pixels = numpy.frombuffer(b"".join([pygame.image.tostring(sprite, "RGBA") for sprite in self.sprites]), dtype=numpy.uint8)
+
+		# Written aside and renamed, a crash never leaves half a cache
+		try:
+			os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+			tmp = self.cache_file + ".tmp"
+			with open(tmp, "wb") as f:
+				numpy.savez(f, sizes=sizes, offsets=offsets, pixels=pixels)
+			os.replace(tmp, self.cache_file)
+		except OSError as e:
+			print("Needle cache not stored:", e)
+
+	def quantize(self, angle):
+		"""Angle of the nearest sprite step."""
+		return self.start + round((angle - self.start) / self.step) * self.step
+
+	def blit(self, angle, center):
+		"""Surface, position and bounds of the needle at 'angle' around 'center'.
+		Angles off the sweep, e.g. readings off the scale, are rotated here."""
+		index = int(round((angle - self.start) / self.step))
+		if 0 <= index < self.count:
+			sprite = self.sprites[index]
+			x, y = self.offsets[index]
+		else:
+			sprite, (x, y) = self.rotate(angle)
+
+		pos = (center[0] + x, center[1] + y)
+		return sprite, pos, pygame.Rect(pos, sprite.get_size())
+
+	def nbytes(self):
+		return sum([sprite.get_width() * sprite.get_height() * 4 for sprite in self.sprites])
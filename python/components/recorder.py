@@ -0,0 +1,338 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import collections
+import gzip
+import lzma
+import os
+import struct
+import threading
+import time
+
+from components.settings import DashboardSettings as DS
+
+#
+# Compressed capture segments
+#
+#   Header   magic, version
+#   Info     sequence number, wall time when opened (version 2 on)
+#   Records  timestamp, id, flags (dlc in the low bits), data
+#
+# A record with the REPEAT flag has the same payload as the previous
+# frame with that id in the segment and carries no data bytes, which
+# takes care of constant frames like the 726#7F heartbeat.
+#
+# Segments are named by the sequence number, the clock of the Pi may be
+# unset or jump when it is synced, which would misorder names by time.
+# The next number is kept in SEQUENCE_FILE in the directory.
+#
+SEGMENT_MAGIC = b"CURTSEG\0"
+SEGMENT_VERSION = 2
+SEGMENT_VERSIONS = (1, 2)
+
+SEGMENT_HEADER = struct.Struct("<8sH")
+SEGMENT_INFO = struct.Struct("<Qd")
+SEGMENT_RECORD = struct.Struct("<dIB")
+
+# Sorts after the wall time names of older recorders
+SEGMENT_PREFIX = "seg-"
+SEQUENCE_FILE = "sequence"
+
+FLAG_REPEAT = 0x80
+DLC_MASK = 0x0F
+
+COMPRESSORS = {
+	"gzip": (gzip.open, ".cseg.gz"),
+	"lzma": (lzma.open, ".cseg.xz"),
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+def open_segment(filename):
+	with open(filename, "rb") as f:
+		magic = f.read(len(XZ_MAGIC))
+
+	if magic.startswith(GZIP_MAGIC):
+		return gzip.open(filename, "rb")
+	if magic.startswith(XZ_MAGIC):
+		return lzma.open(filename, "rb")
+
+	return None
+
+
+def is_segment(filename):
+	f = open_segment(filename)
+	if f is None:
+		return False
+
+	try:
+		magic = f.read(len(SEGMENT_MAGIC))
+	except (EOFError, OSError):
+		magic = None
+	f.close()
+
+	return magic == SEGMENT_MAGIC
+
+
+def list_segments(directory):
+	"""Segment files in a directory, oldest first."""
+	names = sorted([n for n in os.listdir(directory) if ".cseg." in n])
+	return [os.path.join(directory, n) for n in names]
+
+
+def segment_sequence(filename):
+	"""Sequence number in a segment name, None for other names."""
+	name = os.path.basename(filename)
+	if not name.startswith(SEGMENT_PREFIX):
+		return None
+
+	try:
+		return int(name[len(SEGMENT_PREFIX):].split(".", 1)[0])
+	except ValueError:
+		return None
+
+
+#
+# Writes frames to compressed segments on its own thread. The decode
+# thread only appends to a bounded queue, frames are dropped and counted
+# if the writer can not keep up.
+#
+class CaptureRecorder(threading.Thread):
+
+	def __init__(self, directory, shutdown, compression=DS.RECORD_COMPRESSION):
+		super().__init__()
+		self.directory = directory
+		self.shutdown = shutdown
+		self.opener, self.suffix = COMPRESSORS[compression]
+
+		self.pending = collections.deque()
+		self.max_pending = DS.RECORD_MAX_PENDING
+
+		self.segment = None
+		self.segment_name = None
+		self.segment_bytes = 0
+		self.segment_start = 0.0
+		self.last_payload = {}
+
+		os.makedirs(directory, exist_ok=True)
+		self.sequence = self.load_sequence()
+
+		# Counters
+		self.recorded = 0
+		self.dropped = 0
+		self.segments = 0
+		self.deleted = 0
+
+	def record(self, timestamp, can_id, data):
+		"""Called from the decode thread, never blocks."""
+		if len(self.pending) >= self.max_pending:
+			self.dropped += 1
+			return
+
+		self.pending.append((timestamp, can_id, data))
+
+	def load_sequence(self):
+		"""Next sequence number, past the stored one and every segment in
+		the directory in case the file was lost."""
+		try:
+			with open(os.path.join(self.directory, SEQUENCE_FILE)) as f:
+				sequence = int(f.read())
+		except (OSError, ValueError):
+			sequence = 0
+
+		for segment in list_segments(self.directory):
+			number = segment_sequence(segment)
+			if number is not None:
+				sequence = max(sequence, number + 1)
+
+		return sequence
+
+	def store_sequence(self):
+		# Written aside and renamed, a power loss never leaves half a number
+		filename = os.path.join(self.directory, SEQUENCE_FILE)
+		tmp = filename + ".tmp"
+		with open(tmp, "w") as f:
+			f.write("%d\n" % self.sequence)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, filename)
+
+	def open_segment(self):
+		sequence = self.sequence
+		self.sequence += 1
+		self.store_sequence()
+
+		name = "%s%010d%s" % (SEGMENT_PREFIX, sequence, self.suffix)
+		self.segment_name = os.path.join(self.directory, name)
+		self.segment = self.opener(self.segment_name, "wb")
+		self.segment.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION))
+		self.segment.write(SEGMENT_INFO.pack(sequence, time.time()))
+
+		self.segment_bytes = SEGMENT_HEADER.size + SEGMENT_INFO.size
+		self.segment_start = time.monotonic()
+		self.last_payload = {}
+		self.segments += 1
+
+	def close_segment(self):
+		if self.segment is None:
+			return
+
+		self.segment.close()
+		self.segment = None
+		self.enforce_budget()
+
+	def enforce_budget(self):
+		segments = list_segments(self.directory)
+		sizes = [os.path.getsize(s) for s in segments]
+		total = sum(sizes)
+
+		# Delete the oldest segments, but never the one being written
+		for segment, size in zip(segments, sizes):
+			if total <= DS.RECORD_DISK_BUDGET or segment == self.segment_name:
+				break
+
+			os.remove(segment)
+			total -= size
+			self.deleted += 1
+
+	def write_pending(self):
+		if not self.pending:
+			return
+
+		if self.segment is None:
+			self.open_segment()
+
+		chunks = []
+		last_payload = self.last_payload
+		pack = SEGMENT_RECORD.pack
+
+		while self.pending:
+			timestamp, can_id, data = self.pending.popleft()
+			if data.__class__ is str:
+				data = bytes.fromhex(data)
+
+			if last_payload.get(can_id) == data:
+				chunks.append(pack(timestamp, can_id, FLAG_REPEAT | len(data)))
+			else:
+				chunks.append(pack(timestamp, can_id, len(data)))
+				chunks.append(data)
+				last_payload[can_id] = data
+
+			self.recorded += 1
+
+		block = b"".join(chunks)
+		self.segment.write(block)
+		self.segment_bytes += len(block)
+
+		if self.segment_bytes >= DS.RECORD_SEGMENT_SIZE or \
+			time.monotonic() - self.segment_start >= DS.RECORD_SEGMENT_TIME:
+			self.close_segment()
+
+	def run(self):
+		self.enforce_budget()
+
+		while not self.shutdown.is_set():
+			self.shutdown.wait(DS.RECORD_WRITE_INTERVAL)
+			self.write_pending()
+
+		self.write_pending()
+		self.close_segment()
+
+		if DS.DEBUG:
+			print(self)
+
+	def __str__(self):
+		return "Frames recorded: %d, dropped: %d, segments: %d, deleted: %d" % (
+			self.recorded, self.dropped, self.segments, self.deleted)
+
+
+class SegmentSource(object):
+	"""Frame source for CanReader reading one or more compressed segments."""
+
+	def __init__(self, filenames, chunk_size=DS.LINE_READ_SIZE):
+		if isinstance(filenames, str):
+			filenames = [filenames]
+
+		self.filenames = list(filenames)
+		self.chunk_size = chunk_size
+		self.f = None
+		self.buffer = b""
+		self.last_payload = {}
+
+	def fileno(self):
+		# Never polled, the data comes from a decompressor
+		raise ValueError("Segments can not be polled")
+
+	def close(self):
+		if self.f is not None:
+			self.f.close()
+			self.f = None
+
+	def next_segment(self):
+		self.close()
+		while self.filenames:
+			f = open_segment(self.filenames.pop(0))
+			if f is None:
+				continue
+
+			try:
+				magic, version = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+				if magic == SEGMENT_MAGIC and version >= 2:
+					SEGMENT_INFO.unpack(f.read(SEGMENT_INFO.size))
+			except (EOFError, OSError, struct.error):
+				f.close()
+				continue
+
+			if magic == SEGMENT_MAGIC and version in SEGMENT_VERSIONS:
+				self.f = f
+				self.buffer = b""
+				self.last_payload = {}
+				return True
+
+			f.close()
+
+		return False
+
+	def read_frames(self):
+		while True:
+			if self.f is None and not self.next_segment():
+				return None
+
+			try:
+				chunk = self.f.read1(self.chunk_size)
+			except (EOFError, OSError):
+				# Segment cut short, e.g. by a power loss
+				chunk = b""
+
+			if chunk:
+				break
+
+			self.close()
+
+		buffer = self.buffer + chunk
+		frames = []
+		last_payload = self.last_payload
+		unpack_from = SEGMENT_RECORD.unpack_from
+		pos = 0
+		end = len(buffer)
+
+		while pos + SEGMENT_RECORD.size <= end:
+			timestamp, can_id, flags = unpack_from(buffer, pos)
+			dlc = flags & DLC_MASK
+
+			if flags & FLAG_REPEAT:
+				data = last_payload.get(can_id, b"")
+				pos += SEGMENT_RECORD.size
+			else:
+				start = pos + SEGMENT_RECORD.size
+				if start + dlc > end:
+					break
+				data = buffer[start:start + dlc]
+				last_payload[can_id] = data
+				pos = start + dlc
+
+			frames.append((timestamp, can_id, data))
+
+		self.buffer = buffer[pos:]
+		return frames
@@ -0,0 +1,224 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import argparse
+import asyncio
+import threading
+import time
+
+from components.settings import DashboardSettings as DS
+
+
+def parse_offset(s):
+	"""Parse a replay offset given as seconds, 'MM:SS' or 'HH:MM:SS'."""
+	if s is None:
+		return None
+
+	seconds = 0.0
+	for part in s.split(":"):
+		seconds = seconds * 60.0 + float(part)
+
+	return seconds
+
+
+def parse_speed(s):
+	"""Parse a replay speed multiplier, which must be above zero."""
+	try:
+		speed = float(s)
+	except ValueError:
+		raise argparse.ArgumentTypeError("invalid speed: %r" % s)
+
+	if not speed > 0.0:
+		raise argparse.ArgumentTypeError("speed must be above zero: %r" % s)
+
+	return speed
+
+
+#
+# Paces replayed frames against monotonic deadlines, so decode time
+# never adds up as drift. Offsets for the start/end window are seconds
+# from the first frame in the log. Frames before the start of the window
+# are decoded without pacing, so the integrators are correct at the start.
+#
+class ReplayScheduler(object):
+
+	def __init__(self, shutdown, speed=1.0, as_fast_as_possible=False, start=None, end=None):
+		if not speed > 0.0:
+			raise ValueError("Replay speed must be above zero: %r" % speed)
+
+		self.shutdown = shutdown
+		self.speed = speed
+		self.as_fast_as_possible = as_fast_as_possible
+		self.start = start
+		self.end = end
+
+		self.log_start = None
+
+		# Wall clock and log time that the deadlines are computed from
+		self.anchor_wall = None
+		self.anchor_log = None
+
+		# Pause and single stepping, controlled from the GUI thread
+		self.condition = threading.Condition()
+		self.paused = False
+		self.step_until = None
+
+		# Achieved rate reporting
+		self.log_time = 0.0
+		self.lag = 0.0
+		self.frames = 0
+		self.report_wall = None
+		self.report_log = None
+		self.report_frames = 0
+		self.achieved_speed = 0.0
+		self.frame_rate = 0.0
+
+	def admit(self, timestamp):
+		"""Check the frame at 'timestamp' against the replay window.
+		Returns False past the end, None while fast forwarding to the
+		start and True when the frame is to be paced.
+		"""
+		if self.log_start is None:
+			self.log_start = timestamp
+
+		offset = timestamp - self.log_start
+		self.log_time = offset
+
+		if self.end is not None and offset > self.end:
+			return False
+
+		# Seeking, fast forward to the start of the window
+		if self.start is not None and offset < self.start:
+			return None
+
+		self.frames += 1
+		return True
+
+	def get_delay(self, timestamp):
+		"""Seconds until the frame at 'timestamp' is due, 0.0 if it is due now."""
+		now = time.monotonic()
+
+		if self.as_fast_as_possible:
+			self.update_rate(now, self.log_time)
+			return 0.0
+
+		if self.anchor_wall is None:
+			self.anchor_wall = now
+			self.anchor_log = timestamp
+
+		deadline = self.anchor_wall + (timestamp - self.anchor_log) / self.speed
+		delay = deadline - now
+
+		# Short sleeps are not worth the wakeup, catch up on the next frame
+		if delay > DS.REPLAY_MIN_SLEEP:
+			self.lag = 0.0
+		else:
+			self.lag = max(-delay, 0.0)
+			delay = 0.0
+
+		self.update_rate(now, self.log_time)
+		return delay
+
+	def is_held(self):
+		"""True while paused, unless the current frame is within a step."""
+		if not self.paused or self.shutdown.is_set():
+			return False
+
+		if self.step_until is not None and self.log_time <= self.step_until:
+			return False
+
+		self.step_until = None
+		return True
+
+	def wait(self, timestamp):
+		"""Block until the frame at 'timestamp' is due.
+		Returns False when the frame is past the end of the replay window.
+		"""
+		due = self.admit(timestamp)
+		if due is not True:
+			return due is None
+
+		if self.paused:
+			self.wait_paused()
+
+		delay = self.get_delay(timestamp)
+		if delay:
+			self.shutdown.wait(delay)
+
+		return True
+
+	async def wait_async(self, timestamp):
+		"""As wait(), for frames fed from an event loop."""
+		due = self.admit(timestamp)
+		if due is not True:
+			return due is None
+
+		if self.paused:
+			while self.is_held():
+				await asyncio.sleep(0.1)
+			self.anchor_wall = None
+
+		delay = self.get_delay(timestamp)
+		if delay:
+			await asyncio.sleep(delay)
+
+		return True
+
+	def wait_paused(self):
+		with self.condition:
+			while self.is_held():
+				self.condition.wait(0.1)
+
+		# Restart pacing from here, without catching up on the paused time
+		self.anchor_wall = None
+
+	def pause(self):
+		with self.condition:
+			self.paused = True
+			self.step_until = None
+
+	def play(self):
+		with self.condition:
+			self.paused = False
+			self.condition.notify_all()
+
+	def toggle_pause(self):
+		if self.paused:
+			self.play()
+		else:
+			self.pause()
+
+	def step(self, seconds=None):
+		"""While paused, replay the next 'seconds' of the log."""
+		if seconds is None:
+			seconds = DS.REPLAY_STEP_TIME
+
+		with self.condition:
+			self.paused = True
+			self.step_until = self.log_time + seconds
+			self.condition.notify_all()
+
+	def update_rate(self, now, offset):
+		if self.report_wall is None:
+			self.report_wall = now
+			self.report_log = offset
+			self.report_frames = self.frames
+			return
+
+		elapsed = now - self.report_wall
+		if elapsed < DS.REPLAY_REPORT_INTERVAL:
+			return
+
+		self.achieved_speed = (offset - self.report_log) / elapsed
+		self.frame_rate = (self.frames - self.report_frames) / elapsed
+
+		self.report_wall = now
+		self.report_log = offset
+		self.report_frames = self.frames
+
+		if not self.paused:
+			print(self)
+
+	def __str__(self):
+		target = "max" if self.as_fast_as_possible else "%.1fx" % self.speed
+		return "Replay at %.0f s: %.1fx (target %s), %.0f frames/s, %.3f s behind" % (
+			self.log_time, self.achieved_speed, target, self.frame_rate, self.lag)
@@ -0,0 +1,169 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import glob
+import os
+import struct
+
+from components.messages import StateGetters
+from components.capture import open_source, is_binary_capture
+from components.recorder import list_segments
+from components.headless import open_decoder
+
+#
+# Summary of one ride, i.e. one capture
+#
+#   distance   sum of the increasing odometer steps
+#   energy     integrated like the energy state, regeneration included
+#   peaks      highest temperatures and motor current
+#   states     seconds spent in each contactor state
+#
+STATE_COLUMNS = ["time " + name for name in StateGetters.STATES] + ["time Unknown"]
+
+COLUMNS = ["capture", "start", "duration_s", "frames", "distance_km", "energy_wh", "wh_per_km",
+	"max_motor_temp", "max_controller_temp", "max_motor_rms_current"] + STATE_COLUMNS
+
+
+class RideSummary(object):
+
+	def __init__(self, name, states):
+		self.name = name
+		self.states = states
+
+		self.start = None
+		self.end = None
+		self.frames = 0
+
+		self.odometer = None
+		self.distance = 0.0
+		self.energy = 0.0
+
+		self.max_motor_temp = None
+		self.max_controller_temp = None
+		self.max_motor_rms_current = None
+
+		self.state_times = [0.0] * len(STATE_COLUMNS)
+		self.state_time = None
+		self.state = None
+
+	def subscribe(self, dispatcher):
+		"""Summarize after StateData has handled the frames."""
+		dispatcher.subscribe(0x1A6, self.summarize_m1)
+		dispatcher.subscribe(0x2A6, self.summarize_m2)
+		dispatcher.subscribe(0x3A6, self.summarize_m3)
+
+	def add_frames(self, frames):
+		if not frames:
+			return
+
+		if self.start is None:
+			self.start = frames[0][0]
+		self.end = frames[-1][0]
+		self.frames += len(frames)
+
+	def summarize_m1(self, data):
+		current = self.states.motor_rms_current
+		if self.max_motor_rms_current is None or current > self.max_motor_rms_current:
+			self.max_motor_rms_current = current
+
+	def summarize_m2(self, data):
+		states = self.states
+
+		# Energy of this frame, as subtracted from the energy state
+		self.energy += states.energy_rate
+
+		if self.max_motor_temp is None or states.motor_temp > self.max_motor_temp:
+			self.max_motor_temp = states.motor_temp
+		if self.max_controller_temp is None or states.controller_temp > self.max_controller_temp:
+			self.max_controller_temp = states.controller_temp
+
+		# The state holds until the next report
+		t = states.clock.time()
+		if self.state is not None:
+			self.state_times[self.state] += t - self.state_time
+
+		self.state_time = t
+		self.state = min(states.contactor_state, len(STATE_COLUMNS) - 1)
+
+	def summarize_m3(self, data):
+		odometer = self.states.odometer
+
+		# Counter resets and glitches do not count as driving
+		if self.odometer is not None and odometer > self.odometer:
+			self.distance += odometer - self.odometer
+		self.odometer = odometer
+
+	def row(self):
+		wh = self.energy / 3600.0
+		return [self.name, self.start, self.end - self.start if self.start is not None else 0.0, self.frames,
+			self.distance, wh, wh / self.distance if self.distance > 0.0 else None,
+			self.max_motor_temp, self.max_controller_temp, self.max_motor_rms_current] + self.state_times
+
+
+def summarize_capture(filename):
+	"""Decode one capture. Returns its summary row, or an error message."""
+	try:
+		source = open_source(filename)
+	except (OSError, ValueError, EOFError, struct.error) as e:
+		return filename, None, str(e)
+
+	# Closing the reader closes the source
+	states, reader = open_decoder(source)
+	try:
+		summary = RideSummary(filename, states)
+		summary.subscribe(reader.dispatcher)
+
+		frames = source.read_frames()
+		while frames is not None:
+			reader.dispatch_frames(frames)
+			summary.add_frames(frames)
+			frames = source.read_frames()
+	except (OSError, ValueError, EOFError, struct.error) as e:
+		return filename, None, str(e)
+	finally:
+		reader.close()
+
+	return filename, summary.row(), None
+
+
+def total_row(rows):
+	"""All rides merged into one row."""
+	column = dict([(name, i) for i, name in enumerate(COLUMNS)])
+
+	def values(name):
+		return [row[column[name]] for row in rows if row[column[name]] is not None]
+
+	def maximum(name):
+		v = values(name)
+		return max(v) if v else None
+
+	distance = sum(values("distance_km"))
+	wh = sum(values("energy_wh"))
+
+	return ["total", min(values("start") or [None]), sum(values("duration_s")), sum(values("frames")),
+		distance, wh, wh / distance if distance > 0.0 else None,
+		maximum("max_motor_temp"), maximum("max_controller_temp"), maximum("max_motor_rms_current")] + \
+		[sum(values(name)) for name in STATE_COLUMNS]
+
+
+def is_capture(filename):
+	"""Candump text by name, or a binary capture by content."""
+	if filename.endswith(".txt") or filename.endswith(".log"):
+		return True
+
+	return os.path.isfile(filename) and is_binary_capture(filename)
+
+
+def find_captures(patterns):
+	"""Captures given as files, glob patterns or directories. A directory
+	of recorded segments is one capture, other directories are searched
+	for captures one level down."""
+	captures = []
+	for pattern in patterns:
+		for path in sorted(glob.glob(pattern)) or [pattern]:
+			if os.path.isdir(path) and not list_segments(path):
+				names = sorted(os.listdir(path))
+				captures += [os.path.join(path, n) for n in names if is_capture(os.path.join(path, n))]
+			else:
+				captures.append(path)
+
+	return captures
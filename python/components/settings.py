@@ -10,8 +10,105 @@ class DashboardSettings(object):
 
 	BATTERY_TOTAL_ENERGY = 8800*60*60 # W seconds
 	STORE_STATE_INTERVAL = 600 # Nr. seconds * 10
+	JOURNAL_MAX_SIZE = 64*1024 # Bytes before the journal is compacted
+	JOURNAL_EXPORT_TIMEOUT = 1.0 # Seconds to wait for the decoder before packing directly
 	DEFAULT_ENERGY_CONSUMPTION = 300.0
 
+	# Minutes in the average consumption used for the range
+	CONSUMPTION_MINUTES = 10
+
+	# Other consumption windows, limited by seconds of driving and/or meters
+	CONSUMPTION_WINDOWS = {
+		"km": {"distance": 1000.0},
+		"10min": {"seconds": 600},
+		"trip": {},
+	}
+	CONSUMPTION_MAX_BUCKETS = 3600 # Buckets kept at most by a distance window
+
+	#
+	#
+	#	CAN settings
+	#
+	#
+	CAN_INTERFACE = "can0"
+
+	# Curtis 1239 PDOs and heartbeat, everything else is filtered in the kernel
+	CURTIS_CAN_IDS = [0x1A6, 0x2A6, 0x3A6, 0x4A6, 0x726]
+
+	# Max frames handled per wakeup of the reader
+	CAN_READ_BATCH = 64
+
+	# Bytes read per wakeup when ingesting candump text
+	LINE_READ_SIZE = 65536
+	LINE_MAX_LENGTH = 4096 # Longer lines are dropped, bounds the partial line carried over
+
+	# Records read per batch from binary captures
+	CAPTURE_READ_BATCH = 1024
+
+	# Seconds between reports of frames with unknown ids
+	UNKNOWN_ID_REPORT_INTERVAL = 10.0
+
+	# Per id bus statistics and decode timing
+	BUS_STATISTICS = True
+	BUS_STATS_MAX_IDS = 32 # Ids tracked separately, the rest are lumped together
+	BUS_STATS_SMOOTHING = 0.05 # Weight of a new sample in the frame rate average
+	BUS_SILENT_TIMEOUT = 1.0 # Seconds without frames before an id counts as silent
+	BUS_STATS_REPORT_INTERVAL = 30.0 # Seconds between statistics printouts in debug mode
+
+	# Rate (Hz) at which coalesced frames are applied, when enabled
+	COALESCE_RATE = 20.0
+
+	#
+	#
+	#	Signal history settings
+	#
+	#
+	# Off by default, recording costs every decoded frame a few microseconds
+	HISTORY = False
+	HISTORY_RAW_SIZE = 8192 # Samples kept per message
+	HISTORY_SECOND_SIZE = 3600 # One hour of one second buckets
+	HISTORY_MINUTE_SIZE = 1440 # One day of one minute buckets
+
+	#
+	#
+	#	Decode process settings
+	#
+	#
+	SHARED_STATE_NAME = "curtis_state" # Name of the shared memory block
+	SHARED_STATE_TIMEOUT = 0.02 # Seconds a GUI read waits for a write in progress
+	DECODE_CPUS = [3] # Cores for the decode process, None to not pin it
+	GUI_CPUS = [0, 1, 2] # Cores for the GUI process
+
+	#
+	#
+	#	Headless decoding settings
+	#
+	#
+	HEADLESS_INTERVAL = 0.1 # Seconds between output rows
+	HEADLESS_MAX_GAP = 5.0 # Seconds without frames before rows are skipped
+	HEADLESS_CHUNK_ROWS = 4096 # Rows buffered before writing
+
+	#
+	#
+	#	On-device capture settings
+	#
+	#
+	RECORD_COMPRESSION = "gzip" # "gzip" or "lzma"
+	RECORD_SEGMENT_SIZE = 8*1024*1024 # Uncompressed bytes per segment
+	RECORD_SEGMENT_TIME = 15*60 # Max seconds per segment
+	RECORD_DISK_BUDGET = 256*1024*1024 # Total bytes kept, oldest segments are deleted
+	RECORD_MAX_PENDING = 20000 # Frames queued for the writer before dropping
+	RECORD_WRITE_INTERVAL = 0.5 # Seconds between writes
+
+	#
+	#
+	#	Replay settings
+	#
+	#
+	REPLAY_MIN_SLEEP = 0.002 # Frames due sooner than this are not slept for
+	REPLAY_STEP_TIME = 0.1 # Log seconds replayed per step when paused
+	REPLAY_REPORT_INTERVAL = 10.0 # Seconds between achieved rate reports
+
 	#
 	# PiCAN reserved pins
 	#
@@ -88,3 +185,29 @@ class DashboardSettings(object):
 	WARN_LIGHT_BBOX = [(145, 0), (145, 90), (240, 90), (240, 0)]
 	HIGHBEAM_BBOX = [(545, 0), (545, 90), (670, 90), (670, 0)]
 	RANGE_BBOX = [(600, 135), (600, 185), (660, 185), (660, 135)]
+
+	# Redraws of the screen per second, and the lowest rate the GUI degrades to under load
+	GUI_FRAME_RATE = 30.0
+	GUI_MIN_FRAME_RATE = 7.5
+
+	# Frames between load checks, and the share of the frame interval spent
+	# drawing above which the GUI degrades and below which it recovers
+	GUI_PACE_WINDOW = 30
+	GUI_OVERLOAD = 0.8
+	GUI_UNDERLOAD = 0.4
+
+	# While degraded, low priority widgets are updated every this many frames
+	GUI_LOW_PRIORITY_FRAMES = 10
+
+	# Recent frame times kept for the percentiles
+	GUI_FRAME_STATS = 300
+
+	# Rendered text surfaces kept for reuse
+	TEXT_CACHE_SIZE = 256
+
+	# Degrees between the prerendered needle angles
+	NEEDLE_STEP = 0.5
+
+	# Readings the needle sprites cover, km/h and kW. Off these the needle is rotated when drawn
+	SPEED_NEEDLE_RANGE = (0.0, 160.0)
+	POWER_NEEDLE_RANGE = (0.0, 80.0)
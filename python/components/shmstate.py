@@ -0,0 +1,163 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import mmap
+import operator
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+import _posixshmem
+
+from components.settings import DashboardSettings as DS
+from components.messages import StateSnapshot
+
+#
+# Decoded state in a shared memory block
+#
+#   Sequence  odd while the writer is updating the block
+#   Values    FIELDS, in order
+#
+# There is one writer, the decode process, which writes after every
+# message that changes a value. Readers copy the values and retry if the
+# sequence was odd or changed meanwhile (a seqlock), so neither side ever
+# waits for the other. The sequence is 32 bit so the store is atomic on
+# 32 bit ARM as well.
+#
+FIELDS = [
+	("motor_rms_current", "q"),
+	("actual_speed", "q"),
+	("battery_current", "q"),
+	("dc_capacitor_voltage", "d"),
+
+	("motor_temp", "d"),
+	("controller_temp", "d"),
+	("contactor_state", "q"),
+	("status", "q"),
+	("motor_power", "d"),
+
+	("error_code", "q"),
+	("vehicle_acc", "d"),
+	("odometer", "d"),
+
+	("tts_1", "q"),
+	("tts_2", "q"),
+	("dcdc", "d"),
+
+	("energy_state", "d"),
+	("energy_rate", "d"),
+	("latest_consumption", "d"),
+	("avg_consumption", "d"),
+]
+
+NAMES = [name for name, _ in FIELDS]
+
+SEQUENCE = struct.Struct("<I")
+VALUES = struct.Struct("<4x" + "".join([fmt for _, fmt in FIELDS]))
+
+BLOCK_SIZE = SEQUENCE.size + VALUES.size
+
+# Values of a StateSnapshot in the order of FIELDS
+snapshot_values = operator.itemgetter(*[StateSnapshot.FIELDS.index(name) for name in NAMES])
+
+
+class SharedStateWriter(object):
+	"""Owns the shared memory block, written by the decode process."""
+
+	def __init__(self, name=DS.SHARED_STATE_NAME):
+		# Left over from an unclean exit
+		try:
+			shared_memory.SharedMemory(name).unlink()
+		except FileNotFoundError:
+			pass
+
+		self.shm = shared_memory.SharedMemory(name, create=True, size=BLOCK_SIZE)
+		self.sequence = 0
+
+	def publish(self, states):
+		self.write_snapshot(states.get_snapshot())
+
+	def write_snapshot(self, snapshot, changed=None):
+		"""Write the values of 'snapshot', as a subscriber of StateData."""
+		self.write(snapshot_values(snapshot))
+
+	def write(self, values):
+		buf = self.shm.buf
+
+		self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+		SEQUENCE.pack_into(buf, 0, self.sequence)
+
+		VALUES.pack_into(buf, SEQUENCE.size, *values)
+
+		self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+		SEQUENCE.pack_into(buf, 0, self.sequence)
+
+	def close(self):
+		self.shm.close()
+		self.shm.unlink()
+
+
+class SharedStateView(object):
+	"""Read only view of the state published by a SharedStateWriter."""
+
+	def __init__(self, name=DS.SHARED_STATE_NAME):
+		# Mapped read only, a bug in the GUI can not corrupt the block. Opened
+		# by name as SharedMemory does, but not registered with the resource
+		# tracker, which would unlink the block of the writer at exit.
+		fd = _posixshmem.shm_open("/" + name, os.O_RDONLY)
+		try:
+			self.mm = mmap.mmap(fd, BLOCK_SIZE, access=mmap.ACCESS_READ)
+		finally:
+			os.close(fd)
+		self.buf = memoryview(self.mm)
+
+		# Shown until the decode process publishes, and if it stops mid write
+		self.values = empty_values()
+		self.retries = 0
+
+	def read(self, timeout=DS.SHARED_STATE_TIMEOUT):
+		"""Consistent copy of the values. The last copy, or the defaults before
+		anything is published, if none can be taken within 'timeout'."""
+		buf = self.buf
+		deadline = None
+		while True:
+			sequence = SEQUENCE.unpack_from(buf, 0)[0]
+
+			# Nothing published yet
+			if sequence == 0:
+				return self.values
+
+			if not sequence & 1:
+				values = VALUES.unpack_from(buf, SEQUENCE.size)
+				if SEQUENCE.unpack_from(buf, 0)[0] == sequence:
+					self.values = values
+					return values
+
+			self.retries += 1
+
+			# A writer that died mid write leaves the sequence odd
+			now = time.monotonic()
+			if deadline is None:
+				deadline = now + timeout
+			elif now >= deadline:
+				return self.values
+
+	def get_snapshot(self):
+		values = dict(zip(NAMES, self.read()))
+		values["sstate"] = StateSnapshot.get_state_name(values["contactor_state"])
+
+		return StateSnapshot([values[name] for name in StateSnapshot.FIELDS])
+
+	def close(self):
+		self.buf.release()
+		self.mm.close()
+
+
+def empty_values():
+	"""Values as in a new StateData, without any message decoded."""
+	values = dict([(name, 0) for name in NAMES])
+	values["energy_state"] = DS.BATTERY_TOTAL_ENERGY
+	values["latest_consumption"] = DS.DEFAULT_ENERGY_CONSUMPTION
+	values["avg_consumption"] = DS.DEFAULT_ENERGY_CONSUMPTION
+
+	return tuple([values[name] for name in NAMES])
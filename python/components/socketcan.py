@@ -0,0 +1,86 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import socket
+import struct
+
+from components.settings import DashboardSettings as DS
+
+# Not exported by the socket module, value from asm-generic/socket.h
+SO_TIMESTAMP = getattr(socket, "SO_TIMESTAMP", 29)
+
+# struct can_frame: 32 bit id, 8 bit dlc, 3 bytes padding, 8 bytes data
+CAN_FRAME = struct.Struct("=IB3x8s")
+
+# struct can_filter: 32 bit id, 32 bit mask
+CAN_FILTER = struct.Struct("=II")
+
+# struct timeval delivered with SO_TIMESTAMP, size depends on time_t
+TIMEVAL32 = struct.Struct("=ii")
+TIMEVAL64 = struct.Struct("=qq")
+
+# Only match standard data frames, no extended or remote frames
+SFF_FILTER_MASK = socket.CAN_SFF_MASK | socket.CAN_EFF_FLAG | socket.CAN_RTR_FLAG
+
+
+#
+# Raw SocketCAN source, reads binary frames straight from the kernel.
+# Frames are returned as (timestamp, can_id, data) tuples.
+#
+class SocketCanSource(object):
+
+	def __init__(self, interface=DS.CAN_INTERFACE, can_ids=DS.CURTIS_CAN_IDS, batch=DS.CAN_READ_BATCH):
+		self.interface = interface
+		self.batch = batch
+
+		self.sock = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+
+		# Let the kernel drop everything we do not care about
+		if can_ids:
+			filters = b"".join([CAN_FILTER.pack(can_id, SFF_FILTER_MASK) for can_id in can_ids])
+			self.sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, filters)
+
+		# Kernel receive timestamp for each frame
+		self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMP, 1)
+
+		self.sock.bind((interface,))
+		self.sock.setblocking(False)
+
+		self.ancbufsize = socket.CMSG_SPACE(TIMEVAL64.size)
+
+	def fileno(self):
+		return self.sock.fileno()
+
+	def close(self):
+		self.sock.close()
+
+	@staticmethod
+	def get_timestamp(ancdata):
+		for level, ctype, cdata in ancdata:
+			if level == socket.SOL_SOCKET and ctype == SO_TIMESTAMP:
+				if len(cdata) >= TIMEVAL64.size:
+					sec, usec = TIMEVAL64.unpack_from(cdata)
+				else:
+					sec, usec = TIMEVAL32.unpack_from(cdata)
+				return sec + usec / 1000000.0
+
+		return None
+
+	def read_frames(self):
+		#
+		# Python has no recvmmsg(), so drain the socket receive queue
+		# frame by frame until it is empty or the batch is full.
+		#
+		frames = []
+		recvmsg = self.sock.recvmsg
+		unpack = CAN_FRAME.unpack
+
+		for _ in range(self.batch):
+			try:
+				raw, ancdata, flags, address = recvmsg(CAN_FRAME.size, self.ancbufsize)
+			except BlockingIOError:
+				break
+
+			can_id, dlc, data = unpack(raw)
+			frames.append((self.get_timestamp(ancdata), can_id & socket.CAN_EFF_MASK, data[:dlc]))
+
+		return frames
@@ -0,0 +1,104 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import collections
+
+import numpy
+import pygame
+
+from components.settings import DashboardSettings as DS
+
+
+class FontRegistry(object):
+	"""System fonts, each (name, size) looked up and loaded once."""
+
+	def __init__(self):
+		self.fonts = {}
+
+	def get(self, name, size):
+		key = (name, size)
+		font = self.fonts.get(key)
+		if font is None:
+			font = pygame.font.SysFont(name, size)
+			self.fonts[key] = font
+
+		return font
+
+	def clear(self):
+		# Fonts are invalid after pygame.quit()
+		self.fonts.clear()
+
+
+#
+# Rendered text, least recently used first out. Readouts repeat from
+# frame to frame, so most frames blit cached surfaces only. Shadowed
+# text is composited with its shadow into one surface.
+#
+class TextCache(object):
+
+	SHADOW_COLOR = (70, 70, 70)
+
+	def __init__(self, fonts, size=DS.TEXT_CACHE_SIZE):
+		self.fonts = fonts
+		self.size = size
+		self.surfaces = collections.OrderedDict()
+
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, text, size, font, color, shadow=False):
+		"""Surface with the text, and the width of the text itself."""
+		key = (text, size, font, color, shadow)
+		entry = self.surfaces.get(key)
+		if entry is not None:
+			self.surfaces.move_to_end(key)
+			self.hits += 1
+			return entry
+
+		self.misses += 1
+		entry = self.render(text, size, font, color, shadow)
+
+		self.surfaces[key] = entry
+		if len(self.surfaces) > self.size:
+			self.surfaces.popitem(last=False)
+
+		return entry
+
+	def render(self, text, size, font, color, shadow):
+		tfont = self.fonts.get(font, size)
+		bitmap = tfont.render(text, True, color)
+		width = bitmap.get_width()
+
+		if not shadow:
+			return bitmap, width
+
+		offset = size // 20
+		height = bitmap.get_height()
+		shadow = tfont.render(text, True, self.SHADOW_COLOR)
+
+		# Text over shadow, so one blit gives what blitting both gives
+		text_alpha = numpy.zeros((width + offset, height + offset))
+		shadow_alpha = numpy.zeros((width + offset, height + offset))
+		text_alpha[:width, :height] = pygame.surfarray.pixels_alpha(bitmap) / 255.0
+		shadow_alpha[offset:, offset:] = pygame.surfarray.pixels_alpha(shadow) / 255.0
+
+		shadow_alpha *= 1.0 - text_alpha
+		alpha = text_alpha + shadow_alpha
+		weight = numpy.divide(text_alpha, alpha, out=numpy.zeros_like(alpha), where=alpha > 0.0)
+
+		surface = pygame.Surface((width + offset, height + offset), pygame.SRCALPHA)
+		rgb = pygame.surfarray.pixels3d(surface)
+		for channel in range(3):
+			rgb[:, :, channel] = numpy.rint(color[channel] * weight + self.SHADOW_COLOR[channel] * (1.0 - weight))
+		del rgb
+
+		pygame.surfarray.pixels_alpha(surface)[:] = numpy.rint(alpha * 255.0)
+
+		return surface, width
+
+	def clear(self):
+		self.surfaces.clear()
+
+	def __str__(self):
+		total = self.hits + self.misses
+		return "Text cache: %d surfaces, %d hits, %d misses (%.1f %% hits)" % (
+			len(self.surfaces), self.hits, self.misses, 100.0 * self.hits / total if total else 0.0)
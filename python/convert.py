@@ -0,0 +1,41 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+
+from components.capture import is_binary_capture, text_to_binary, binary_to_text, open_source
+from components.replay import parse_offset
+from components.settings import DashboardSettings as DS
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Convert CAN captures between candump -L text and binary format, or decode them to signals')
+	parser.add_argument('infile', help='Capture to convert (text, binary, segment or directory of segments), the format is detected')
+	parser.add_argument('outfile', help='Converted capture, or decoded signals if it ends with .csv or .npz')
+	parser.add_argument('-b', '--bus', dest='bus', default='can0',
+						help='Bus name written to text captures, default can0')
+	parser.add_argument('--start', dest='start', default=None,
+						help='Only convert from this offset into the log, seconds or [HH:]MM:SS (binary to text)')
+	parser.add_argument('--end', dest='end', default=None,
+						help='Only convert up to this offset into the log, seconds or [HH:]MM:SS (binary to text)')
+	parser.add_argument('-t', '--interval', dest='interval', type=float, default=DS.HEADLESS_INTERVAL,
+						help='Seconds between rows of decoded signals, default %.1f' % DS.HEADLESS_INTERVAL)
+
+	args = parser.parse_args()
+
+	if args.outfile.endswith(".csv") or args.outfile.endswith(".npz"):
+		from components.headless import decode_capture
+		frames, rows = decode_capture(open_source(args.infile), args.outfile, args.interval)
+		print("Decoded %d frames to %d rows" % (frames, rows))
+		sys.exit(0)
+
+	if os.path.isfile(args.infile) and is_binary_capture(args.infile):
+		count = binary_to_text(args.infile, args.outfile, args.bus, parse_offset(args.start), parse_offset(args.end))
+	else:
+		count = text_to_binary(args.infile, args.outfile)
+
+	print("Converted %d frames" % count)
+	sys.exit(0)
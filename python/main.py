@@ -1,7 +1,6 @@
 #!/usr/bin/python -B
 # -*- coding: utf-8 -*-
 
-import fcntl
 import sys
 import signal
 import argparse
@@ -9,41 +8,124 @@ import argparse
 from threading import Event
 
 from components.messages import *
+from components.journal import JournalWriter
 
 # Global semaphore that makes all threads quit
 shutdown = Event()
 
 
-def run(infile, replay_mode, fullscreen):
+def run(infile, replay_mode, fullscreen, source=None, coalesce_rate=None, replay=None, record_dir=None):
 
 	global shutdown
 
-	states = StateData()
+	# Replays neither load nor overwrite the state of the vehicle
+	states = StateData(persist=not replay_mode)
 
-	c = CanReader(states, infile, shutdown, replay_mode)
+	if record_dir:
+		from components.recorder import CaptureRecorder
+		recorder = CaptureRecorder(record_dir, shutdown)
+		recorder.start()
+	else:
+		recorder = None
+
+	c = CanReader(states, infile, shutdown, replay_mode, source, coalesce_rate, replay, recorder)
 	c.start()
 
 	evh = EventHandler(states, shutdown)
 	evh.start()
 
-	gui = GUI(states, evh, shutdown, fullscreen)
+	gui = GUI(states, evh, shutdown, fullscreen, c.replay)
 	gui.start()
 
-	store_counter = 0
+	if states.journal is not None:
+		journal = JournalWriter(states, shutdown)
+		journal.start()
+	else:
+		journal = None
+
+	next_stats_report = time.monotonic() + DS.BUS_STATS_REPORT_INTERVAL
 
 	# Let the main sleep until everyone has acknowledged the shutdown
 	while not shutdown.is_set():
 
 		time.sleep(0.1)
 
-		store_counter -= 1
-		if store_counter <= 0:
-			states.dump_states()
-			store_counter = DS.STORE_STATE_INTERVAL
+		if DS.DEBUG and c.stats is not None and time.monotonic() >= next_stats_report:
+			print(c.stats)
+			print(states.format_change_rates())
+			next_stats_report = time.monotonic() + DS.BUS_STATS_REPORT_INTERVAL
 
 	c.join()
 	evh.join()
 	gui.join()
+	if journal is not None:
+		journal.join()
+
+	if recorder is not None:
+		recorder.join()
+
+
+def run_async(infile, replay_mode, fullscreen, source=None, coalesce_rate=None, replay=None, record_dir=None):
+	"""As run(), with everything but the capture writer on one event loop."""
+	from components.aioruntime import AsyncRuntime
+
+	states = StateData(persist=not replay_mode)
+
+	if record_dir:
+		from components.recorder import CaptureRecorder
+		recorder = CaptureRecorder(record_dir, shutdown)
+		recorder.start()
+	else:
+		recorder = None
+
+	c = CanReader(states, infile, shutdown, replay_mode, source, coalesce_rate, replay, recorder)
+	evh = EventHandler(states, shutdown, threaded=False)
+	gui = GUI(states, evh, shutdown, fullscreen, c.replay)
+
+	AsyncRuntime(states, c, evh, gui, shutdown).run()
+
+	if recorder is not None:
+		recorder.join()
+
+
+def run_process(replay_mode, fullscreen, source, stop, coalesce_rate=None, replay=None, record_dir=None):
+	"""As run(), with reading and decoding in a separate process that
+	quits on 'stop'."""
+	from components.decodeprocess import DecodeProcess, set_cpus
+	from components.shmstate import SharedStateWriter, SharedStateView
+
+	writer = SharedStateWriter()
+	p = DecodeProcess(writer, stop, replay_mode, source, coalesce_rate, replay, record_dir)
+	p.start()
+
+	set_cpus(DS.GUI_CPUS)
+	states = SharedStateView()
+
+	evh = EventHandler(states, shutdown)
+	evh.start()
+
+	# The replay scheduler lives in the decode process, no pause keys
+	gui = GUI(states, evh, shutdown, fullscreen)
+	gui.start()
+
+	# The GUI would show the last values forever if decoding failed. At the
+	# end of the input the decode process exits cleanly, the GUI stays.
+	while not shutdown.is_set():
+		p.join(0.5)
+		if p.exitcode:
+			print("Decode process failed with exit code %d" % p.exitcode)
+			shutdown.set()
+
+	# A process killed while holding the lock of 'stop' would block setting it
+	if p.exitcode is None:
+		stop.set()
+
+	evh.join()
+	gui.join()
+	p.join()
+
+	states.close()
+	writer.close()
 
 
 def run_profile(infile, replay_mode, fullscreen):
@@ -65,7 +147,11 @@ def exit_handler(sig, frame):
 if __name__ == "__main__":
 	signal.signal(signal.SIGINT, exit_handler)
 
+	from components.replay import parse_speed
+
 	parser = argparse.ArgumentParser(description='Process CAN data')
+	parser.add_argument('capture', nargs='?', default=None,
+						help='Capture to read (candump -L text, binary, segment or directory of segments), default stdin')
 	parser.add_argument('-r', '--replay', dest='run_replay', action='store_true',
 						help='Run in replay mode, default false')
 	parser.add_argument('-f', '--fullscreen', dest='use_fullscreen', action='store_true',
@@ -74,12 +160,45 @@ if __name__ == "__main__":
 						help='Start in debug mode')
 	parser.add_argument('-o', '--oldgui', dest='use_fluke', action='store_true',
 						help='Run with old GUI, default false')
+	parser.add_argument('-i', '--interface', dest='interface', default=None,
+						help='Read frames directly from a SocketCAN interface (e.g. can0, vcan0) instead of stdin')
+	parser.add_argument('-s', '--speed', dest='speed', type=parse_speed, default=None,
+						help='Replay at this speed multiplier, implies replay mode')
+	parser.add_argument('-a', '--as-fast-as-possible', dest='as_fast_as_possible', action='store_true',
+						help='Replay without pacing, implies replay mode')
+	parser.add_argument('--start', dest='start', default=None,
+						help='Start replay at this offset into the log, seconds or [HH:]MM:SS')
+	parser.add_argument('--end', dest='end', default=None,
+						help='Stop replay at this offset into the log, seconds or [HH:]MM:SS')
+	parser.add_argument('--skip', dest='skip', action='store_true',
+						help='Jump straight to --start in binary captures, without decoding the frames before it')
+	parser.add_argument('--record', dest='record_dir', default=None,
+						help='Record all frames to compressed, rotating segments in this directory')
+	parser.add_argument('-c', '--coalesce', dest='coalesce_rate', type=float, nargs='?', const=DS.COALESCE_RATE, default=None,
+						help='Only apply the newest frame per id, at this rate in Hz (default %.0f)' % DS.COALESCE_RATE)
+	parser.add_argument('-p', '--process', dest='use_process', action='store_true',
+						help='Read and decode frames in a separate process')
+	parser.add_argument('--asyncio', dest='use_asyncio', action='store_true',
+						help='Run on a single asyncio event loop instead of one thread per component')
+	parser.add_argument('--history', dest='history', action='store_true',
+						help='Keep a history of every decoded signal')
 
 	args = parser.parse_args()
 
 	if args.debug:
 		DS.DEBUG = True
 
+	if args.history:
+		DS.HISTORY = True
+
+	if args.use_process:
+		# The decode process gets an event of its own, if it dies the
+		# GUI process can still shut down
+		from components.decodeprocess import FORK
+		stop = FORK.Event()
+	else:
+		stop = shutdown
+
 	# Late import to acknowledge the debug flag
 	from components.canreader import CanReader
 	from components.eventhandler import EventHandler
@@ -88,11 +207,38 @@ if __name__ == "__main__":
 	else:
 		from components.cleangui import CleanGUI as GUI
 
-	# make stdin a non-blocking file
-	fd = sys.stdin.fileno()
-	fl = fcntl.fcntl(fd, fcntl.F_GETFL)
-	fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+	replay_mode = args.run_replay or args.speed is not None or args.as_fast_as_possible or \
+		args.start is not None or args.end is not None
 
-	run(sys.stdin, args.run_replay, args.use_fullscreen)
+	if replay_mode:
+		from components.replay import ReplayScheduler, parse_offset
+		replay = ReplayScheduler(stop, args.speed or 1.0, args.as_fast_as_possible,
+			parse_offset(args.start), parse_offset(args.end))
+	else:
+		replay = None
+
+	if args.interface:
+		from components.socketcan import SocketCanSource
+		source = SocketCanSource(args.interface)
+	elif args.capture:
+		from components.capture import open_source
+		source = open_source(args.capture)
+		if args.skip and replay is not None and replay.start is not None and hasattr(source, "seek"):
+			# Keep the replay window relative to the start of the log
+			replay.log_start = source.seek(replay.start)
+	else:
+		# candump text on stdin
+		source = None
+
+	if args.use_process:
+		if source is None:
+			# The decode process gets its own copy of stdin
+			from components.ingest import LineSource
+			source = LineSource(os.fdopen(os.dup(sys.stdin.fileno()), "rb"))
+		run_process(replay_mode, args.use_fullscreen, source, stop, args.coalesce_rate, replay, args.record_dir)
+	elif args.use_asyncio:
+		run_async(sys.stdin, replay_mode, args.use_fullscreen, source, args.coalesce_rate, replay, args.record_dir)
+	else:
+		run(sys.stdin, replay_mode, args.use_fullscreen, source, args.coalesce_rate, replay, args.record_dir)
 	#run_profile(sys.stdin, args.run_replay, args.use_fullscreen)
 
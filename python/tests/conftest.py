@@ -0,0 +1,7 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# The components are imported as from the python directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
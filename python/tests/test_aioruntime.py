@@ -0,0 +1,73 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import asyncio
+import importlib
+import threading
+
+import pytest
+
+from components.settings import DashboardSettings as DS
+from components.aioruntime import AsyncRuntime
+
+
+@pytest.fixture
+def eventhandler(monkeypatch):
+	# The dummy GPIO is picked when the module is imported in debug mode
+	monkeypatch.setattr(DS, "DEBUG", True)
+	return importlib.import_module("components.eventhandler")
+
+
+def counted(calls, steps):
+	def wrapper():
+		calls.append(None)
+		return steps()
+	return wrapper
+
+
+def test_inputs_and_blinker_sleep_until_needed(eventhandler):
+	GPIO = eventhandler.GPIO
+	shutdown = threading.Event()
+	handler = eventhandler.EventHandler(None, shutdown, threaded=False)
+	handler.turn_signal.interval = 0.01
+
+	checks, blinks = [], []
+	handler.check_inputs = counted(checks, handler.check_inputs)
+	handler.turn_signal.blink_active = counted(blinks, handler.turn_signal.blink_active)
+
+	runtime = AsyncRuntime(None, None, handler, None, shutdown)
+
+	def push(pin, state):
+		# Edges are reported from the GPIO library's thread
+		thread = threading.Thread(target=GPIO.output, args=(pin, state))
+		thread.start()
+		thread.join()
+
+	async def scenario():
+		runtime.loop = asyncio.get_running_loop()
+		tasks = [asyncio.ensure_future(runtime.input_task()), asyncio.ensure_future(runtime.blink_task())]
+
+		# One look at the inputs on start, then nothing while idle
+		await asyncio.sleep(0.3)
+		assert (len(checks), len(blinks)) == (1, 1)
+
+		push(DS.TURN_LEFT_IN_PCB_PIN, eventhandler.INPUT_ON)
+		await asyncio.sleep(0.05)
+		assert handler.turn_signal.left_active
+		push(DS.TURN_LEFT_IN_PCB_PIN, eventhandler.INPUT_OFF)
+
+		# Blinks until the soft limit, then parks again
+		await asyncio.sleep(0.5)
+		assert not handler.turn_signal.left_active
+		idle = (len(checks), len(blinks))
+		await asyncio.sleep(0.3)
+		assert (len(checks), len(blinks)) == idle
+
+		for task in tasks:
+			task.cancel()
+		await asyncio.gather(*tasks, return_exceptions=True)
+
+	try:
+		asyncio.run(scenario())
+	finally:
+		shutdown.set()
+		handler.cleanup()
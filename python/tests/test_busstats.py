@@ -0,0 +1,30 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import time
+
+from components.busstats import BusStatistics, OTHER_ID
+
+
+def test_tracks_max_ids():
+	stats = BusStatistics(max_ids=2)
+	now = time.monotonic()
+	for can_id in (0x1A6, 0x2A6, 0x3A6, 0x4A6):
+		stats.observe(None, can_id, now)
+
+	assert sorted(stats.ids) == [0x1A6, 0x2A6]
+	assert stats.snapshot()["ids"][OTHER_ID]["count"] == 2
+
+
+def test_reports_silent_ids():
+	stats = BusStatistics()
+	stats.watch([0x1A6, 0x2A6, 0x3A6])
+	now = time.monotonic()
+	stats.observe(None, 0x1A6, now)
+	stats.observe(None, 0x2A6, now - 5.0)
+
+	assert stats.get_silent_ids(stats.watched) == [0x2A6, 0x3A6]
+	assert "silent: 2A6, 3A6, no frames" in str(stats)
+
+	stats.observe(None, 0x2A6, now)
+	stats.observe(None, 0x3A6, now)
+	assert "silent" not in str(stats)
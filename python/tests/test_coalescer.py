@@ -0,0 +1,80 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import struct
+import threading
+import time
+
+from components.messages import StateData
+from components.canreader import CanReader
+from components.coalescer import FrameCoalescer
+from components.replay import ReplayScheduler
+
+M1 = struct.Struct("<HhhH")
+M3 = struct.Struct("<BxhI")
+
+# One batch of frames covering a second of the log
+BATCH_FRAMES = 50
+FRAME_INTERVAL = 0.02
+
+
+class BatchSource(object):
+	"""Returns 'frames' in one batch, then the end of input."""
+
+	def __init__(self, frames):
+		self.frames = frames
+
+	def fileno(self):
+		raise ValueError("Not pollable")
+
+	def read_frames(self):
+		frames, self.frames = self.frames, None
+		return frames
+
+	def close(self):
+		pass
+
+
+def m1_frames(count, interval, start=1000.0):
+	return [(start + i * interval, 0x1A6, M1.pack(0, 10 * (i + 1), 0, 9600)) for i in range(count)]
+
+
+def test_replay_applies_coalesced_frames_within_a_batch():
+	states = StateData(persist=False, history=False)
+	shutdown = threading.Event()
+	replay = ReplayScheduler(shutdown)
+	source = BatchSource(m1_frames(BATCH_FRAMES, FRAME_INTERVAL))
+
+	reader = CanReader(states, None, shutdown, True, source, coalesce_rate=50, replay=replay)
+	reader.start()
+
+	try:
+		time.sleep(BATCH_FRAMES * FRAME_INTERVAL * 0.4)
+		assert reader.is_alive()
+		speed = states.get_snapshot().actual_speed
+		assert 0 < speed < 10 * BATCH_FRAMES
+	finally:
+		shutdown.set()
+		reader.join()
+
+
+def test_history_records_every_coalesced_frame():
+	states = StateData(persist=False, history=True)
+	reader = CanReader(states, None, threading.Event(), False, BatchSource(None), coalesce_rate=1)
+
+	# All but the last are superseded before the coalescer is due
+	frames = [(1000.0 + i * 0.1, 0x3A6, M3.pack(0, 0, 10 * i)) for i in range(5)]
+	reader.dispatch_frames(frames)
+	reader.close()
+
+	times, values, _, _ = states.history.query("odometer", 10.0)
+	assert times.tolist() == [timestamp for timestamp, can_id, data in frames]
+	assert values.tolist() == [float(i) for i in range(5)]
+	assert states.get_snapshot().odometer == 4.0
+
+
+def test_flush_without_frames_does_not_apply():
+	applied = []
+	coalescer = FrameCoalescer(applied.append)
+	coalescer.flush()
+	coalescer.poll()
+	assert applied == []
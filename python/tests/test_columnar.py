@@ -0,0 +1,182 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+import struct
+
+import numpy
+import pytest
+
+from components.settings import DashboardSettings as DS
+from components.messages import DECODERS
+from components.capture import open_source
+from components.headless import open_decoder
+from components.columnar import load_capture, EnergyIntegral, ConsumptionIntegral
+
+#
+# Checks the vectorized decoder against the frame by frame path, the
+# compiled decoders and the StateData integrals, on a synthetic drive of
+# several minutes. Decoded signals must be identical, the integrals
+# equal up to the rounding of their sums. Signals and the energy state
+# are also checked on the capture in test-data.
+#
+
+# Relative tolerance of the integrals, summed in a different order
+RTOL = 1e-9
+
+# The error of the energy sums is relative to the battery size, also near empty
+ENERGY_ATOL = RTOL * DS.BATTERY_TOTAL_ENERGY
+
+DRIVE_SECONDS = 10 * 60
+FRAME_INTERVAL = 0.1
+START_TIME = 1549571036.5
+
+CANDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "test-data", "candata.txt")
+
+M1 = struct.Struct("<HhhH")
+M2 = struct.Struct("<hhBBh")
+M3 = struct.Struct("<BxhI")
+M4 = struct.Struct("<Hh2xH")
+
+
+def drive_frames(seconds=DRIVE_SECONDS, seed=1):
+	"""(timestamp, id, data) of a drive with stops, regeneration, a charge
+	that resets the energy state and a gap in the log, at the rate and
+	with the jitter of the controller."""
+	rng = numpy.random.default_rng(seed)
+	steps = int(seconds / FRAME_INTERVAL)
+	t = START_TIME + numpy.arange(steps) * FRAME_INTERVAL + rng.uniform(0.0, 0.004, steps)
+
+	# Three minutes of driving between stops, skipped 3 s of log later on
+	phase = numpy.arange(steps) * FRAME_INTERVAL
+	rpm = numpy.clip(3200.0 * numpy.sin(phase * numpy.pi / 90.0) + rng.normal(0.0, 40.0, steps), -50.0, None)
+	rpm[(phase % 90.0) < 8.0] = 0.0
+	t[phase > 250.0] += 3.0
+
+	power = numpy.clip(numpy.diff(rpm, prepend=0.0) / FRAME_INTERVAL * 20.0 + rpm * 6.0 + rng.normal(0.0, 300.0, steps), -20000.0, 60000.0)
+	voltage = 150.0 - phase / 60.0 + rng.normal(0.0, 0.5, steps)
+	voltage[(phase > 120.0) & (phase < 122.0)] = 168.5
+
+	odometer = 1000.0
+	frames = []
+	for i in range(steps):
+		odometer += max(rpm[i], 0.0) * 0.0005
+		frames.append((t[i], 0x726, b"\x7f"))
+		frames.append((t[i] + 0.001, 0x1A6, M1.pack(
+			int(abs(power[i]) / 50.0), int(rpm[i]), int(power[i] / voltage[i] * 10.0), int(voltage[i] * 64.0))))
+		frames.append((t[i] + 0.002, 0x2A6, M2.pack(
+			int(300 + phase[i]), int(250 + phase[i] / 2.0), 1, 0, int(power[i] / 10.0))))
+		frames.append((t[i] + 0.003, 0x3A6, M3.pack(0, int(rng.normal(0.0, 500.0)), int(odometer * 10.0))))
+		frames.append((t[i] + 0.004, 0x4A6, M4.pack(i % 65536, -i % 32768, 1400 + i % 50)))
+
+	return frames
+
+
+@pytest.fixture(scope="module")
+def capture_file(request, tmp_path_factory):
+	if getattr(request, "param", "drive") == "candata":
+		return CANDATA
+
+	filename = tmp_path_factory.mktemp("capture") / "drive.txt"
+	with open(filename, "w") as f:
+		for timestamp, can_id, data in drive_frames():
+			f.write("(%.6f) can0 %03X#%s\n" % (timestamp, can_id, data.hex().upper()))
+
+	return str(filename)
+
+
+class FramePath(object):
+	"""Values seen when decoding frame by frame through StateData."""
+
+	def __init__(self, filename):
+		source = open_source(filename)
+		self.states, reader = open_decoder(source)
+
+		self.decoded = dict([(can_id, []) for can_id in DECODERS])
+		self.energy_state = []
+
+		for can_id in DECODERS:
+			reader.dispatcher.subscribe(can_id, self.make_handler(can_id))
+
+		frames = source.read_frames()
+		while frames is not None:
+			reader.dispatch_frames(frames)
+			frames = source.read_frames()
+
+		reader.close()
+
+	def make_handler(self, can_id):
+		decode = DECODERS[can_id]
+		decoded = self.decoded[can_id]
+
+		def handler(data):
+			decoded.append(decode(data))
+			if can_id == 0x2A6:
+				self.energy_state.append(self.states.energy_state)
+
+		return handler
+
+
+@pytest.fixture(scope="module")
+def frame(capture_file):
+	return FramePath(capture_file)
+
+
+@pytest.fixture(scope="module")
+def columnar(capture_file):
+	capture = load_capture(capture_file)
+	energy = EnergyIntegral(capture)
+	return capture, energy, ConsumptionIntegral(capture, energy)
+
+
+def assert_close(expected, actual, atol=0.0):
+	numpy.testing.assert_allclose(numpy.asarray(actual, dtype=numpy.float64),
+		numpy.asarray(expected, dtype=numpy.float64), rtol=RTOL, atol=atol)
+
+
+def test_capture_covers_minutes(frame, columnar):
+	# Enough driving to fill minutes of the average and the km window
+	capture, energy, consumption = columnar
+	assert len(consumption.second_energy) // 61 >= 3
+	assert frame.states.consumption.windows["km"].distance_sum >= 1000.0
+
+
+@pytest.mark.parametrize("capture_file", ["drive", "candata"], indirect=True)
+def test_signals_identical(frame, columnar):
+	capture, energy, consumption = columnar
+	for can_id, rows in frame.decoded.items():
+		message = capture.messages[can_id]
+		decoded = capture.decode(can_id)
+		for column, s in enumerate(message.signals):
+			assert decoded[s.name].tolist() == [row[column] for row in rows], "%s.%s" % (message.name, s.name)
+
+
+@pytest.mark.parametrize("capture_file", ["drive", "candata"], indirect=True)
+def test_energy(frame, columnar):
+	capture, energy, consumption = columnar
+	assert_close(frame.energy_state, energy.energy_state, ENERGY_ATOL)
+	assert_close(frame.states.energy_state, energy.final, ENERGY_ATOL)
+
+
+def test_consumption(frame, columnar):
+	capture, energy, consumption = columnar
+	data = frame.states.consumption
+
+	minutes = data.mdata.data[data.mdata.index:] + data.mdata.data[:data.mdata.index]
+	energy_minutes, distance_minutes = consumption.get_minutes()
+	assert_close([e for e, d in minutes], energy_minutes)
+	assert_close([d for e, d in minutes], distance_minutes)
+
+	assert data.s_count == len(consumption.second_energy) % 61
+	assert_close([data.hf_energy, data.hf_distance], [consumption.hf_energy, consumption.hf_distance])
+	assert_close(data.get_avg_consumption(), consumption.get_avg_consumption())
+	assert_close(data.get_latest_consumption(), consumption.get_latest_consumption())
+
+
+@pytest.mark.parametrize("name", sorted(DS.CONSUMPTION_WINDOWS))
+def test_window_consumption(frame, columnar, name):
+	capture, energy, consumption = columnar
+	expected = frame.states.consumption.get_consumption(name)
+	actual = consumption.get_window_consumption(**DS.CONSUMPTION_WINDOWS[name])
+
+	assert expected is not None
+	assert_close(expected, actual)
@@ -0,0 +1,60 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from components.dbc import parse_dbc, compile_decoder, load_decoders
+from components.columnar import ColumnarCapture
+
+#
+# Motorola (big endian) signals start at their most significant bit,
+# counted from the low bit of each byte:
+#
+#   word    bytes 0 and 1, unsigned
+#   nibble  low nibble of byte 2 and byte 3, signed
+#   mixed   an Intel signal in the same message, byte 4 and 5
+#
+MOTOROLA_DBC = """
+BO_ 256 MOTOROLA: 8 NODE
+ SG_ word : 7|16@0+ (1,0) [0|65535] "" DASHBOARD
+ SG_ nibble : 19|12@0- (0.5,0) [-1024|1023.5] "" DASHBOARD
+ SG_ mixed : 32|16@1+ (1,0) [0|65535] "" DASHBOARD
+"""
+
+PAYLOAD = bytes([0x12, 0x34, 0xAF, 0xFE, 0x78, 0x56, 0x00, 0x00])
+EXPECTED = (0x1234, (0xFFE - 0x1000) * 0.5, 0x5678)
+
+
+def test_motorola_signals():
+	message = parse_dbc(MOTOROLA_DBC)[256]
+	decode = compile_decoder(message)
+
+	assert decode(PAYLOAD) == EXPECTED
+	assert decode(PAYLOAD.hex()) == EXPECTED
+
+	# Short payloads are zero padded like the aligned decoders
+	assert decode(PAYLOAD[:2]) == (0x1234, 0.0, 0)
+
+
+def test_motorola_signals_columnar():
+	capture = ColumnarCapture(numpy.zeros(2), numpy.array([256, 256], dtype=numpy.uint32),
+		numpy.frombuffer(PAYLOAD * 2, dtype=numpy.uint8).reshape(-1, 8))
+	capture.messages = parse_dbc(MOTOROLA_DBC)
+
+	signals = capture.decode(256)
+	assert [signals[name].tolist() for name in ("word", "nibble", "mixed")] == [[value] * 2 for value in EXPECTED]
+
+
+@pytest.mark.parametrize("line", [
+	' SG_ overrun : 60|16@0+ (1,0) [0|65535] "" DASHBOARD',
+	' SG_ overrun : 56|16@1+ (1,0) [0|65535] "" DASHBOARD',
+])
+def test_signal_past_payload(line):
+	message = parse_dbc("BO_ 256 BAD: 8 NODE\n" + line)[256]
+	with pytest.raises(ValueError, match="overrun"):
+		compile_decoder(message)
+
+
+def test_curtis_decoders():
+	decoders = load_decoders()
+	assert decoders[0x1A6](bytes.fromhex("0D0000000000741E")) == (1.3, 0, 0.0, 121.8125)
@@ -0,0 +1,39 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+from components.ingest import LineSource
+
+LINE = "(1000.000000) can0 1A6#0D0000000000741E\n"
+
+
+def read_all(source):
+	frames = []
+	chunk = source.read_frames()
+	while chunk is not None:
+		frames.extend(chunk)
+		chunk = source.read_frames()
+
+	return frames
+
+
+def test_close_closes_the_file(tmp_path):
+	filename = tmp_path / "candump.txt"
+	filename.write_text(LINE)
+
+	source = LineSource(open(filename, "rb"))
+	assert len(read_all(source)) == 1
+	source.close()
+	assert source.infile.closed
+
+
+def test_oversized_line_is_dropped(tmp_path):
+	filename = tmp_path / "candump.txt"
+	filename.write_text(LINE + "X" * 1000 + LINE + LINE + "Y" * 1000)
+
+	source = LineSource(open(filename, "rb"), chunk_size=64, max_length=128)
+	frames = read_all(source)
+	source.close()
+
+	# The frame glued to the end of the oversized line goes with it
+	assert len(frames) == 2
+	assert source.dropped_lines == 2
+	assert len(source.buffer) <= 2 * 64 + 128
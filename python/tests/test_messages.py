@@ -0,0 +1,35 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import struct
+
+from components.messages import StateData
+
+M1 = struct.Struct("<HhhH")
+M3 = struct.Struct("<BxhI")
+
+
+def test_subscribe_to_fields():
+	states = StateData(persist=False, history=False)
+	calls = []
+	states.subscribe(lambda snapshot, changed: calls.append((snapshot.odometer, sorted(changed))), ["odometer"])
+
+	# Speed only, the odometer stays
+	states.parse_m1(M1.pack(0, 100, 0, 9600))
+	assert calls == []
+
+	states.parse_m3(M3.pack(0, 0, 1000))
+	states.parse_m3(M3.pack(0, 0, 1000))
+	states.parse_m3(M3.pack(0, 0, 1010))
+	assert calls == [(100.0, ["odometer"]), (101.0, ["odometer"])]
+
+
+def test_change_counts():
+	states = StateData(persist=False, history=False)
+	states.subscribe(lambda snapshot, changed: None)
+
+	for odometer in (1000, 1000, 1010, 1010, 1020):
+		states.parse_m3(M3.pack(0, 0, odometer))
+
+	assert states.change_counts["odometer"] == 3
+	assert states.change_counts["actual_speed"] == 0
+	assert states.get_change_rates()["odometer"] > 0.0
@@ -0,0 +1,94 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import struct
+
+import pytest
+
+from components.ingest import LineSource
+from components.ridesummary import COLUMNS, STATE_COLUMNS, summarize_capture, total_row
+
+M2 = struct.Struct("<hhBBh")
+M3 = struct.Struct("<BxhI")
+
+START_TIME = 1000.0
+
+#
+# Ten seconds at a constant 3600 W, one report per second:
+#
+#   contactor  Closed for 6 s, Open for 3 s, an unknown state for 1 s
+#   odometer   2.5 km, a reset to 0 that does not count, then 2.0 km
+#   energy     3600 J per second after the first report, 10 Wh
+#
+CONTACTOR = [5] * 6 + [0] * 3 + [20] * 2
+ODOMETER = [100.0 + 0.5 * i for i in range(6)] + [0.5 * i for i in range(5)]
+DISTANCE = 4.5
+ENERGY_WH = 10.0
+
+
+def write_capture(filename, lines=()):
+	with open(filename, "w") as f:
+		for i, (state, odometer) in enumerate(zip(CONTACTOR, ODOMETER)):
+			t = START_TIME + i
+			f.write("(%.6f) can0 2A6#%s\n" % (t, M2.pack(300, 250, state, 0, 360).hex().upper()))
+			f.write("(%.6f) can0 3A6#%s\n" % (t + 0.001, M3.pack(0, 0, int(round(odometer * 10.0))).hex().upper()))
+
+		for line in lines:
+			f.write(line)
+
+	return str(filename)
+
+
+def get(row, name):
+	return row[COLUMNS.index(name)]
+
+
+@pytest.fixture
+def row(tmp_path):
+	filename, row, error = summarize_capture(write_capture(tmp_path / "ride.txt"))
+	assert error is None
+	return row
+
+
+def test_summary(row):
+	assert get(row, "frames") == 2 * len(CONTACTOR)
+	assert get(row, "duration_s") == pytest.approx(len(CONTACTOR) - 1 + 0.001)
+	assert get(row, "distance_km") == pytest.approx(DISTANCE)
+	assert get(row, "energy_wh") == pytest.approx(ENERGY_WH)
+	assert get(row, "wh_per_km") == pytest.approx(ENERGY_WH / DISTANCE)
+
+	times = dict([(name, get(row, name)) for name in STATE_COLUMNS])
+	assert times.pop("time Open") == pytest.approx(3.0)
+	assert times.pop("time Closed (When Main Enable = On)") == pytest.approx(6.0)
+	assert times.pop("time Unknown") == pytest.approx(1.0)
+	assert set(times.values()) == set([0.0])
+
+
+def test_total_row(row):
+	failed = ["broken.txt"] + [None] * (len(COLUMNS) - 1)
+	total = total_row([row, row, failed])
+
+	assert total[0] == "total"
+	assert get(total, "start") == START_TIME
+	assert get(total, "frames") == 4 * len(CONTACTOR)
+	assert get(total, "distance_km") == pytest.approx(2 * DISTANCE)
+	assert get(total, "energy_wh") == pytest.approx(2 * ENERGY_WH)
+	assert get(total, "wh_per_km") == pytest.approx(ENERGY_WH / DISTANCE)
+	assert get(total, "time Open") == pytest.approx(6.0)
+
+
+def test_source_closed_on_error(tmp_path, monkeypatch):
+	closed = []
+	close = LineSource.close
+
+	def counted_close(self):
+		closed.append(self)
+		close(self)
+
+	monkeypatch.setattr(LineSource, "close", counted_close)
+
+	filename = write_capture(tmp_path / "broken.txt", ["(%.6f) can0 2A6#ZZ\n" % (START_TIME + 20.0)])
+	filename, row, error = summarize_capture(filename)
+
+	assert row is None
+	assert "non-hexadecimal" in error
+	assert len(closed) == 1 and closed[0].infile.closed
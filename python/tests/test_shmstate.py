@@ -0,0 +1,64 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import pytest
+
+from components.settings import DashboardSettings as DS
+from components.messages import StateData
+from components.shmstate import SharedStateWriter, SharedStateView
+
+M1_DATA = bytes.fromhex("0D000000DC05741E")
+
+
+@pytest.fixture
+def writer():
+	writer = SharedStateWriter("curtis_test_%d" % os.getpid())
+	yield writer
+	writer.close()
+
+
+@pytest.fixture
+def view(writer):
+	view = SharedStateView(writer.shm.name.lstrip("/"))
+	yield view
+	view.close()
+
+
+def test_defaults_before_publish(view):
+	snapshot = view.get_snapshot()
+	assert snapshot.energy_state == DS.BATTERY_TOTAL_ENERGY
+	assert snapshot.actual_speed == 0
+
+
+def test_published_after_every_message(writer, view):
+	states = StateData(persist=False, history=False)
+	writer.publish(states)
+	states.subscribe(writer.write_snapshot)
+
+	states.parse_m1(M1_DATA)
+	snapshot = view.get_snapshot()
+	assert (snapshot.motor_rms_current, snapshot.battery_current, snapshot.dc_capacitor_voltage) == (1, 150, 121.8125)
+
+
+def test_view_is_read_only(view):
+	with pytest.raises(TypeError):
+		view.buf[0] = 1
+
+
+def test_views_do_not_unlink_at_exit():
+	# Views in the writer process, the resource tracker must not complain
+	code = "\n".join([
+		"from components.shmstate import SharedStateWriter, SharedStateView",
+		"writer = SharedStateWriter('curtis_test_exit_%d' % __import__('os').getpid())",
+		"views = [SharedStateView(writer.shm.name.lstrip('/')) for i in range(2)]",
+		"[view.close() for view in views]",
+		"writer.close()",
+	])
+	cwd = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+	result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, timeout=30)
+
+	assert result.returncode == 0
+	assert result.stderr == ""
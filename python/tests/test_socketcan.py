@@ -0,0 +1,131 @@
+#!/usr/bin/python -B
+# -*- coding: utf-8 -*-
+import select
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from components.messages import StateData
+from components.canreader import CanReader
+
+#
+# Reads frames sent on a virtual CAN interface through SocketCanSource,
+# skipped where there is none. To set one up:
+#
+#   modprobe vcan
+#   ip link add dev vcan0 type vcan
+#   ip link set up vcan0
+#
+VCAN_INTERFACE = "vcan0"
+
+# Max seconds to wait for the frames to arrive
+RECEIVE_TIMEOUT = 2.0
+
+CAN_FRAME = struct.Struct("=IB3x8s")
+
+# Curtis frames with values exact after scaling
+M1_DATA = struct.pack("<HhhH", 123, 1500, -50, 9600)
+M2_DATA = struct.pack("<hhBBh", 412, 355, 1, 0, 200)
+M3_DATA = struct.pack("<BxhI", 0, 250, 1234560)
+M4_DATA = struct.pack("<Hh2xH", 7, -3, 1450)
+
+FRAMES = [
+	(0x726, b"\x7f"),
+	(0x1A6, M1_DATA),
+	(0x2A6, M2_DATA),
+	(0x3A6, M3_DATA),
+	(0x4A6, M4_DATA),
+]
+
+
+@pytest.fixture
+def source():
+	if not hasattr(socket, "CAN_RAW"):
+		pytest.skip("No SocketCAN on this platform")
+
+	from components.socketcan import SocketCanSource
+	try:
+		source = SocketCanSource(VCAN_INTERFACE)
+	except OSError as e:
+		pytest.skip("%s not available: %s" % (VCAN_INTERFACE, e))
+
+	yield source
+	source.close()
+
+
+@pytest.fixture
+def send(source):
+	sock = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+	sock.bind((VCAN_INTERFACE,))
+
+	def send(can_id, data):
+		sock.send(CAN_FRAME.pack(can_id, len(data), data.ljust(8, b"\0")))
+
+	yield send
+	sock.close()
+
+
+def read_frames(source, count):
+	frames = []
+	deadline = time.monotonic() + RECEIVE_TIMEOUT
+	while len(frames) < count:
+		timeout = deadline - time.monotonic()
+		if timeout <= 0.0 or not select.select([source], [], [], timeout)[0]:
+			break
+		frames.extend(source.read_frames())
+
+	return frames
+
+
+def test_read_frames(source, send):
+	start = time.time()
+
+	# Dropped by the kernel filter: other ids, extended and remote frames
+	send(0x123, b"\x01\x02")
+	send(0x1A6 | socket.CAN_EFF_FLAG, M1_DATA)
+	send(0x1A6 | socket.CAN_RTR_FLAG, b"")
+
+	for can_id, data in FRAMES:
+		send(can_id, data)
+
+	frames = read_frames(source, len(FRAMES))
+	assert [(can_id, data) for timestamp, can_id, data in frames] == FRAMES
+
+	# Kernel receive time
+	timestamps = [timestamp for timestamp, can_id, data in frames]
+	assert timestamps == sorted(timestamps)
+	assert start - 1.0 <= timestamps[0] <= time.time() + 1.0
+
+
+def test_reader_decodes(source, send):
+	states = StateData(persist=False, history=False)
+	shutdown = threading.Event()
+	reader = CanReader(states, None, shutdown, False, source)
+	reader.start()
+
+	try:
+		for can_id, data in FRAMES:
+			send(can_id, data)
+
+		deadline = time.monotonic() + RECEIVE_TIMEOUT
+		while states.get_snapshot().dcdc != pytest.approx(14.5) and time.monotonic() < deadline:
+			time.sleep(0.01)
+	finally:
+		shutdown.set()
+		reader.join()
+
+	snapshot = states.get_snapshot()
+	assert snapshot.motor_rms_current == 12
+	assert snapshot.actual_speed == 1500
+	assert snapshot.battery_current == -5
+	assert snapshot.dc_capacitor_voltage == 150.0
+	assert snapshot.motor_temp == pytest.approx(41.2)
+	assert snapshot.controller_temp == pytest.approx(35.5)
+	assert snapshot.motor_power == 2000.0
+	assert snapshot.vehicle_acc == pytest.approx(0.25)
+	assert snapshot.odometer == pytest.approx(123456.0)
+	assert (snapshot.tts_1, snapshot.tts_2) == (7, -3)
+	assert snapshot.dcdc == pytest.approx(14.5)
@@ -0,0 +1,5 @@
+#!/bin/bash
+
+sudo /sbin/modprobe vcan
+sudo /sbin/ip link add dev vcan0 type vcan
+sudo /sbin/ip link set vcan0 up
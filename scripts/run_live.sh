@@ -1,5 +1,4 @@
 #!/bin/bash
 
-runpath="$(dirname $0)/../python/main.py -f"
-fname="/tmp/$(date --iso-8601=seconds).txt"
-candump -L can0 | tee $fname | python3 $runpath
+runpath="$(dirname $0)/../python/main.py -f -i can0 --record $HOME/captures"
+python3 $runpath
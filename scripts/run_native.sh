@@ -0,0 +1,4 @@
+#!/bin/bash
+
+runpath="$(dirname $0)/../python/main.py -f -i can0"
+python3 $runpath
@@ -0,0 +1,6 @@
+#!/bin/bash
+
+# Play the test data on vcan0 (see init_vcan.sh) and read it natively
+canplayer -l i vcan0=can0 -I ../test-data/candata.txt &
+python3 ../python/main.py -i vcan0
+kill %1